@@ -0,0 +1,623 @@
+"""
+Offline benchmark for the API.
+
+Starts local stand-ins for every upstream main.py talks to (Solana JSON-RPC, Jupiter, Helius,
+CoinGecko and Pump.fun), runs the app under uvicorn pointed at them, drives each endpoint with
+concurrent requests and prints p50/p90/p99 latency and throughput per endpoint as JSON.
+
+    python bench.py                                  # every scenario, default load
+    python bench.py -s balances_5000 -s history -c 32 -n 500 --latency-ms 40 --error-rate 0.02
+    python bench.py --output results.json
+
+The stand-ins are stateless: a wallet address encodes how many token accounts it holds and a
+signature encodes its position in a wallet's history, so payload sizes are set per scenario.
+
+    python bench.py --check-hot-wallets
+
+instead checks the hot-wallet subscriptions: the stand-in changes a watched wallet, pushes the
+WebSocket notifications a node would, drops the connection, and the app's answers are verified.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from base64 import b64encode
+
+import base58
+import httpx
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from solders.pubkey import Pubkey
+
+TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+SYSTEM_PROGRAM_ID = "11111111111111111111111111111111"
+COMPUTE_BUDGET_PROGRAM_ID = "ComputeBudget111111111111111111111111111111"
+WSOL_MINT = "So11111111111111111111111111111111111111112"
+USDC_MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+WALLET_TAG = 0xAA
+RPC_ENDPOINT_COUNT = 2
+
+def wallet_address(token_accounts: int, seed: int = 0) -> str:
+    """A wallet the stand-in RPC reports as holding `token_accounts` token accounts."""
+    return str(Pubkey.from_bytes(bytes([WALLET_TAG]) + seed.to_bytes(4, "big") + bytes(23) + token_accounts.to_bytes(4, "big")))
+
+def wallet_size(address: str) -> int:
+    raw = bytes(Pubkey.from_string(address))
+    return int.from_bytes(raw[-4:], "big") if raw[0] == WALLET_TAG else 10
+
+def mint_address(i: int) -> str:
+    return str(Pubkey.from_bytes(b"\x01" + bytes(27) + i.to_bytes(4, "big")))
+
+def mint_number(address: str) -> int:
+    return int.from_bytes(bytes(Pubkey.from_string(address))[-4:], "big")
+
+def signature(wallet: str, position: int) -> str:
+    """Signature of the `position`-th newest transaction of a wallet."""
+    return base58.b58encode(position.to_bytes(4, "big") + bytes(Pubkey.from_string(wallet)) + bytes(28)).decode()
+
+def signature_parts(sig: str):
+    raw = base58.b58decode(sig)
+    if len(raw) != 64:
+        return 0, wallet_address(1)
+    return int.from_bytes(raw[:4], "big"), str(Pubkey.from_bytes(raw[4:36]))
+
+# Upstream stand-ins
+
+def build_fake_upstream(args) -> FastAPI:
+    """One app serving every upstream under its own path prefix, with injected latency and errors."""
+    fake = FastAPI()
+    rng = random.Random(args.seed)
+    token_accounts_cache = {}
+    # Live state for --check-hot-wallets, on top of the generated wallets
+    # Newer than every generated transaction (slot 300_000_000 - position), which are all finalized
+    chain = {"slot": 300_000_001, "subscriptions": 0}
+    lamports_overrides = {}  # wallet -> lamports
+    amount_overrides = {}  # (wallet, token account index) -> raw amount, or None once closed
+    sockets = {}  # websocket -> {subscription id: (method, params)}
+
+    async def delay():
+        await asyncio.sleep((args.latency_ms + rng.uniform(0, args.jitter_ms)) / 1000)
+
+    def failing() -> bool:
+        return rng.random() < args.error_rate
+
+    def token_account(owner: str, i: int, encoding: str, amount: int = None) -> dict:
+        """The wallet's i-th token account, holding (i + 1) tokens unless `amount` is given."""
+        owner_bytes = bytes(Pubkey.from_string(owner))
+        mint = mint_address(i)
+        amount = (i + 1) * 1_000_000 if amount is None else amount
+        if encoding == "base64":
+            data = bytes(Pubkey.from_string(mint)) + owner_bytes + struct.pack("<Q", amount) + bytes(93)
+            account_data = [b64encode(data).decode(), "base64"]
+        else:
+            account_data = {"program": "spl-token", "parsed": {"type": "account", "info": {
+                "mint": mint, "owner": owner, "state": "initialized",
+                "tokenAmount": {"amount": str(amount), "decimals": 6, "uiAmount": amount / 1e6,
+                                "uiAmountString": str(amount / 1e6)}}}, "space": 165}
+        return {"pubkey": str(Pubkey.from_bytes(hashlib.sha256(owner_bytes + mint.encode()).digest())),
+                "account": {"data": account_data, "executable": False, "lamports": 2039280,
+                            "owner": TOKEN_PROGRAM_ID, "rentEpoch": 0, "space": 165}}
+
+    def token_accounts(owner: str, encoding: str) -> list:
+        key = (owner, encoding)
+        if key not in token_accounts_cache:
+            accounts = [token_account(owner, i, encoding) for i in range(wallet_size(owner))]
+            # Bounded: one entry per (wallet, encoding) the scenarios use
+            if len(token_accounts_cache) < 64:
+                token_accounts_cache[key] = accounts
+            return accounts
+        return token_accounts_cache[key]
+
+    def live_token_accounts(owner: str, encoding: str) -> list:
+        accounts = token_accounts(owner, encoding)
+        changed = {i: amount for (wallet, i), amount in amount_overrides.items() if wallet == owner}
+        if not changed:
+            return accounts
+        return [token_account(owner, i, encoding, changed[i]) if i in changed else acct
+                for i, acct in enumerate(accounts) if not (i in changed and changed[i] is None)]
+
+    def transaction(sig: str) -> dict:
+        position, wallet = signature_parts(sig)
+        mint = mint_address(position % 50)
+        keys = [wallet, mint_address(10_000 + position), str(Pubkey.from_bytes(hashlib.sha256(sig.encode()).digest())),
+                SYSTEM_PROGRAM_ID, TOKEN_PROGRAM_ID, COMPUTE_BUDGET_PROGRAM_ID]
+        return {
+            "slot": 300_000_000 - position, "blockTime": 1_700_000_000 - position,
+            "meta": {
+                "err": None, "fee": 5000, "innerInstructions": [], "loadedAddresses": {"writable": [], "readonly": []},
+                "preTokenBalances": [{"accountIndex": 1, "mint": mint, "owner": wallet,
+                                      "uiTokenAmount": {"amount": "5000000", "decimals": 6}}],
+                "postTokenBalances": [{"accountIndex": 1, "mint": mint, "owner": wallet,
+                                       "uiTokenAmount": {"amount": "4000000", "decimals": 6}}]
+            },
+            "transaction": {"signatures": [sig], "message": {"accountKeys": keys, "instructions": [
+                {"programIdIndex": 5, "accounts": [], "data": base58.b58encode(bytes([2]) + struct.pack("<I", 200_000)).decode()},
+                {"programIdIndex": 3, "accounts": [0, 2], "data": base58.b58encode(struct.pack("<IQ", 2, 1_000_000)).decode()},
+                {"programIdIndex": 4, "accounts": [1, 2, 0], "data": base58.b58encode(bytes([3]) + struct.pack("<Q", 1_000_000)).decode()}
+            ]}}
+        }
+
+    def rpc_result(method: str, params: list):
+        if method == "getSlot":
+            return chain["slot"]
+        if method == "getBalance":
+            return {"context": {"slot": chain["slot"]}, "value": lamports_overrides.get(params[0], 2_500_000_000)}
+        if method == "getTokenAccountsByOwner":
+            if params[1].get("programId") != TOKEN_PROGRAM_ID:
+                return {"context": {"slot": chain["slot"]}, "value": []}
+            return {"context": {"slot": chain["slot"]}, "value": live_token_accounts(params[0], params[2].get("encoding", "jsonParsed"))}
+        if method == "getMultipleAccounts":
+            if params[1].get("dataSlice", {}).get("offset") == 44:
+                # Mint decimals
+                return {"context": {"slot": 1}, "value": [
+                    {"data": [b64encode(bytes([6])).decode(), "base64"], "lamports": 1461600, "owner": TOKEN_PROGRAM_ID}
+                    for _ in params[0]]}
+            return {"context": {"slot": 1}, "value": [
+                {"data": ["", "base64"], "lamports": 2_500_000_000, "owner": SYSTEM_PROGRAM_ID} for _ in params[0]]}
+        if method == "getAccountInfo":
+            return {"context": {"slot": 1}, "value": {"data": ["", "base64"], "lamports": 1461600, "owner": TOKEN_PROGRAM_ID}}
+        if method == "getSignaturesForAddress":
+            options = params[1] if len(params) > 1 else {}
+            start = signature_parts(options["before"])[0] + 1 if options.get("before") else 0
+            end = min(start + options.get("limit", 1000), args.history_length)
+            return [{"signature": signature(params[0], i), "slot": 300_000_000 - i, "blockTime": 1_700_000_000 - i,
+                     "err": None, "confirmationStatus": "finalized", "memo": None} for i in range(start, end)]
+        if method == "getTransaction":
+            return transaction(params[0])
+        return None
+
+    def rpc_response(request: dict) -> dict:
+        if failing():
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32005, "message": "Node is behind"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": rpc_result(request.get("method"), request.get("params") or [])}
+
+    @fake.post("/rpc/{node}")
+    async def rpc(node: int, request: Request):
+        body = await request.json()
+        await delay()
+        if failing():
+            return JSONResponse({"message": "Service unavailable"}, status_code=503)
+        if isinstance(body, list):
+            return [rpc_response(r) for r in body]
+        return rpc_response(body)
+
+    @fake.websocket("/rpc/{node}")
+    async def rpc_subscriptions(node: int, websocket: WebSocket):
+        """Account and program subscriptions; the /control endpoints push their notifications."""
+        await websocket.accept()
+        subscriptions = sockets[websocket] = {}
+        try:
+            while True:
+                request = json.loads(await websocket.receive_text())
+                method, params = request.get("method", ""), request.get("params") or []
+                if method.endswith("Unsubscribe"):
+                    result = subscriptions.pop(params[0] if params else None, None) is not None
+                else:
+                    chain["subscriptions"] += 1
+                    result = chain["subscriptions"]
+                    subscriptions[result] = (method, params)
+                await websocket.send_text(json.dumps({"jsonrpc": "2.0", "id": request.get("id"), "result": result}))
+        except (WebSocketDisconnect, RuntimeError):
+            # RuntimeError: receiving after /control/drop-websockets closed the socket
+            pass
+        finally:
+            sockets.pop(websocket, None)
+
+    async def notify(method: str, target: str, slot: int, value: dict):
+        """Send `value` to the accountSubscribe subscribers of account `target` (method "account"),
+        or the programSubscribe subscribers filtering the token program by owner `target` ("program")."""
+        for websocket, subscriptions in list(sockets.items()):
+            for subscription, (subscribed, params) in list(subscriptions.items()):
+                if subscribed != f"{method}Subscribe" or not params:
+                    continue
+                if method == "account" and params[0] != target:
+                    continue
+                if method == "program" and (params[0] != TOKEN_PROGRAM_ID or not any(
+                        f.get("memcmp", {}).get("bytes") == target for f in params[1].get("filters", []))):
+                    continue
+                await websocket.send_text(json.dumps({"jsonrpc": "2.0", "method": f"{method}Notification", "params": {
+                    "result": {"context": {"slot": slot}, "value": value}, "subscription": subscription}}))
+
+    @fake.post("/control/lamports")
+    async def set_lamports(wallet: str, lamports: int):
+        chain["slot"] += 1
+        lamports_overrides[wallet] = lamports
+        await notify("account", wallet, chain["slot"], {"data": ["", "base64"], "executable": False, "lamports": lamports,
+                                                       "owner": SYSTEM_PROGRAM_ID, "rentEpoch": 0, "space": 0})
+        return {"slot": chain["slot"]}
+
+    @fake.post("/control/token-account")
+    async def set_token_account(wallet: str, index: int, amount: int = None, stale: bool = False):
+        """
+        Set (or, without an amount, close) a wallet's index-th token account. A stale change is
+        only announced, at an older slot, the way a late notification would arrive.
+        """
+        if stale:
+            slot = chain["slot"] - 5
+        else:
+            chain["slot"] += 1
+            slot = chain["slot"]
+            amount_overrides[(wallet, index)] = amount
+        record = token_account(wallet, index, "jsonParsed", amount)
+        if amount is None:
+            # Closing moves the account out of the token program, so only its own subscribers hear of it
+            await notify("account", record["pubkey"], slot, {"data": ["", "base64"], "executable": False, "lamports": 0,
+                                                            "owner": SYSTEM_PROGRAM_ID, "rentEpoch": 0, "space": 0})
+        else:
+            await notify("program", wallet, slot, record)
+            await notify("account", record["pubkey"], slot, record["account"])
+        return {"slot": slot}
+
+    @fake.post("/control/drop-websockets")
+    async def drop_websockets():
+        dropped = list(sockets)
+        for websocket in dropped:
+            await websocket.close(code=1012)
+        return {"dropped": len(dropped)}
+
+    def token_record(i: int) -> dict:
+        return {"address": mint_address(i), "name": f"Token {i}", "symbol": f"TK{i}", "decimals": 6,
+                "daily_volume": float(i % 1000), "tags": ["verified"] if i % 3 == 0 else []}
+
+    @fake.get("/jupiter/all")
+    async def token_list():
+        await delay()
+        tokens = [token_record(i) for i in range(args.token_list_size)]
+        tokens.append({"address": WSOL_MINT, "name": "Wrapped SOL", "symbol": "SOL", "decimals": 9, "tags": ["verified"], "daily_volume": 1e9})
+        tokens.append({"address": USDC_MINT, "name": "USD Coin", "symbol": "USDC", "decimals": 6, "tags": ["verified"], "daily_volume": 1e9})
+        return tokens
+
+    @fake.get("/jupiter/token/{mint}")
+    async def token_info(mint: str):
+        await delay()
+        if failing():
+            return JSONResponse({}, status_code=500)
+        return token_record(mint_number(mint))
+
+    @fake.get("/jupiter/price")
+    async def price(ids: str):
+        await delay()
+        if failing():
+            return JSONResponse({}, status_code=500)
+        return {"data": {i: {"id": i, "type": "derivedPrice", "price": "150.25" if i == WSOL_MINT else "1.5"} for i in ids.split(",")}}
+
+    @fake.get("/jupiter/quote")
+    async def quote(inputMint: str, outputMint: str, amount: int):
+        await delay()
+        if failing():
+            return JSONResponse({"error": "No routes found"}, status_code=500)
+        out_amount = int(amount * 150 * max(0.0, 1 - amount / 1e13))
+        return {"inputMint": inputMint, "outputMint": outputMint, "inAmount": str(amount), "outAmount": str(out_amount),
+                "priceImpactPct": str(amount / 1e13),
+                "routePlan": [{"swapInfo": {"inputMint": inputMint, "outputMint": mint_address(1)}},
+                              {"swapInfo": {"inputMint": mint_address(1), "outputMint": outputMint}}]}
+
+    @fake.get("/helius/v0/tokens/metadata")
+    async def helius_metadata(mint: str):
+        await delay()
+        return [{"mint": mint, "name": f"Token {mint[:4]}", "symbol": mint[:4].upper()}]
+
+    coins = [{"id": "solana", "symbol": "sol", "name": "Solana", "platforms": {}},
+             {"id": "usd-coin", "symbol": "usdc", "name": "USDC", "platforms": {"solana": USDC_MINT}}]
+    coins += [{"id": f"token-{i}", "symbol": f"tk{i}", "name": f"Token {i}", "platforms": {"solana": mint_address(i)}}
+              for i in range(args.token_list_size)]
+
+    @fake.get("/coingecko/coins/list")
+    async def coin_list():
+        await delay()
+        return coins
+
+    @fake.get("/coingecko/coins/markets")
+    async def coin_markets(ids: str = None, page: int = 1):
+        await delay()
+        if failing():
+            return JSONResponse({}, status_code=429)
+        if ids is None:
+            return [{"id": c["id"], "market_cap_rank": n + 1} for n, c in enumerate(coins[:250])] if page == 1 else []
+        return [{"id": coin_id, "symbol": coin_id.split("-")[0], "current_price": 1.5, "price_change_percentage_24h": 2.5,
+                 "total_volume": 1_000_000.0, "market_cap": 50_000_000.0} for coin_id in ids.split(",")]
+
+    @fake.get("/coingecko/search")
+    async def coin_search(query: str):
+        await delay()
+        return {"coins": [c for c in coins[:1000] if c["symbol"] == query.lower()][:10]}
+
+    @fake.get("/coingecko/coins/{coin_id}")
+    async def coin_detail(coin_id: str):
+        await delay()
+        return next((c for c in coins if c["id"] == coin_id), {"platforms": {}})
+
+    def pumpfun_coin(i: int) -> dict:
+        return {"name": f"Pump {i}", "symbol": f"PUMP{i}", "metadata": {"mint": mint_address(50_000 + i)},
+                "stats": {"price": 0.0001 * (i + 1), "marketCap": 10_000 + i, "volume24h": 1_000 + i}}
+
+    @fake.get("/pumpfun/coins")
+    async def pumpfun_latest(limit: int = 50):
+        await delay()
+        if failing():
+            return JSONResponse({}, status_code=500)
+        return [pumpfun_coin(i) for i in range(limit)]
+
+    @fake.get("/pumpfun/coins/{mint}")
+    async def pumpfun_coin_by_mint(mint: str):
+        await delay()
+        return pumpfun_coin(mint_number(mint) % 50_000)
+
+    @fake.get("/")
+    async def health():
+        return {"ok": True}
+
+    return fake
+
+# Scenarios: name -> (method, path, JSON body), built per request
+
+def scenarios(args) -> dict:
+    rng = random.Random(args.seed)
+    table = {}
+    for size in args.wallet_sizes:
+        table[f"balances_{size}"] = lambda size=size: ("GET", f"/balances/{wallet_address(size)}", None)
+    table["balances_stream"] = lambda: ("GET", f"/balances/{wallet_address(max(args.wallet_sizes))}/stream", None)
+    table["balances_batch"] = lambda: ("POST", "/balances/batch", {
+        "addresses": [wallet_address(args.batch_wallet_size, seed) for seed in range(args.batch_wallets)]})
+    table["transaction"] = lambda: ("GET", f"/transaction/{signature(wallet_address(1), rng.randrange(args.history_length))}", None)
+    table["history"] = lambda: ("GET", f"/history/{wallet_address(1, rng.randrange(1000))}?limit={args.history_limit}", None)
+    table["swap"] = lambda: ("GET", f"/swap?input_mint={WSOL_MINT}&output_mint={USDC_MINT}&amount={rng.randint(1, 100)}", None)
+    table["swap_ladder"] = lambda: ("GET", f"/swap/ladder?input_mint={WSOL_MINT}&output_mint={USDC_MINT}"
+                                           f"&min_amount=1&max_amount={rng.randint(100, 1000)}&steps=10&spacing=log", None)
+    table["price"] = lambda: ("GET", f"/price/TK{rng.randrange(min(args.token_list_size, 200))}", None)
+    table["token"] = lambda: ("GET", f"/token?query=TK{rng.randrange(min(args.token_list_size, 200))}", None)
+    table["resolve"] = lambda: ("GET", f"/resolve?symbol=TK{rng.randrange(args.token_list_size)}", None)
+    table["tokens_search"] = lambda: ("GET", f"/tokens/search?q=TK{rng.randrange(100)}", None)
+    table["mintinfo"] = lambda: ("GET", f"/mintinfo/{mint_address(rng.randrange(args.token_list_size * 2))}", None)
+    table["pumpfun"] = lambda: ("GET", "/pumpfun", None)
+    table["pumpfun_mint"] = lambda: ("GET", f"/pumpfun/{mint_address(50_000 + rng.randrange(50))}", None)
+    return table
+
+def percentile(sorted_values: list, pct: float):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), -(-len(sorted_values) * pct // 100)))
+    return sorted_values[int(rank) - 1]
+
+async def run_scenario(client: httpx.AsyncClient, name: str, build, args) -> dict:
+    """Send args.requests requests (after args.warmup unmeasured ones) from args.concurrency workers."""
+    for _ in range(args.warmup):
+        method, path, body = build()
+        await client.request(method, path, json=body)
+    latencies = []
+    first_bytes = []
+    statuses = {}
+    errors = 0
+    remaining = iter(range(args.requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, path, body = build()
+            start = time.perf_counter()
+            first_byte = None
+            try:
+                async with client.stream(method, path, json=body) as resp:
+                    # Streaming endpoints count until the last byte; time to first byte is kept apart
+                    async for _ in resp.aiter_raw():
+                        first_byte = first_byte or time.perf_counter()
+                status = resp.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if first_byte is not None:
+                first_bytes.append(first_byte - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if not isinstance(status, int) or status >= 500:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    first_bytes.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "endpoint": name,
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "statuses": statuses,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p90_ms": ms(percentile(latencies, 90)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "mean_ms": ms(sum(latencies) / len(latencies) if latencies else None),
+        "ttfb_p50_ms": ms(percentile(first_bytes, 50)),
+        "ttfb_p90_ms": ms(percentile(first_bytes, 90)),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None
+    }
+
+# Hot-wallet checks
+
+HOT_WALLET = wallet_address(3, seed=7)
+
+def check_hot_wallets(app_url: str, upstream: str) -> list:
+    """
+    Drive the stand-in's live state for HOT_WALLET (pinned in the app) and verify the app's
+    balances follow the notifications: lamports, a token account change, a late (older slot)
+    notification, a closed account, and a dropped WebSocket. Returns [{"check", "passed"}].
+    """
+    results = []
+    with httpx.Client(timeout=10) as client:
+        watcher = lambda: client.get(f"{app_url}/cache/stats").json()["hot_wallets"]
+        balances = lambda: client.get(f"{app_url}/balances/{HOT_WALLET}").json()
+        control = lambda path, **params: client.post(f"{upstream}/control/{path}", params=params).raise_for_status()
+
+        def token_amount(index: int):
+            return next((t["amount"] for t in balances()["tokens"] if t["mint"] == mint_address(index)), None)
+
+        def eventually(predicate, timeout: float = 5) -> bool:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if predicate():
+                    return True
+                time.sleep(0.1)
+            return False
+
+        def check(name: str, passed: bool):
+            results.append({"check": name, "passed": bool(passed)})
+
+        def notified(path: str, predicate, **params) -> bool:
+            """After the `path` change, `predicate` comes to hold for balances served from the notified snapshot."""
+            before = watcher()
+            control(path, **params)
+            return eventually(lambda: predicate() and watcher()["served"] > before["served"]) \
+                and watcher()["notifications"] > before["notifications"]
+
+        check("wallet seeded", eventually(lambda: watcher()["ready"] == 1, timeout=15))
+        check("token accounts watched", watcher()["account_subscriptions"] == wallet_size(HOT_WALLET))
+        check("lamports notification", notified("lamports", lambda: balances()["sol"]["amount"] == 7.0,
+                                                wallet=HOT_WALLET, lamports=7_000_000_000))
+        check("token account notification", notified("token-account", lambda: token_amount(0) == 42.0,
+                                                      wallet=HOT_WALLET, index=0, amount=42_000_000))
+        control("token-account", wallet=HOT_WALLET, index=0, amount=1_000_000, stale=True)
+        time.sleep(0.5)
+        check("older slot ignored", token_amount(0) == 42.0)
+        check("closed account dropped", notified("token-account", lambda: token_amount(1) is None, wallet=HOT_WALLET, index=1))
+        connects = watcher()["connects"]
+        control("drop-websockets")
+        check("reconnected and reseeded", eventually(
+            lambda: watcher()["connects"] > connects and watcher()["ready"] == 1 and token_amount(0) == 42.0, timeout=15))
+        check("notifications after reconnect", notified("lamports", lambda: balances()["sol"]["amount"] == 9.0,
+                                                        wallet=HOT_WALLET, lamports=9_000_000_000))
+    return results
+
+# Process management
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def app_environment(upstream: str, cache_dir: str) -> dict:
+    """Environment that points every upstream URL in main.py at the stand-ins."""
+    return {
+        **os.environ,
+        "RPC_ENDPOINTS": ",".join(f"{upstream}/rpc/{n}" for n in range(RPC_ENDPOINT_COUNT)),
+        "RPC_WS_URL": f"{upstream.replace('http://', 'ws://', 1)}/rpc/0",
+        "JUPITER_TOKEN_LIST_URL": f"{upstream}/jupiter/all",
+        "JUPITER_TOKEN_INFO_URL": f"{upstream}/jupiter/token/",
+        "JUPITER_PRICE_URL": f"{upstream}/jupiter/price?ids=",
+        "JUPITER_QUOTE_URL": f"{upstream}/jupiter/quote",
+        "HELIUS_API_BASE": f"{upstream}/helius",
+        "COINGECKO_API_BASE": f"{upstream}/coingecko",
+        "PUMPFUN_API_BASE": f"{upstream}/pumpfun",
+        "CACHE_DIR": cache_dir,
+        # Local stand-ins speak plain HTTP/1.1
+        "HTTP2_ENABLED": "false",
+        # The stand-ins have no quotas; set RATE_LIMITS_ENABLED=true to measure queueing and shedding
+        "RATE_LIMITS_ENABLED": os.getenv("RATE_LIMITS_ENABLED", "false")
+    }
+
+def start_process(argv: list, env: dict = None) -> subprocess.Popen:
+    return subprocess.Popen(argv, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL, stderr=None if os.getenv("BENCH_VERBOSE") else subprocess.DEVNULL)
+
+async def drive(app_url: str, args) -> list:
+    table = scenarios(args)
+    unknown = [name for name in args.scenario if name not in table]
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(unknown)}; choose from {', '.join(table)}")
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+        results = []
+        for name in args.scenario or list(table):
+            print(f"bench: {name}", file=sys.stderr)
+            results.append(await run_scenario(client, name, table[name], args))
+        return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API against local upstream stand-ins.")
+    parser.add_argument("-s", "--scenario", action="append", default=[], help="scenario to run (repeatable; default all)")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per scenario")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--latency-ms", type=float, default=20, help="stand-in base latency per upstream call")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="uniform extra latency per upstream call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument("--wallet-sizes", type=lambda v: [int(x) for x in v.split(",")], default=[1, 100, 5000],
+                        help="token accounts per wallet for the balances_<n> scenarios")
+    parser.add_argument("--batch-wallets", type=int, default=20)
+    parser.add_argument("--batch-wallet-size", type=int, default=50)
+    parser.add_argument("--history-length", type=int, default=5000, help="transactions per wallet")
+    parser.add_argument("--history-limit", type=int, default=100)
+    parser.add_argument("--token-list-size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--check-hot-wallets", action="store_true",
+                        help="verify the hot-wallet subscriptions against the stand-in instead of benchmarking")
+    parser.add_argument("--serve-fakes", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serve_fakes:
+        import uvicorn
+        uvicorn.run(build_fake_upstream(args), host="127.0.0.1", port=args.serve_fakes, log_level="warning")
+        return
+    upstream_port, app_port = free_port(), free_port()
+    upstream, app_url = f"http://127.0.0.1:{upstream_port}", f"http://127.0.0.1:{app_port}"
+    processes = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        try:
+            processes.append(start_process([sys.executable, os.path.abspath(__file__), *(argv or sys.argv[1:]),
+                                            "--serve-fakes", str(upstream_port)]))
+            wait_until_up(upstream)
+            environment = app_environment(upstream, cache_dir)
+            if args.check_hot_wallets:
+                # Reseeds would hide a missed notification
+                environment.update(HOT_WALLETS_PINNED=HOT_WALLET, HOT_WALLET_RESEED_SECONDS="3600")
+            processes.append(start_process([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                            "--port", str(app_port), "--workers", str(args.workers),
+                                            "--log-level", "warning"], environment))
+            wait_until_up(f"{app_url}/ready")
+            if args.check_hot_wallets:
+                checks = check_hot_wallets(app_url, upstream)
+                print(json.dumps(checks, indent=2))
+                raise SystemExit(0 if all(c["passed"] for c in checks) else 1)
+            results = asyncio.run(drive(app_url, args))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "serve_fakes")},
+        "results": results
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
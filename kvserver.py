@@ -0,0 +1,102 @@
+"""
+Minimal in-memory key/value server speaking the Redis protocol, for sharing the price and quote
+caches between hosts when Redis itself is not available:
+
+    python kvserver.py --port 6380
+    SHARED_KV_URL=redis://kv-host:6380 uvicorn main:app --workers 4
+
+Supports PING, GET, SET (with EX/PX), MGET, DEL, DBSIZE and FLUSHDB; nothing is persisted.
+"""
+import argparse
+import asyncio
+import time
+
+store = {}  # key -> (value, expires_at or None)
+
+def lookup(key: bytes):
+    entry = store.get(key)
+    if entry is None:
+        return None
+    if entry[1] is not None and entry[1] <= time.monotonic():
+        del store[key]
+        return None
+    return entry[0]
+
+def bulk(value) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+def execute(args: list) -> bytes:
+    command = args[0].upper()
+    if command == b"PING":
+        return b"+PONG\r\n"
+    if command == b"GET" and len(args) == 2:
+        return bulk(lookup(args[1]))
+    if command == b"MGET" and len(args) > 1:
+        return b"*%d\r\n" % (len(args) - 1) + b"".join(bulk(lookup(key)) for key in args[1:])
+    if command == b"SET" and len(args) in (3, 5):
+        expires_at = None
+        if len(args) == 5:
+            unit = args[3].upper()
+            if unit not in (b"EX", b"PX"):
+                return b"-ERR syntax error\r\n"
+            expires_at = time.monotonic() + int(args[4]) / (1 if unit == b"EX" else 1000)
+        store[args[1]] = (args[2], expires_at)
+        return b"+OK\r\n"
+    if command == b"DEL" and len(args) > 1:
+        return b":%d\r\n" % sum(store.pop(key, None) is not None for key in args[1:])
+    if command == b"DBSIZE":
+        return b":%d\r\n" % len(store)
+    if command == b"FLUSHDB":
+        store.clear()
+        return b"+OK\r\n"
+    if command == b"SELECT":
+        return b"+OK\r\n"
+    return b"-ERR unknown command or wrong number of arguments\r\n"
+
+async def read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, as typed into telnet
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            args = await read_command(reader)
+            if args is None:
+                break
+            if args:
+                writer.write(execute(args))
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def sweep_forever():
+    """Drop expired keys now and then, so keys that are never read again do not pile up."""
+    while True:
+        await asyncio.sleep(30)
+        now = time.monotonic()
+        for key in [k for k, (_, expires_at) in store.items() if expires_at is not None and expires_at <= now]:
+            del store[key]
+
+async def main(host: str, port: int):
+    server = await asyncio.start_server(handle, host, port)
+    asyncio.get_running_loop().create_task(sweep_forever())
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol cache server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port))
@@ -1,18 +1,208 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+from solders.pubkey import Pubkey
+import asyncio
+import base58
+import contextvars
+import functools
+import hashlib
+import heapq
+import httpx
+import inspect
+import json
+import math
+import mmap
+import numpy as np
+from array import array
+from base64 import b64decode, urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, defaultdict, deque
 from decimal import Decimal
-from functools import lru_cache
-from random import shuffle
+from difflib import get_close_matches
+from email.utils import parsedate_to_datetime
+from random import random, randrange
+from urllib.parse import urlsplit
 import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+try:
+    import h2  # noqa: F401 -- httpx only negotiates HTTP/2 when the h2 package is installed
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def finite_floats(value):
+    """`value` with NaN and infinite floats replaced by None, as orjson writes them."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: finite_floats(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite_floats(v) for v in value]
+    return value
+
+def dumps_json(content) -> bytes:
+    """Compact JSON, through orjson when it is installed; NaN and infinities become null either way."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+    except ValueError:
+        # Rare enough that only the content that needs it pays for the rewrite
+        return json.dumps(finite_floats(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+# Response shaping: any JSON endpoint takes ?fields=, ?precision=, ?layout=table and ?compact=true
+# Keys kept whatever `fields` selects, so errors and partial results stay visible
+SHAPE_ALWAYS_KEPT = frozenset(("type", "error", "details", "incomplete", "missing"))
+SHAPE_MAX_PRECISION = 17
+# What ?compact=true stands for, besides plain-text transaction summaries
+COMPACT_PRECISION = int(os.getenv("COMPACT_PRECISION", "6"))
+# Declared on every route in the OpenAPI spec (GPT actions only send declared parameters)
+SHAPE_PARAMETERS = [
+    {"name": "fields", "in": "query", "required": False, "schema": {"type": "string"},
+     "description": "Comma-separated keys to keep; dotted paths reach into nested objects and lists, e.g. total_usd,tokens.symbol"},
+    {"name": "precision", "in": "query", "required": False,
+     "schema": {"type": "integer", "minimum": 1, "maximum": SHAPE_MAX_PRECISION},
+     "description": "Round decimal numbers to this many significant digits"},
+    {"name": "layout", "in": "query", "required": False, "schema": {"type": "string", "enum": ["objects", "table"]},
+     "description": "table sends lists of objects as column names plus rows"},
+    {"name": "compact", "in": "query", "required": False, "schema": {"type": "boolean"},
+     "description": "Table layout, 6 significant digits and plain-text transaction summaries"}
+]
+# Routes whose output is not JSON, so shaping does not apply
+SHAPE_EXCLUDED_ROUTES = {"/metrics"}
+
+_response_shape = contextvars.ContextVar("response_shape", default=None)
+
+def compact_summary(summary: str) -> str:
+    """A transaction summary without markdown emphasis and with short instruction labels."""
+    summary = summary.replace("**", "")
+    summary = re.sub(r"^Instruction (\d+): ", r"\1. ", summary, flags=re.M)
+    return re.sub(r"^(\s*)- Inner instruction ([\d.]+): ", r"\1\2. ", summary, flags=re.M)
+
+class ResponseShape:
+    """
+    How the current request wants its JSON: `fields` keeps only the named (dotted) keys, looking
+    through lists, so `tokens.symbol` picks the symbol of every token; `precision` rounds floats to
+    that many significant digits; the table layout turns lists of objects into column names plus
+    rows; `compact` is the table layout at COMPACT_PRECISION with plain-text transaction summaries.
+    """
+
+    def __init__(self, fields: Optional[str], precision: Optional[int], table: bool, compact: bool):
+        self.fields = None
+        if fields:
+            self.fields = {}
+            for path in fields.split(","):
+                node = self.fields
+                for part in path.strip().split("."):
+                    if part:
+                        node = node.setdefault(part, {})
+        self.precision = precision
+        self.table = table
+        self.compact = compact
+        # Responses cached per route are cached per shape as well
+        self.key = (fields, precision, table, compact)
+
+    @classmethod
+    def from_query(cls, params) -> Optional["ResponseShape"]:
+        """The shape asked for by the query string, None when it asks for none; ValueError on bad values."""
+        fields, precision, layout = params.get("fields"), params.get("precision"), params.get("layout")
+        compact = params.get("compact", "").lower() in ("1", "true", "yes")
+        if not (fields or precision or layout or compact):
+            return None
+        if precision is not None:
+            if not precision.isdigit() or not 1 <= int(precision) <= SHAPE_MAX_PRECISION:
+                raise ValueError(f"precision must be between 1 and {SHAPE_MAX_PRECISION}")
+            precision = int(precision)
+        if layout not in (None, "table", "objects"):
+            raise ValueError("layout must be 'table' or 'objects'")
+        if compact:
+            precision = precision or COMPACT_PRECISION
+            layout = layout or "table"
+        return cls(fields, precision, layout == "table", compact)
+
+    def apply(self, content, table: bool = True):
+        """`content` (JSON-ready) reshaped; `table=False` for records streamed one at a time."""
+        return self._shape(content, self.fields, table and self.table)
+
+    def _shape(self, value, fields, table: bool, key: str = None):
+        if isinstance(value, dict):
+            if fields:
+                value = {k: v for k, v in value.items() if k in fields or k in SHAPE_ALWAYS_KEPT}
+            return {k: self._shape(v, fields.get(k) if fields else None, table, k) for k, v in value.items()}
+        if isinstance(value, list):
+            items = [self._shape(v, fields, table, key) for v in value]
+            if table and items and all(isinstance(v, dict) for v in items):
+                columns = list(dict.fromkeys(k for item in items for k in item))
+                return {"columns": columns, "rows": [[item.get(c) for c in columns] for item in items]}
+            return items
+        if isinstance(value, float):
+            if self.precision is not None and math.isfinite(value) and value:
+                return round(value, self.precision - 1 - math.floor(math.log10(abs(value))))
+            return value
+        if self.compact and key == "summary" and isinstance(value, str):
+            return compact_summary(value)
+        return value
+
+def shaped_record(item) -> bytes:
+    """One streamed record (an NDJSON line or SSE payload) in the current request's shape."""
+    shape = _response_shape.get()
+    return dumps_json(shape.apply(item, table=False) if shape is not None else item)
+
+class ShapedJSONResponse(JSONResponse):
+    """JSON in the current request's shape (see ResponseShape), serialized by dumps_json."""
+
+    def render(self, content) -> bytes:
+        shape = _response_shape.get()
+        return dumps_json(shape.apply(content) if shape is not None else content)
 
 app = FastAPI(
     title="SolanaGPT",
     description="Poof Labs Solana degen trading assistant",
     version="1.0",
-    servers=[{"url": "https://solgpt-production-e0e4.up.railway.app"}]
+    servers=[{"url": "https://solgpt-production-e0e4.up.railway.app"}],
+    default_response_class=ShapedJSONResponse
 )
 
+def openapi_with_shape_parameters() -> dict:
+    """The app's OpenAPI schema, with the response shaping parameters on every JSON operation."""
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        for path, operations in schema.get("paths", {}).items():
+            if path in SHAPE_EXCLUDED_ROUTES:
+                continue
+            for operation in operations.values():
+                parameters = operation.setdefault("parameters", [])
+                declared = {p.get("name") for p in parameters}
+                parameters.extend(p for p in SHAPE_PARAMETERS if p["name"] not in declared)
+    return app.openapi_schema
+
+app.openapi = openapi_with_shape_parameters
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -26,6 +216,7 @@ HELIUS_METADATA_API_KEY = os.getenv("HELIUS_METADATA_API_KEY", "a8b4eafc-da15-47
 ALCHEMY_API_KEY = os.getenv("ALCHEMY_API_KEY", "YOUR_API_KEY")
 SYNDICA_API_KEY = os.getenv("SYNDICA_API_KEY", "YOUR_API_KEY")
 PUMPFUN_API_BASE = os.getenv("PUMPFUN_API_BASE", "https://frontend-api.pump.fun")
+COINGECKO_API_BASE = os.getenv("COINGECKO_API_BASE", "https://api.coingecko.com/api/v3")
 
 # Solana RPC endpoints (including some that require API keys)
 RPC_ENDPOINTS = [
@@ -41,424 +232,4194 @@ RPC_ENDPOINTS = [
     "https://api.metaplex.solana.com",
     f"https://solana-api.syndica.io/access-token/{SYNDICA_API_KEY}/rpc"
 ]
+# A comma-separated RPC_ENDPOINTS replaces the list (e.g. to point at a private node or the stand-ins in bench.py)
+if os.getenv("RPC_ENDPOINTS"):
+    RPC_ENDPOINTS = [url.strip() for url in os.getenv("RPC_ENDPOINTS").split(",") if url.strip()]
 
-JUPITER_TOKEN_INFO_URL = "https://tokens.jup.ag/token/"
-JUPITER_PRICE_URL = "https://api.jup.ag/price/v2?ids="
-JUPITER_TOKEN_LIST_URL = "https://token.jup.ag/all"
+JUPITER_TOKEN_INFO_URL = os.getenv("JUPITER_TOKEN_INFO_URL", "https://tokens.jup.ag/token/")
+JUPITER_PRICE_URL = os.getenv("JUPITER_PRICE_URL", "https://api.jup.ag/price/v2?ids=")
+JUPITER_TOKEN_LIST_URL = os.getenv("JUPITER_TOKEN_LIST_URL", "https://token.jup.ag/all")
+JUPITER_QUOTE_URL = os.getenv("JUPITER_QUOTE_URL", "https://lite-api.jup.ag/quote")
+HELIUS_API_BASE = os.getenv("HELIUS_API_BASE", "https://api.helius.xyz")
 TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+TOKEN_2022_PROGRAM_ID = "TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb"
+WSOL_MINT = "So11111111111111111111111111111111111111112"
+
+# Metrics: counters, gauges and latency histograms kept in process, rendered in Prometheus text format
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+class Metrics:
+    """Series are keyed by (name, labels), where labels is a tuple of (label, value) pairs."""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.gauges = defaultdict(float)
+        # (name, labels) -> per-bucket counts, then sum and count
+        self.histograms = {}
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1.0):
+        self.counters[(name, labels)] += value
+
+    def add(self, name: str, labels: tuple, delta: float):
+        self.gauges[(name, labels)] += delta
+
+    def observe(self, name: str, labels: tuple, seconds: float):
+        series = self.histograms.get((name, labels))
+        if series is None:
+            series = self.histograms[(name, labels)] = [0] * len(METRICS_LATENCY_BUCKETS) + [0.0, 0]
+        i = bisect_left(METRICS_LATENCY_BUCKETS, seconds)
+        if i < len(METRICS_LATENCY_BUCKETS):
+            series[i] += 1
+        series[-2] += seconds
+        series[-1] += 1
+
+    @staticmethod
+    def _labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        escape = lambda v: str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+    def render(self, gauges: dict = None) -> str:
+        """Prometheus text exposition of every series, plus `gauges` ({(name, labels): value}) sampled at scrape time."""
+        by_name = defaultdict(list)
+        for kind, series in (("counter", self.counters), ("gauge", {**self.gauges, **(gauges or {})})):
+            for (name, labels), value in series.items():
+                by_name[(name, kind)].append(f"{name}{self._labels(labels)} {value:g}")
+        for (name, labels), series in self.histograms.items():
+            cumulative = 0
+            lines = by_name[(name, "histogram")]
+            for bound, count in zip(METRICS_LATENCY_BUCKETS, series):
+                cumulative += count
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {series[-2]:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {series[-1]}")
+        out = []
+        for (name, kind), lines in sorted(by_name.items()):
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+metrics = Metrics()
+
+# Upstream time spent on behalf of the current request, for the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def record_timing(name: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+def error_type(exc: BaseException) -> str:
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.ConnectError):
+        return "connect"
+    if isinstance(exc, httpx.HTTPError):
+        return "transport"
+    return type(exc).__name__
+
+# Request deadlines: each request gets a time budget that every upstream call draws from
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+REQUEST_DEADLINE_MAX_SECONDS = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "60"))
+# Callers may ask for a tighter (or, up to the max, looser) budget in seconds
+REQUEST_DEADLINE_HEADER = "x-request-deadline"
+# Budget held back from optional enrichment steps for the work that follows and for assembling the response
+DEADLINE_RESERVE_SECONDS = float(os.getenv("DEADLINE_RESERVE_SECONDS", "0.25"))
+
+_request_deadline = contextvars.ContextVar("request_deadline", default=None)
+# Parts of the response left out because the budget ran out
+_request_incomplete = contextvars.ContextVar("request_incomplete", default=None)
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before an upstream call could be made."""
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request."""
+    deadline = _request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def budget_timeout(timeout: float) -> float:
+    """`timeout` shrunk to the time left in the request's budget; raises DeadlineExceeded once none is left."""
+    remaining = remaining_budget()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(timeout, remaining)
+
+def mark_incomplete(part: str):
+    parts = _request_incomplete.get()
+    if parts is not None and part not in parts:
+        parts.append(part)
+
+def with_incomplete_marker(result: dict) -> dict:
+    """Flag a response as partial, naming what is missing, if the budget ran out while building it."""
+    parts = _request_incomplete.get()
+    if parts:
+        result["incomplete"] = True
+        result["missing"] = list(parts)
+    return result
+
+def detached_task(awaitable, background: bool = False, context: Optional[contextvars.Context] = None) -> asyncio.Task:
+    """
+    Run `awaitable` as a task free of the current request's deadline, for work other requests share or reuse.
+    `background` also drops it to PRIORITY_BACKGROUND, for refreshes and warm-ups no caller is waiting on.
+    """
+    context = context or contextvars.copy_context()
+    context.run(_request_deadline.set, None)
+    if background:
+        context.run(_request_priority.set, PRIORITY_BACKGROUND)
+    async def run():
+        return await awaitable
+    return asyncio.get_running_loop().create_task(run(), context=context)
+
+async def within_budget(awaitable, fallback, part: str, reserve: float = DEADLINE_RESERVE_SECONDS):
+    """
+    Await an optional step for at most the remaining budget (less `reserve`). When time runs out,
+    `part` is recorded as missing and `fallback` returned; the step keeps running in the background
+    so the caches it fills make the next request more likely to come back complete.
+    """
+    remaining = remaining_budget()
+    if remaining is None:
+        return await awaitable
+    context = contextvars.copy_context()
+    task = detached_task(awaitable, context=context)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), max(remaining - reserve, 0))
+    except asyncio.TimeoutError:
+        # Nobody waits on the rest, so it no longer competes with interactive callers for upstream budget
+        context.run(_request_priority.set, PRIORITY_BACKGROUND)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        mark_incomplete(part)
+        return fallback
+
+@app.middleware("http")
+async def instrument_requests(request, call_next):
+    """
+    Time each request by route and, when SERVER_TIMING_ENABLED, report upstream time in a Server-Timing header.
+    Also starts the request's deadline budget, sets its upstream queueing priority and reads its response shape.
+    """
+    timings = {}
+    start = time.monotonic()
+    try:
+        budget = min(float(request.headers.get(REQUEST_DEADLINE_HEADER, REQUEST_DEADLINE_SECONDS)), REQUEST_DEADLINE_MAX_SECONDS)
+    except ValueError:
+        budget = REQUEST_DEADLINE_SECONDS
+    priority = request.headers.get(REQUEST_PRIORITY_HEADER)
+    if priority not in ("interactive", "batch"):
+        priority = "batch" if request.url.path.startswith(BATCH_ROUTES) else "interactive"
+    try:
+        shape = ResponseShape.from_query(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=422)
+    request_vars = (_request_timings, _request_deadline, _request_incomplete, _request_priority, _response_shape)
+    tokens = tuple(var.set(value) for var, value in zip(request_vars, (
+        timings, start + budget, [], PRIORITY_BATCH if priority == "batch" else PRIORITY_INTERACTIVE, shape
+    )))
+    try:
+        response = await call_next(request)
+    finally:
+        for var, token in zip(request_vars, tokens):
+            var.reset(token)
+    elapsed = time.monotonic() - start
+    route = request.scope.get("route")
+    labels = (("route", route.path if route is not None else "unmatched"), ("method", request.method))
+    metrics.observe("http_request_duration_seconds", labels, elapsed)
+    metrics.inc("http_responses_total", labels + (("status", response.status_code),))
+    if SERVER_TIMING_ENABLED:
+        parts = [f'{name.replace(":", "_")};dur={total * 1000:.1f};desc="{count} calls"'
+                 for name, (total, count) in sorted(timings.items())]
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+    return response
+
+# Response cache for read endpoints: per-route TTL, ETag/304, stale-while-revalidate, collapsed misses
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+
+class ResponseCache:
+    """
+    Rendered responses of one route, keyed by its parameters. An entry is served as is for `ttl`
+    seconds, then for `stale` more seconds while a background refresh replaces it; past that a
+    request recomputes it. Concurrent misses for one key share a single computation. Errors and
+    partial (incomplete) results are never stored.
+    """
+
+    def __init__(self, route: str, ttl: float, stale: float, max_entries: int):
+        self.route = route
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stored_at, body, headers, etag)
+        self._inflight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.not_modified = 0
+        self.refresh_errors = 0
+
+    async def respond(self, request: Request, key: tuple, compute) -> Response:
+        entry = self._entries.get(key)
+        age = time.monotonic() - entry[0] if entry is not None else math.inf
+        if age < self.ttl:
+            self.hits += 1
+            status = "HIT"
+        elif age < self.ttl + self.stale:
+            self.stale_hits += 1
+            status = "STALE"
+            if key not in self._inflight:
+                # Nobody waits on the refresh, so no request's deadline applies to it
+                self._start(key, compute, detached=True)
+        else:
+            self.misses += 1
+            status = "MISS"
+            task = self._inflight.get(key)
+            if task is None:
+                task = self._start(key, compute, detached=False)
+            else:
+                self.coalesced += 1
+            # Shielded so one caller going away does not cancel the computation for the others
+            entry = await asyncio.shield(task)
+            age = 0.0
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        _, body, headers, etag = entry
+        cache_headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={max(int(self.ttl - age), 0)}, stale-while-revalidate={int(self.stale)}",
+            "X-Cache": status
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=cache_headers)
+        return Response(body, headers={**headers, **cache_headers})
+
+    def _start(self, key: tuple, compute, detached: bool) -> asyncio.Task:
+        task = detached_task(self._compute(key, compute), background=True) if detached else asyncio.ensure_future(self._compute(key, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finished(key, t, detached))
+        return task
+
+    def _finished(self, key: tuple, task: asyncio.Task, detached: bool):
+        self._inflight.pop(key, None)
+        if detached and not task.cancelled() and task.exception() is not None:
+            # The stale entry stays until it expires; the next stale hit retries
+            self.refresh_errors += 1
+
+    async def _compute(self, key: tuple, compute) -> tuple:
+        # A fresh incomplete list, so only this computation's own shortfalls mark the result
+        _request_incomplete.set([])
+        result, headers = await compute()
+        if isinstance(result, Response):
+            body = result.body
+            headers = {**headers, **{k: v for k, v in result.headers.items() if k.lower() != "content-length"}}
+        else:
+            rendered = ShapedJSONResponse(jsonable_encoder(result))
+            body = rendered.body
+            headers = {**headers, "content-type": rendered.headers["content-type"]}
+        entry = (time.monotonic(), body, headers, f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"')
+        if not (isinstance(result, dict) and result.get("incomplete")):
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "not_modified": self.not_modified,
+            "refresh_errors": self.refresh_errors,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else None
+        }
+
+response_caches = {}
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison, as If-None-Match calls for
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def cached_response(ttl: float, stale: float = 0, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+    """
+    Serve a route through a ResponseCache keyed by its parameters. Goes under the @app.get decorator.
+    A `response` parameter the route uses to set headers gets a fresh Response per computation,
+    and its headers are stored with the entry.
+    """
+    def decorate(endpoint):
+        if not RESPONSE_CACHE_ENABLED:
+            return endpoint
+        cache = response_caches[endpoint.__name__] = ResponseCache(endpoint.__name__, ttl, stale, max_entries)
+        parameters = list(inspect.signature(endpoint).parameters.values())
+
+        @functools.wraps(endpoint)
+        async def wrapper(cache_request: Request, **kwargs):
+            async def compute():
+                call_kwargs = dict(kwargs)
+                if "response" in call_kwargs:
+                    call_kwargs["response"] = Response()
+                result = await endpoint(**call_kwargs)
+                headers = {}
+                if "response" in call_kwargs:
+                    headers = {k: v for k, v in call_kwargs["response"].headers.items() if k.lower() != "content-length"}
+                return result, headers
+            key = tuple(sorted((name, value) for name, value in kwargs.items() if name != "response"))
+            shape = _response_shape.get()
+            if shape is not None:
+                key += (("__shape", shape.key),)
+            return await cache.respond(cache_request, key, compute)
+
+        # FastAPI reads the route's parameters from this signature: the endpoint's own plus the request
+        wrapper.__signature__ = inspect.Signature(
+            [inspect.Parameter("cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)]
+            + [p.replace(kind=inspect.Parameter.KEYWORD_ONLY) for p in parameters]
+        )
+        return wrapper
+    return decorate
+
+# Shared upstream HTTP client configuration (one keep-alive pool per upstream host)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes") and HTTP2_AVAILABLE
+
+_http_clients = {}
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """Return the shared async client for the host of `url`, creating its connection pool on first use."""
+    host = urlsplit(url).netloc
+    client = _http_clients.get(host)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        _http_clients[host] = client
+    return client
+
+# Upstream rate limits: a token bucket per upstream, sized from its plan. Calls over budget queue,
+# interactive requests ahead of batch jobs and background refreshes; a request that would queue
+# longer than it can wait is shed with 503 + Retry-After instead of spending quota on a late answer.
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Requests per second and burst, from the free tiers; paid plans override them,
+# e.g. UPSTREAM_RATE_LIMITS="coingecko=8:20,jupiter=10:20"
+UPSTREAM_RATE_LIMITS = {
+    "coingecko": (0.5, 5),  # Demo plan: 30 calls/minute
+    "jupiter": (1.0, 10),  # Free plan: 60 requests/minute
+    "helius": (2.0, 10),  # Free plan: 2 requests/second on the enhanced APIs
+    "pumpfun": (5.0, 10)
+}
+for _item in filter(None, os.getenv("UPSTREAM_RATE_LIMITS", "").split(",")):
+    _name, _, _spec = _item.partition("=")
+    _rate, _, _burst = _spec.partition(":")
+    UPSTREAM_RATE_LIMITS[_name.strip()] = (float(_rate), float(_burst or _rate))
+UPSTREAM_URL_PREFIXES = {
+    "coingecko": [COINGECKO_API_BASE],
+    "jupiter": [JUPITER_TOKEN_INFO_URL, JUPITER_PRICE_URL, JUPITER_TOKEN_LIST_URL, JUPITER_QUOTE_URL],
+    "helius": [HELIUS_API_BASE],
+    "pumpfun": [PUMPFUN_API_BASE]
+}
+# Longest queue wait a request accepts before it is shed (and never more than its remaining budget)
+LOAD_SHED_QUEUE_SECONDS = float(os.getenv("LOAD_SHED_QUEUE_SECONDS", "2"))
+UPSTREAM_RETRY_AFTER_MAX_SECONDS = 60
+
+PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND = 0, 1, 2
+# "interactive" or "batch"; without it, requests to BATCH_ROUTES are batch and the rest interactive
+REQUEST_PRIORITY_HEADER = "x-request-priority"
+BATCH_ROUTES = ("/balances/batch", "/transaction/prefetch", "/history/")
+# Work outside any request (index refreshes, pollers) is background
+_request_priority = contextvars.ContextVar("request_priority", default=PRIORITY_BACKGROUND)
+
+class UpstreamOverloaded(HTTPException):
+    """An upstream's queue is longer than the request can wait; answered as 503 with Retry-After."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"Upstream {upstream} is at its rate limit; retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+class TokenBucket:
+    """
+    Requests-per-second budget for one upstream. A call takes a token if one is free; otherwise it
+    waits in a priority queue (lower priority value first, FIFO within a priority) that is served
+    as tokens refill.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._waiters = []  # heap of (priority, sequence, future)
+        self._sequence = 0
+        self._timer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def expected_wait(self, priority: int) -> float:
+        """Seconds until a call queued now at `priority` would get its token."""
+        self._refill()
+        ahead = sum(1 for p, _, future in self._waiters if p <= priority and not future.done())
+        return max(ahead + 1 - self.tokens, 0) / self.rate
+
+    def check(self):
+        """Raise UpstreamOverloaded if the current request could not get a token in time. Outside requests nothing is shed."""
+        remaining = remaining_budget()
+        if remaining is None:
+            return
+        wait = self.expected_wait(_request_priority.get())
+        if wait > min(LOAD_SHED_QUEUE_SECONDS, remaining):
+            metrics.inc("upstream_shed_total", (("upstream", self.name),))
+            raise UpstreamOverloaded(self.name, wait)
+
+    async def acquire(self):
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        self.check()
+        future = asyncio.get_running_loop().create_future()
+        self._sequence += 1
+        heapq.heappush(self._waiters, (_request_priority.get(), self._sequence, future))
+        self._schedule()
+        start = time.monotonic()
+        try:
+            # A cancelled caller cancels its future, which _wake then skips
+            await future
+        finally:
+            metrics.observe("upstream_queue_wait_seconds", (("upstream", self.name),), time.monotonic() - start)
+
+    def throttle(self, seconds: float):
+        """Spend the budget for the next `seconds`, after the upstream said it is over its limit."""
+        self._refill()
+        # The next token comes free once the period is over
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+        metrics.inc("upstream_rate_limited_total", (("upstream", self.name),))
+
+    def _schedule(self):
+        if self._timer is None and self._waiters:
+            delay = max((1 - self.tokens) / self.rate, 0)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        self._schedule()
+
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+upstream_limiters = {name: TokenBucket(name, rate, burst) for name, (rate, burst) in UPSTREAM_RATE_LIMITS.items()}
+# Longest prefix first, so a more specific URL wins
+_upstream_prefixes = sorted(
+    ((url.split("?")[0], name) for name, urls in UPSTREAM_URL_PREFIXES.items() for url in urls if name in upstream_limiters),
+    key=lambda item: -len(item[0])
+)
+
+def upstream_limiter(url: str) -> Optional[TokenBucket]:
+    if not RATE_LIMITS_ENABLED:
+        return None
+    for prefix, name in _upstream_prefixes:
+        if url.startswith(prefix):
+            return upstream_limiters[name]
+    return None
+
+def retry_after_seconds(resp: httpx.Response) -> float:
+    """Delay from a 429's Retry-After header (seconds or an HTTP date), 1 second if missing."""
+    value = resp.headers.get("retry-after")
+    if not value:
+        return 1.0
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            seconds = 1.0
+    return min(max(seconds, 0.0), UPSTREAM_RETRY_AFTER_MAX_SECONDS)
+
+async def _tracked_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Send a request through the pooled client for its host, recording latency, errors and in-flight count.
+    The timeout is cut to what is left of the request's deadline. Calls to rate-limited upstreams take
+    a token from its budget first; a 429 spends the budget for the Retry-After period and is retried once.
+    """
+    limiter = upstream_limiter(url)
+    for attempt in range(2):
+        if limiter is not None:
+            await limiter.acquire()
+        resp = await _send_request(method, url, **kwargs)
+        if resp.status_code != 429 or limiter is None or attempt:
+            return resp
+        limiter.throttle(retry_after_seconds(resp))
+
+async def _send_request(method: str, url: str, **kwargs) -> httpx.Response:
+    host = urlsplit(url).netloc
+    labels = (("host", host),)
+    try:
+        kwargs["timeout"] = budget_timeout(kwargs.get("timeout", 5))
+    except DeadlineExceeded:
+        metrics.inc("upstream_errors_total", labels + (("type", "deadline"),))
+        raise
+    metrics.add("upstream_in_flight", labels, 1)
+    start = time.monotonic()
+    try:
+        resp = await get_http_client(url).request(method, url, **kwargs)
+    except asyncio.CancelledError:
+        # Lost hedges and abandoned requests are not upstream latency
+        metrics.inc("upstream_cancelled_total", labels)
+        raise
+    except Exception as e:
+        metrics.inc("upstream_errors_total", labels + (("type", error_type(e)),))
+        raise
+    finally:
+        metrics.add("upstream_in_flight", labels, -1)
+        elapsed = time.monotonic() - start
+        record_timing(host, elapsed)
+    metrics.observe("upstream_request_duration_seconds", labels, elapsed)
+    if resp.status_code >= 400:
+        metrics.inc("upstream_errors_total", labels + (("type", f"http_{resp.status_code}"),))
+    return resp
+
+async def http_get(url: str, timeout: float = 5, **kwargs) -> httpx.Response:
+    """GET `url` through the pooled client for its host."""
+    return await _tracked_request("GET", url, timeout=timeout, **kwargs)
+
+async def http_post(url: str, json=None, timeout: float = 5, **kwargs) -> httpx.Response:
+    """POST `json` to `url` through the pooled client for its host."""
+    return await _tracked_request("POST", url, json=json, timeout=timeout, **kwargs)
+
+async def open_connection(url: str):
+    """Open a pooled connection (TLS handshake included) to the host of `url` with a HEAD of its root."""
+    parts = urlsplit(url)
+    await _send_request("HEAD", f"{parts.scheme}://{parts.netloc}/", timeout=5)
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Close every pooled upstream connection on shutdown."""
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+# RPC routing: latency/error scoring, circuit breaking and hedged requests
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "5"))
+# Endpoints tried, best first, for a streamed call before giving up
+RPC_STREAM_ATTEMPTS = 3
+# Timed getSlot calls per endpoint when the router is probed at startup
+RPC_PROBE_ROUNDS = int(os.getenv("RPC_PROBE_ROUNDS", "3"))
+RPC_EWMA_ALPHA = float(os.getenv("RPC_EWMA_ALPHA", "0.2"))
+RPC_DEFAULT_LATENCY = float(os.getenv("RPC_DEFAULT_LATENCY", "0.5"))
+RPC_BREAKER_FAILURES = int(os.getenv("RPC_BREAKER_FAILURES", "3"))
+RPC_BREAKER_COOLDOWN = float(os.getenv("RPC_BREAKER_COOLDOWN", "30"))
+RPC_HEDGE_MIN_DELAY = float(os.getenv("RPC_HEDGE_MIN_DELAY", "0.05"))
+RPC_HEDGE_MAX_DELAY = float(os.getenv("RPC_HEDGE_MAX_DELAY", "2"))
+RPC_EXPLORE_RATIO = float(os.getenv("RPC_EXPLORE_RATIO", "0.05"))
+RPC_BATCH_MAX_SIZE = int(os.getenv("RPC_BATCH_MAX_SIZE", "50"))
+RPC_BATCH_RETRY_SECONDS = float(os.getenv("RPC_BATCH_RETRY_SECONDS", "600"))
+RPC_LATENCY_SAMPLES = 100
+# JSON-RPC error codes that say the node is unhealthy (behind, overloaded, failing), as opposed
+# to the request being bad: only these, transport errors and non-2xx replies count against the breaker
+RPC_NODE_UNHEALTHY_CODES = {-32005, -32016, -32603, -32429}
+# Codes for data this node lacks (pruned or not yet seen) or a method it does not serve: another node may answer
+RPC_NODE_LACKS_CODES = {-32001, -32004, -32007, -32009, -32010, -32011, -32014, -32601}
+
+class RpcEmptyResult(Exception):
+    """The node answered with a null result; another node (less pruned, less behind) may have one."""
+
+    def __init__(self, label: str, data: dict):
+        super().__init__(f"Empty RPC result from {label}")
+        self.data = data
+
+class RpcClientError(Exception):
+    """The node answered 2xx but rejected the request itself (e.g. an invalid param); other endpoints would too."""
+
+    def __init__(self, code, message: str):
+        super().__init__(f"RPC error {code}: {message}")
+        self.code = code
+        self.message = message
+
+class RpcEndpointStats:
+    """Rolling health of one RPC endpoint: latency EWMA, error rate, p90 and circuit-breaker state."""
+
+    def __init__(self, url: str):
+        self.url = url
+        # Never expose API keys embedded in the path or query string
+        self.label = urlsplit(url).netloc
+        self.latency_ewma = None
+        self.error_rate = 0.0
+        self.samples = deque(maxlen=RPC_LATENCY_SAMPLES)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.batch_rejected_at = None
+
+    def p90(self):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.9 * (len(ordered) - 1))]
+
+    def score(self) -> float:
+        """Expected seconds to a good answer: latency inflated by the chance of having to retry elsewhere."""
+        if self.latency_ewma is None and not self.failures:
+            # Unmeasured endpoints go first so every endpoint gets a latency sample
+            return 0.0
+        latency = self.latency_ewma if self.latency_ewma is not None else RPC_DEFAULT_LATENCY
+        return latency / max(1.0 - self.error_rate, 0.05)
+
+    def hedge_delay(self) -> float:
+        p90 = self.p90() if len(self.samples) >= 5 else None
+        delay = p90 if p90 is not None else RPC_DEFAULT_LATENCY
+        return min(max(delay, RPC_HEDGE_MIN_DELAY), RPC_HEDGE_MAX_DELAY)
+
+    def accepts_batches(self, now: float) -> bool:
+        return self.batch_rejected_at is None or now - self.batch_rejected_at >= RPC_BATCH_RETRY_SECONDS
+
+    def available(self, now: float) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return now - self.opened_at >= RPC_BREAKER_COOLDOWN
+        # half-open: only one probe request at a time
+        return not self.probing
+
+    def acquire(self, now: float):
+        """Mark the endpoint as in use; an open breaker past its cool-down moves to half-open and probes."""
+        if self.state == "open" and now - self.opened_at >= RPC_BREAKER_COOLDOWN:
+            self.state = "half_open"
+        if self.state == "half_open":
+            self.probing = True
+
+    def release(self):
+        self.probing = False
 
-def get_rpc_response(payload: dict):
-    """Try the list of RPC endpoints until one returns a valid result."""
-    rpc_list = RPC_ENDPOINTS[:]
-    shuffle(rpc_list)
-    for url in rpc_list:
+    def record_success(self, latency: float):
+        self.requests += 1
+        self.samples.append(latency)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += RPC_EWMA_ALPHA * (latency - self.latency_ewma)
+        self.error_rate *= 1.0 - RPC_EWMA_ALPHA
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.probing = False
+
+    def record_failure(self, now: float):
+        self.requests += 1
+        self.failures += 1
+        self.error_rate += RPC_EWMA_ALPHA * (1.0 - self.error_rate)
+        self.consecutive_failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.consecutive_failures >= RPC_BREAKER_FAILURES:
+            self.state = "open"
+            self.opened_at = now
+
+    def snapshot(self) -> dict:
+        p90 = self.p90()
+        return {
+            "endpoint": self.label,
+            "state": self.state,
+            "score_ms": round(self.score() * 1000, 1),
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "p90_ms": round(p90 * 1000, 1) if p90 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "accepts_batches": self.accepts_batches(time.monotonic())
+        }
+
+class RpcRouter:
+    """Send each JSON-RPC call to the best-scoring endpoint, hedging to the next-best once it runs past its p90."""
+
+    def __init__(self, urls):
+        self.endpoints = [RpcEndpointStats(url) for url in urls]
+
+    def ranked(self, batch: bool = False):
+        """Endpoints that may take traffic right now, best score first."""
+        now = time.monotonic()
+        ready = [e for e in self.endpoints if e.available(now) and (not batch or e.accepts_batches(now))]
+        if batch:
+            return sorted(ready, key=lambda e: e.score())
+        if not ready:
+            # Every breaker is open: fall back to the ones that tripped longest ago rather than failing outright
+            return sorted(self.endpoints, key=lambda e: e.opened_at)
+        ready.sort(key=lambda e: e.score())
+        if len(ready) > 1 and random() < RPC_EXPLORE_RATIO:
+            # Occasionally lead with a lower-ranked endpoint so recovered endpoints can earn traffic back
+            ready.insert(0, ready.pop(randrange(1, len(ready))))
+        return ready
+
+    async def _attempt(self, endpoint: RpcEndpointStats, payload):
+        endpoint.acquire(time.monotonic())
+        labels = (("endpoint", endpoint.label), ("method", payload.get("method") if isinstance(payload, dict) else "batch"))
+        start = time.monotonic()
+        timeout = RPC_TIMEOUT
         try:
-            resp = requests.post(url, json=payload, timeout=5)
+            timeout = budget_timeout(RPC_TIMEOUT)
+            resp = await http_post(endpoint.url, json=payload, timeout=timeout)
+            # Any non-2xx reply (including 401/403 from a bad API key) is the endpoint's fault, whatever its body says
+            if not 200 <= resp.status_code < 300:
+                raise Exception(f"RPC status {resp.status_code} from {endpoint.label}")
             data = resp.json()
-            if data.get('result') is not None:
-                return data
+        except (asyncio.CancelledError, DeadlineExceeded):
+            # A hedge that lost the race says nothing about the endpoint's health
+            endpoint.release()
+            raise
+        except httpx.TimeoutException as e:
+            # Timing out on a timeout cut short by the request's deadline is not the endpoint's fault
+            if timeout < RPC_TIMEOUT:
+                endpoint.release()
+            else:
+                endpoint.record_failure(time.monotonic())
+            metrics.inc("rpc_errors_total", labels + (("type", error_type(e)),))
+            raise
+        except Exception as e:
+            endpoint.record_failure(time.monotonic())
+            metrics.inc("rpc_errors_total", labels + (("type", error_type(e)),))
+            raise
+        metrics.observe("rpc_request_duration_seconds", labels, time.monotonic() - start)
+        if isinstance(payload, list):
+            if not isinstance(data, list):
+                # Endpoint refuses batch requests: route batches elsewhere for a while, but it is not unhealthy
+                endpoint.release()
+                endpoint.batch_rejected_at = time.monotonic()
+                metrics.inc("rpc_errors_total", labels + (("type", "batch_rejected"),))
+                raise Exception(f"Batch request rejected by {endpoint.label}")
+            endpoint.record_success(time.monotonic() - start)
+            return data
+        if not isinstance(data, dict):
+            endpoint.record_failure(time.monotonic())
+            metrics.inc("rpc_errors_total", labels + (("type", "rpc_error"),))
+            raise Exception(f"Malformed RPC response from {endpoint.label}")
+        if "error" in data:
+            error = data["error"] if isinstance(data["error"], dict) else {"message": str(data["error"])}
+            code, message = error.get("code"), error.get("message") or "unknown error"
+            if code in RPC_NODE_UNHEALTHY_CODES:
+                endpoint.record_failure(time.monotonic())
+                metrics.inc("rpc_errors_total", labels + (("type", "node_unhealthy"),))
+                raise Exception(f"RPC error {code} from {endpoint.label}: {message}")
+            # The node answered; the round trip says nothing bad about its health
+            endpoint.record_success(time.monotonic() - start)
+            if code in RPC_NODE_LACKS_CODES:
+                metrics.inc("rpc_errors_total", labels + (("type", "node_lacks"),))
+                raise Exception(f"RPC error {code} from {endpoint.label}: {message}")
+            metrics.inc("rpc_errors_total", labels + (("type", "client_error"),))
+            raise RpcClientError(code, message)
+        endpoint.record_success(time.monotonic() - start)
+        if data.get("result") is None:
+            metrics.inc("rpc_errors_total", labels + (("type", "empty_result"),))
+            raise RpcEmptyResult(endpoint.label, data)
+        return data
+
+    async def call(self, payload, allow_empty: bool = False):
+        """
+        Return the first valid response, running at most one hedge alongside the primary request.
+        No new attempts are started once the request's deadline has passed.
+        A list payload is sent as a JSON-RPC batch, only to endpoints that accept batches.
+        A null result is retried elsewhere; with `allow_empty` it is the answer once every endpoint
+        that could be asked has returned null (otherwise an error).
+        A request the node rejects as invalid raises RpcClientError at once, without trying other endpoints.
+        """
+        candidates = iter(self.ranked(batch=isinstance(payload, list)))
+        pending = {}
+        empty = None
+
+        def launch():
+            remaining = remaining_budget()
+            if remaining is not None and remaining <= 0:
+                return False
+            endpoint = next(candidates, None)
+            if endpoint is None:
+                return False
+            task = asyncio.ensure_future(self._attempt(endpoint, payload))
+            pending[task] = (endpoint, time.monotonic())
+            return True
+
+        launch()
+        try:
+            while pending:
+                delay = None
+                if len(pending) < 2:
+                    # Hedge to the next-best endpoint once the in-flight request passes its own p90
+                    endpoint, started = next(iter(pending.values()))
+                    delay = max(started + endpoint.hedge_delay() - time.monotonic(), 0)
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if not launch():
+                        # Nothing left to hedge with; just wait for what is in flight
+                        await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                for task in done:
+                    pending.pop(task)
+                    if not task.exception():
+                        return task.result()
+                    if isinstance(task.exception(), RpcClientError):
+                        raise task.exception()
+                    if isinstance(task.exception(), RpcEmptyResult):
+                        empty = task.exception().data
+                # Failed requests are replaced immediately by the next-best endpoint
+                if not pending:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        remaining = remaining_budget()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        if allow_empty and empty is not None:
+            return empty
+        raise Exception("All RPC endpoints failed or timed out")
+
+    async def stream(self, payload: dict):
+        """
+        Yield the raw response body for `payload` in chunks as it arrives, from the best endpoint that
+        answers. There is no hedging: once bytes have been passed on, the call is committed to that
+        endpoint. Latency is recorded to the first byte, so large bodies do not skew the endpoint's score.
+        """
+        for endpoint in self.ranked()[:RPC_STREAM_ATTEMPTS]:
+            endpoint.acquire(time.monotonic())
+            labels = (("endpoint", endpoint.label), ("method", payload.get("method")))
+            start = time.monotonic()
+            committed = False
+            try:
+                async with get_http_client(endpoint.url).stream(
+                    "POST", endpoint.url, json=payload, timeout=budget_timeout(RPC_TIMEOUT)
+                ) as resp:
+                    if resp.status_code != 200:
+                        raise Exception(f"RPC status {resp.status_code} from {endpoint.label}")
+                    async for chunk in resp.aiter_bytes():
+                        if not committed:
+                            committed = True
+                            endpoint.record_success(time.monotonic() - start)
+                            metrics.observe("rpc_request_duration_seconds", labels, time.monotonic() - start)
+                        yield chunk
+                return
+            except (asyncio.CancelledError, GeneratorExit, DeadlineExceeded):
+                if not committed:
+                    endpoint.release()
+                raise
+            except Exception as e:
+                metrics.inc("rpc_errors_total", labels + (("type", error_type(e)),))
+                if committed:
+                    raise
+                endpoint.record_failure(time.monotonic())
+        raise Exception("All RPC endpoints failed or timed out")
+
+    async def probe(self, rounds: int = RPC_PROBE_ROUNDS) -> dict:
+        """
+        Time `rounds` getSlot calls (a method every node serves) on every endpoint, so latency scores
+        reflect each endpoint before real traffic arrives. A first, untimed call opens the connection,
+        so the TLS handshake does not count against the endpoint's latency. Slots returned are recorded as
+        latency samples; probe errors are not counted toward the breaker, which real traffic judges.
+        """
+        payload = {"jsonrpc": "2.0", "id": 1, "method": "getSlot"}
+        answered = set()
+
+        async def probe_one(endpoint: RpcEndpointStats):
+            try:
+                await http_post(endpoint.url, json=payload, timeout=RPC_TIMEOUT)
+            except Exception:
+                pass
+            for _ in range(rounds):
+                start = time.monotonic()
+                try:
+                    resp = await http_post(endpoint.url, json=payload, timeout=RPC_TIMEOUT)
+                    data = resp.json()
+                except Exception:
+                    continue
+                # Only a real answer counts: a fast 401 from a bad API key must not rank the endpoint first
+                if resp.status_code == 200 and isinstance(data, dict) and data.get("result") is not None:
+                    endpoint.record_success(time.monotonic() - start)
+                    answered.add(endpoint.url)
+
+        await asyncio.gather(*(probe_one(e) for e in self.endpoints))
+        return {"endpoints": len(self.endpoints), "answered": len(answered)}
+
+    def snapshot(self):
+        now = time.monotonic()
+        ready = sorted((e for e in self.endpoints if e.available(now)), key=lambda e: e.score())
+        ranked = {e.url: i for i, e in enumerate(ready)}
+        return sorted(
+            ({**e.snapshot(), "rank": ranked.get(e.url)} for e in self.endpoints),
+            key=lambda s: (s["rank"] is None, s["rank"] if s["rank"] is not None else 0)
+        )
+
+rpc_router = RpcRouter(RPC_ENDPOINTS)
+
+@app.exception_handler(RpcClientError)
+async def rpc_client_error_handler(request: Request, exc: RpcClientError):
+    return JSONResponse({"detail": exc.message, "rpc_error_code": exc.code}, status_code=400)
+
+async def get_rpc_response(payload: dict, allow_empty: bool = False):
+    """Send a JSON-RPC request through the latency-scored router and return the first valid result."""
+    return await rpc_router.call(payload, allow_empty)
+
+async def get_rpc_batch(payloads: list) -> list:
+    """
+    Send many JSON-RPC requests as batch arrays of at most RPC_BATCH_MAX_SIZE and return
+    one response per payload, in order. Requests a batch could not deliver fall back to
+    individual calls; requests that still fail come back as {"error": ...} entries.
+    """
+    requests_ = [{**payload, "jsonrpc": "2.0", "id": i} for i, payload in enumerate(payloads)]
+    responses = [None] * len(requests_)
+
+    async def single(request):
+        try:
+            responses[request["id"]] = await get_rpc_response(request)
+        except Exception as e:
+            responses[request["id"]] = {"jsonrpc": "2.0", "id": request["id"], "error": {"message": str(e)}}
+
+    async def send(chunk):
+        try:
+            by_id = {r.get("id"): r for r in await rpc_router.call(chunk) if isinstance(r, dict)}
         except Exception:
-            continue
-    # If none succeeded:
-    raise Exception("All RPC endpoints failed or timed out")
+            by_id = {}
+        retry = []
+        for request in chunk:
+            if request["id"] in by_id:
+                responses[request["id"]] = by_id[request["id"]]
+            else:
+                retry.append(request)
+        await asyncio.gather(*(single(request) for request in retry))
+
+    chunks = [requests_[i:i + RPC_BATCH_MAX_SIZE] for i in range(0, len(requests_), RPC_BATCH_MAX_SIZE)]
+    await asyncio.gather(*(send(chunk) for chunk in chunks))
+    return responses
+
+@app.get("/rpc/endpoints")
+async def get_rpc_endpoint_scores():
+    """Show each RPC endpoint's routing score, latency, error rate and breaker state, best first."""
+    return {"endpoints": rpc_router.snapshot()}
 
-def fetch_basic_token_info(mint: str):
+async def fetch_basic_token_info(mint: str):
     """Fetch token account info to get the owner program (checks if SPL Token)."""
     payload = {
         "jsonrpc": "2.0", "id": 1,
         "method": "getAccountInfo",
-        "params": [mint, {"encoding": "jsonParsed"}]
+        # Only the owner program is needed, not the account data
+        "params": [mint, {"encoding": "base64", "dataSlice": {"offset": 0, "length": 0}}]
     }
     try:
-        data = get_rpc_response(payload)
+        data = await get_rpc_response(payload)
         owner = data.get("result", {}).get("value", {}).get("owner")
         return owner
     except Exception:
         return None
 
-def helius_token_metadata(mint: str):
-    """Get richer metadata from Helius API for a token (if Jupiter has no info)."""
-    try:
-        url = f"https://api.helius.xyz/v0/tokens/metadata?mint={mint}&api-key={HELIUS_METADATA_API_KEY}"
-        resp = requests.get(url, timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            if isinstance(data, list) and data:
-                return data[0]  # Return the first metadata result
-        return None
-    except Exception:
+async def helius_token_metadata(mint: str):
+    """
+    Get richer metadata from Helius API for a token (if Jupiter has no info): None if Helius does
+    not know the mint; raises if the lookup itself failed (timeout, 5xx, 429).
+    """
+    url = f"{HELIUS_API_BASE}/v0/tokens/metadata?mint={mint}&api-key={HELIUS_METADATA_API_KEY}"
+    resp = await http_get(url, timeout=5)
+    if resp.status_code == 404:
         return None
+    if resp.status_code != 200:
+        raise Exception(f"Helius metadata returned status {resp.status_code}")
+    data = resp.json()
+    if isinstance(data, list) and data:
+        return data[0]  # Return the first metadata result
+    return None
 
-@lru_cache(maxsize=1)
-def get_jupiter_token_map():
-    """Fetch the token map from Jupiter (maps symbol -> mint address)."""
-    try:
-        resp = requests.get(JUPITER_TOKEN_LIST_URL, timeout=10)
-        tokens = resp.json()
-        return {t['symbol'].lower(): t['address'] for t in tokens if 'symbol' in t and 'address' in t}
-    except Exception:
-        return {}
+TOKEN_METADATA_CONCURRENCY = int(os.getenv("TOKEN_METADATA_CONCURRENCY", "16"))
+TOKEN_INDEX_REFRESH_SECONDS = float(os.getenv("TOKEN_INDEX_REFRESH_SECONDS", "3600"))
+TOKEN_INDEX_RETRY_SECONDS = float(os.getenv("TOKEN_INDEX_RETRY_SECONDS", "60"))
+TOKEN_FUZZY_SCAN_LIMIT = 20000
 
-def get_token_mint_from_symbol(symbol: str) -> str:
-    """Resolve a token symbol to its Solana mint address using Jupiter's token list."""
-    token_map = get_jupiter_token_map()
-    mint = token_map.get(symbol.lower())
-    if not mint:
-        raise HTTPException(status_code=404, detail=f"Mint not found for symbol '{symbol}'")
-    return mint
+_background_tasks = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    """Run `coro` for the life of the app; it is cancelled on shutdown."""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    """Cancel every long-running background task."""
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+class MappedBytes:
+    """A read-only window on a memory map that slices to bytes, standing in for the bytes blobs TokenIndex builds."""
+    __slots__ = ("mm", "start", "length")
+
+    def __init__(self, mm, start: int, length: int):
+        self.mm = mm
+        self.start = start
+        self.length = length
+
+    def __len__(self):
+        return self.length
 
-def resolve_to_mint(token_input: str) -> str:
+    def __getitem__(self, key: slice) -> bytes:
+        start, stop, _ = key.indices(self.length)
+        return self.mm[self.start + start:self.start + stop]
+
+class TokenIndex:
     """
-    Resolve a user-provided token identifier to a mint address.
-    If the input looks like a mint address (length >= 32 characters), return it directly.
-    Otherwise, treat it as a token symbol and resolve via Jupiter.
+    Immutable, compact index over the Jupiter token list.
+
+    Tokens are stored in mint order: their "address\\0symbol\\0name" strings live in one
+    UTF-8 blob and numeric fields in flat arrays, so each token costs a few dozen bytes
+    rather than a dict. Lowercased symbols are kept in a second blob sorted by
+    (symbol, verified first, daily volume descending), so every candidate for a symbol
+    is a contiguous, already-ranked run. Mint, symbol and prefix lookups are binary searches.
     """
-    if len(token_input) >= 32:
-        return token_input
-    return get_token_mint_from_symbol(token_input)
 
-@app.get("/swap")
-def simulate_swap(input_mint: str, output_mint: str, amount: float):
-    """Simulate a token swap using Jupiter aggregator and return quote details."""
-    # Prepare raw amount for Jupiter API (lamports for SOL, smallest units for others)
-    in_mint = input_mint
-    out_mint = output_mint
-    if in_mint == "So11111111111111111111111111111111111111112":
-        raw_amount = int(amount * 1e9)  # Convert SOL amount to lamports
-    else:
+    def __init__(self, blob, offsets, address_lengths, decimals, volumes, flags, symbol_blob, symbol_offsets, by_symbol):
+        self.blob = blob
+        self.offsets = offsets
+        self.address_lengths = address_lengths
+        self.decimals = decimals
+        self.volumes = volumes
+        self.flags = flags
+        self.symbol_blob = symbol_blob
+        self.symbol_offsets = symbol_offsets
+        self.by_symbol = by_symbol
+        self.built_at = time.time()
+        # Modification time of the index file this index is mapped from (None if built in memory)
+        self.source_mtime = None
+
+    @classmethod
+    def build(cls, tokens) -> "TokenIndex":
+        rows = {}
+        for t in tokens:
+            address = t.get("address")
+            symbol = t.get("symbol")
+            if isinstance(address, str) and isinstance(symbol, str) and address and symbol:
+                rows[address] = t
+        blob = bytearray()
+        offsets = array("I", [0])
+        address_lengths = array("B")
+        decimals = array("B")
+        volumes = array("d")
+        flags = array("B")
+        symbol_keys = []
+        for i, address in enumerate(sorted(rows)):
+            t = rows[address]
+            address_bytes = address.encode()
+            name = (t.get("name") or "").replace("\0", "")
+            blob += address_bytes + b"\0" + t["symbol"].replace("\0", "").encode() + b"\0" + name.encode()
+            offsets.append(len(blob))
+            address_lengths.append(len(address_bytes))
+            try:
+                decimals.append(min(max(int(t.get("decimals") or 0), 0), 255))
+            except (TypeError, ValueError):
+                decimals.append(0)
+            try:
+                volume = float(t["daily_volume"]) if t.get("daily_volume") is not None else math.nan
+            except (TypeError, ValueError):
+                volume = math.nan
+            volumes.append(volume)
+            tags = t.get("tags") or []
+            verified = "verified" in tags or "strict" in tags
+            flags.append(1 if verified else 0)
+            symbol_keys.append((t["symbol"].lower().encode(), not verified, -(volume if volume == volume else 0.0), i))
+        symbol_keys.sort()
+        symbol_blob = bytearray()
+        symbol_offsets = array("I", [0])
+        by_symbol = array("I")
+        for key, _, _, i in symbol_keys:
+            symbol_blob += key
+            symbol_offsets.append(len(symbol_blob))
+            by_symbol.append(i)
+        return cls(bytes(blob), offsets, address_lengths, decimals, volumes, flags, bytes(symbol_blob), symbol_offsets, by_symbol)
+
+    def __len__(self):
+        return len(self.address_lengths)
+
+    SECTIONS = ("blob", "offsets", "address_lengths", "decimals", "volumes", "flags", "symbol_blob", "symbol_offsets", "by_symbol")
+    FILE_MAGIC = b"TOKIDX01"
+
+    def write(self, path: str):
+        """Write the index as one file that from_file can memory-map, via a temp file renamed into place."""
+        sections = []
+        payloads = []
+        offset = 0
+        for name in self.SECTIONS:
+            part = getattr(self, name)
+            data = bytes(part) if isinstance(part, (bytes, bytearray)) else part.tobytes()
+            typecode = None if isinstance(part, (bytes, bytearray)) else (part.typecode, part.itemsize)
+            sections.append([name, typecode, offset, len(data)])
+            padding = -len(data) % 8
+            payloads.append(data + bytes(padding))
+            offset += len(data) + padding
+        header = json.dumps({"built_at": self.built_at, "sections": sections}).encode()
+        prefix = self.FILE_MAGIC + struct.pack("<I", len(header)) + header
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(prefix + bytes(-len(prefix) % 8))
+            for payload in payloads:
+                f.write(payload)
+        os.replace(tmp, path)
+
+    @classmethod
+    def from_file(cls, path: str) -> "TokenIndex":
+        """
+        Map an index file written by `write`. The pages are shared with every other process that
+        maps the same file, so the index costs the host one copy however many workers there are.
+        """
+        with open(path, "rb") as f:
+            mtime = os.fstat(f.fileno()).st_mtime
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:8] != cls.FILE_MAGIC:
+            raise ValueError("Not a token index file")
+        header_length, = struct.unpack_from("<I", mm, 8)
+        header = json.loads(mm[12:12 + header_length])
+        base = 12 + header_length
+        base += -base % 8
+        view = memoryview(mm)
+        parts = {}
+        for name, typecode, offset, length in header["sections"]:
+            start = base + offset
+            if typecode is None:
+                parts[name] = MappedBytes(mm, start, length)
+                continue
+            parts[name] = view[start:start + length].cast(typecode[0])
+            if parts[name].itemsize != typecode[1]:
+                raise ValueError("Token index file written on an incompatible platform")
+        index = cls(**parts)
+        index.built_at = header["built_at"]
+        index.source_mtime = mtime
+        return index
+
+
+    def _address_key(self, i: int) -> bytes:
+        start = self.offsets[i]
+        return self.blob[start:start + self.address_lengths[i]]
+
+    def _symbol_key(self, position: int) -> bytes:
+        return self.symbol_blob[self.symbol_offsets[position]:self.symbol_offsets[position + 1]]
+
+    def record(self, i: int) -> dict:
+        address, symbol, name = self.blob[self.offsets[i]:self.offsets[i + 1]].decode().split("\0", 2)
+        volume = self.volumes[i]
+        return {
+            "address": address,
+            "symbol": symbol,
+            "name": name or None,
+            "decimals": self.decimals[i],
+            "daily_volume": volume if volume == volume else None,
+            "verified": bool(self.flags[i] & 1)
+        }
+
+    def find_mint(self, mint: str):
+        """Record for a mint address, or None."""
+        key = mint.encode()
+        i = bisect_left(range(len(self)), key, key=self._address_key)
+        if i < len(self) and self._address_key(i) == key:
+            return self.record(i)
+        return None
+
+    def _symbol_range(self, symbol: str):
+        key = symbol.lower().encode()
+        positions = range(len(self.by_symbol))
+        return bisect_left(positions, key, key=self._symbol_key), bisect_right(positions, key, key=self._symbol_key)
+
+    def lookup_symbol(self, symbol: str, limit: int = None) -> list:
+        """Every token with this symbol (case-insensitive), best candidate first."""
+        lo, hi = self._symbol_range(symbol)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self.record(self.by_symbol[p]) for p in range(lo, hi)]
+
+    def best_mint(self, symbol: str):
+        lo, hi = self._symbol_range(symbol)
+        if lo == hi:
+            return None
+        i = self.by_symbol[lo]
+        return self._address_key(i).decode()
+
+    def prefix(self, prefix: str, limit: int = 10) -> list:
+        """Tokens whose symbol starts with `prefix`: exact matches first, then verified and by volume."""
+        key = prefix.lower().encode()
+        if not key:
+            return []
+        start = bisect_left(range(len(self.by_symbol)), key, key=self._symbol_key)
+        matches = []
+        for p in range(start, min(start + TOKEN_FUZZY_SCAN_LIMIT, len(self.by_symbol))):
+            symbol_key = self._symbol_key(p)
+            if not symbol_key.startswith(key):
+                break
+            i = self.by_symbol[p]
+            volume = self.volumes[i]
+            matches.append((symbol_key != key, not self.flags[i] & 1, -(volume if volume == volume else 0.0), p, i))
+        return [self.record(m[-1]) for m in heapq.nsmallest(limit, matches)]
+
+    def fuzzy(self, query: str, limit: int = 10) -> list:
+        """Best candidate for each of the closest-spelled symbols (catches typos a prefix search misses)."""
+        query = query.lower()
+        if not query:
+            return []
+        # Only symbols sharing the first character and of similar length are compared
+        start = bisect_left(range(len(self.by_symbol)), query[:1].encode(), key=self._symbol_key)
+        candidates = {}
+        for p in range(start, min(start + TOKEN_FUZZY_SCAN_LIMIT, len(self.by_symbol))):
+            symbol_key = self._symbol_key(p)
+            if not symbol_key.startswith(query[:1].encode()):
+                break
+            if abs(len(symbol_key) - len(query)) <= 2 and symbol_key not in candidates:
+                candidates[symbol_key] = p
+        names = {key.decode(errors="ignore"): p for key, p in candidates.items()}
+        close = get_close_matches(query, list(names), n=limit, cutoff=0.6)
+        return [self.record(self.by_symbol[names[name]]) for name in close]
+
+    def stats(self) -> dict:
+        nbytes = sum(len(part) for part in (self.blob, self.symbol_blob))
+        nbytes += sum(a.itemsize * len(a) for a in (self.offsets, self.address_lengths, self.decimals,
+                                                     self.volumes, self.flags, self.symbol_offsets, self.by_symbol))
+        return {"tokens": len(self), "bytes": nbytes, "built_at": self.built_at, "shared": self.source_mtime is not None}
+
+token_index = None
+_token_index_lock = asyncio.Lock()
+# Shared by the workers on a host: written once per refresh, memory-mapped by everyone
+TOKEN_INDEX_FILE = "token_index.bin"
+# How often workers look for an index file another worker has refreshed
+TOKEN_INDEX_CHECK_SECONDS = float(os.getenv("TOKEN_INDEX_CHECK_SECONDS", "60"))
+
+def open_shared_token_index():
+    """The host's memory-mapped token index, or None if there is no readable index file."""
+    try:
+        return TokenIndex.from_file(os.path.join(CACHE_DIR, TOKEN_INDEX_FILE))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+async def load_token_index(max_age: float = TOKEN_INDEX_REFRESH_SECONDS) -> bool:
+    """
+    Swap in the token index shared by the workers on this host: the index file if it is younger
+    than `max_age`, otherwise a fresh download of the Jupiter token list, built and written out as
+    the new file. A host lock makes the other workers wait for that file instead of downloading
+    too. The old index stays on failure.
+    """
+    global token_index
+    async with HostLock("token_index"):
+        if cache_file_age(TOKEN_INDEX_FILE) < max_age:
+            mtime = os.path.getmtime(os.path.join(CACHE_DIR, TOKEN_INDEX_FILE))
+            if token_index is not None and token_index.source_mtime == mtime:
+                return True
+            shared = await asyncio.to_thread(open_shared_token_index)
+            if shared is not None:
+                token_index = shared
+                return True
         try:
-            raw_amount = int(amount)
+            resp = await http_get(JUPITER_TOKEN_LIST_URL, timeout=30)
+            if resp.status_code != 200:
+                raise Exception(f"Token list request returned status {resp.status_code}")
+            # Parsing and sorting a few hundred thousand tokens is CPU work; keep it off the event loop
+            new_index = await asyncio.to_thread(lambda: TokenIndex.build(json.loads(resp.content)))
         except Exception:
-            raw_amount = None
-    if raw_amount is None:
-        raise HTTPException(status_code=422, detail="Invalid amount")
-    # Request a swap quote from Jupiter's public API
-    quote_url = (
-        "https://lite-api.jup.ag/quote"
-        f"?inputMint={in_mint}&outputMint={out_mint}"
-        f"&amount={raw_amount}&slippageBps=50&restrictIntermediateTokens=true"
-    )
-    try:
-        qresp = requests.get(quote_url, timeout=5)
-    except requests.RequestException:
-        raise HTTPException(status_code=502, detail="Jupiter quote request failed")
-    if qresp.status_code != 200:
-        raise HTTPException(status_code=502, detail="Jupiter API returned an error")
-    quote = qresp.json()
-    if not quote or "outAmount" not in quote:
-        raise HTTPException(status_code=502, detail="Invalid quote response")
-    # Parse quote to extract output amount and route
-    out_amount = int(quote["outAmount"])
-    route_steps = []
-    for step in quote.get("routePlan", []):
-        swap_info = step.get("swapInfo", {})
-        input_mint_addr = swap_info.get("inputMint")
-        # Convert known mint addresses to symbols or short-form for readability
-        def mint_to_symbol(mint_addr: str) -> str:
-            common = {
-                "So11111111111111111111111111111111111111112": "SOL",
-                "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v": "USDC",
-                "Es9vMFrzaCjLwSX5ae4Ew9WVeEKXZotPwX3hPJJrEvDw": "USDT"
-            }
-            if mint_addr in common:
-                return common[mint_addr]
-            # Return a shortened representation of the address for other tokens
-            return f"{mint_addr[:4]}…{mint_addr[-4:]}" if mint_addr else "UNK"
-        route_steps.append(mint_to_symbol(input_mint_addr))
-    # Append final output token symbol to route
-    route_steps.append(mint_to_symbol(out_mint))
-    route_str = " -> ".join(route_steps)
+            new_index = None
+        if new_index is None or not len(new_index):
+            # A stale shared index beats none at all
+            if token_index is None:
+                token_index = await asyncio.to_thread(open_shared_token_index)
+            return False
+        try:
+            await asyncio.to_thread(new_index.write, os.path.join(CACHE_DIR, TOKEN_INDEX_FILE))
+            new_index = await asyncio.to_thread(open_shared_token_index) or new_index
+        except OSError:
+            pass
+        token_index = new_index
+        return True
+
+async def get_token_index():
+    """The current token index, loading it on first use if the background refresher has not yet."""
+    if token_index is None:
+        async with _token_index_lock:
+            if token_index is None:
+                await detached_task(load_token_index(), background=True)
+    return token_index
+
+async def refresh_token_index_forever():
+    """
+    Keep the token index no older than TOKEN_INDEX_REFRESH_SECONDS, picking up files other workers
+    wrote within TOKEN_INDEX_CHECK_SECONDS, and retrying sooner after failures.
+    """
+    while True:
+        async with _token_index_lock:
+            ok = await load_token_index()
+        await asyncio.sleep(TOKEN_INDEX_CHECK_SECONDS if ok else TOKEN_INDEX_RETRY_SECONDS)
+
+@app.on_event("startup")
+async def start_token_index_refresh():
+    start_background_task(refresh_token_index_forever())
+
+async def fetch_jupiter_token_info(mint: str):
+    """
+    Look up a single mint on Jupiter's token info API: None if Jupiter does not know it; raises
+    if the lookup itself failed (timeout, 5xx, 429), so a failure is never taken for "unknown".
+    """
+    resp = await http_get(f"{JUPITER_TOKEN_INFO_URL}{mint}", timeout=5)
+    if resp.status_code == 404:
+        return None
+    if resp.status_code != 200:
+        raise Exception(f"Jupiter token info returned status {resp.status_code}")
+    meta = resp.json()
+    if not isinstance(meta, dict):
+        return None
     return {
-        "input_amount": f"{amount} {route_steps[0]}",
-        "output_estimate": f"{out_amount:,} {route_steps[-1]}",
-        "slippage": "0.5%",  # 50 bps slippage
-        "route": route_str,
-        "platform": "Jupiter Aggregator"
+        "name": meta.get("name"),
+        "symbol": meta.get("symbol"),
+        "decimals": meta.get("decimals"),
+        "daily_volume": meta.get("daily_volume")
     }
 
-@app.get("/resolve")
-def resolve_symbol(symbol: str):
-    """Resolve a token symbol to its Solana mint address using Jupiter's token list."""
-    mint = resolve_to_mint(symbol)
-    return {"symbol": symbol.upper(), "mint": mint}
+# Mint metadata cache: in-process LRU in front of an on-disk SQLite store
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+MINT_CACHE_MAX_ENTRIES = int(os.getenv("MINT_CACHE_MAX_ENTRIES", "50000"))
+MINT_CACHE_TTL = float(os.getenv("MINT_CACHE_TTL", str(7 * 24 * 3600)))
+MINT_CACHE_NEGATIVE_TTL = float(os.getenv("MINT_CACHE_NEGATIVE_TTL", "3600"))
+# How long a mint cache query waits for another worker's write; past it the read misses or the write is dropped
+MINT_CACHE_SQLITE_BUSY_MS = int(os.getenv("MINT_CACHE_SQLITE_BUSY_MS", "50"))
 
-@app.get("/balances/{address}")
-def get_balances(address: str):
-    """Get the SOL balance and all SPL token balances for a given wallet address."""
-    result = {"sol": None, "tokens": []}
-    # Fetch SOL balance (in lamports)
-    balance_payload = {
-        "jsonrpc": "2.0", "id": 1,
-        "method": "getBalance",
-        "params": [address]
-    }
-    try:
-        balance_data = get_rpc_response(balance_payload)
-    except Exception as e:
-        return {"error": "Unable to fetch SOL balance", "details": str(e)}
-    lamports = balance_data.get("result", {}).get("value", 0)
-    sol_amount = lamports / 1e9  # Convert lamports to SOL
-    # Fetch all SPL token accounts for the address
-    token_payload = {
+def open_cache_db(name: str) -> sqlite3.Connection:
+    """Open (creating if needed) a SQLite file under CACHE_DIR tuned for many small cache reads and writes."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(CACHE_DIR, name), check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+# Shared cache tier: what the uvicorn workers on one host (or, through Redis, several hosts) share.
+# Large read-mostly indexes are memory-mapped files under CACHE_DIR; small hot entries go to SHARED_KV_URL.
+# SHARED_KV_URL is "sqlite" (a file under CACHE_DIR), "redis://host:port[/db]" (Redis, or kvserver.py) or "none".
+SHARED_KV_URL = os.getenv("SHARED_KV_URL", "sqlite")
+SHARED_KV_TIMEOUT = float(os.getenv("SHARED_KV_TIMEOUT", "0.25"))
+# How long a sqlite write waits for another worker's; past it the write is dropped (best effort)
+SHARED_KV_SQLITE_BUSY_MS = int(os.getenv("SHARED_KV_SQLITE_BUSY_MS", "50"))
+HOST_LOCK_POLL_SECONDS = 0.05
+
+class HostLock:
+    """
+    Advisory lock on a file under CACHE_DIR, held by at most one worker process on the host,
+    so cold-start downloads happen once per host. Without fcntl (Windows) it is a no-op.
+    """
+
+    def __init__(self, name: str):
+        self.path = os.path.join(CACHE_DIR, f"{name}.lock")
+        self.fd = None
+
+    async def __aenter__(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is None:
+            return self
+        try:
+            while True:
+                try:
+                    fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return self
+                except BlockingIOError:
+                    # Polled rather than blocking in a thread, so waiting stays cancellable
+                    await asyncio.sleep(HOST_LOCK_POLL_SECONDS)
+        except BaseException:
+            os.close(self.fd)
+            raise
+
+    async def __aexit__(self, *exc):
+        # Closing the descriptor releases the lock
+        os.close(self.fd)
+
+def cache_file_age(name: str) -> float:
+    """Seconds since a file under CACHE_DIR was written (infinite if it does not exist)."""
+    try:
+        return time.time() - os.path.getmtime(os.path.join(CACHE_DIR, name))
+    except OSError:
+        return math.inf
+
+class SqliteKV:
+    """
+    Key/value entries with expiry in a SQLite file under CACHE_DIR, shared by every worker on the host.
+    Queries run in a thread, so SharedKV's timeout can give up on them without the event loop waiting,
+    and a write that cannot get the file's lock within SHARED_KV_SQLITE_BUSY_MS fails instead of stalling.
+    """
+
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+        self._db = None
+        # One connection, used from the default executor's threads one query at a time
+        self._lock = threading.Lock()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_cache_db(self.db_name)
+            self._db.execute(f"PRAGMA busy_timeout={SHARED_KV_SQLITE_BUSY_MS}")
+            self._db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        return self._db
+
+    def _get_many(self, keys: list) -> dict:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.db.execute(
+                    f"SELECT key, value FROM kv WHERE expires_at > ? AND key IN ({','.join('?' * len(chunk))})", (now, *chunk)
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def _set_many(self, items: dict, ttl: float):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self.db.executemany("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", ((k, v, expires_at) for k, v in items.items()))
+            if random() < 0.01:
+                self.db.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+
+    async def get_many(self, keys: list) -> dict:
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def set_many(self, items: dict, ttl: float):
+        await asyncio.to_thread(self._set_many, items, ttl)
+
+class RespKV:
+    """
+    Minimal Redis client (RESP over one pipelined connection) for MGET and SET ... PX.
+    Works against Redis itself or any compatible server, such as kvserver.py.
+    """
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db_number = int(parts.path.strip("/") or 0)
+        self._streams = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    @classmethod
+    async def _read_reply(cls, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind in (b"+", b":"):
+            return rest.decode()
+        if kind == b"-":
+            raise Exception(rest.decode())
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else (await reader.readexactly(length + 2))[:-2].decode()
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [await cls._read_reply(reader) for _ in range(count)]
+        raise Exception(f"Unexpected reply {line!r}")
+
+    async def _execute(self, commands: list) -> list:
+        """Send commands in one pipeline and return their replies, reconnecting once after a dropped connection."""
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._streams is None:
+                        self._streams = await asyncio.open_connection(self.host, self.port)
+                        setup = ([("AUTH", self.password)] if self.password else []) + ([("SELECT", self.db_number)] if self.db_number else [])
+                        if setup:
+                            self._streams[1].write(b"".join(self._encode(*c) for c in setup))
+                            for _ in setup:
+                                await self._read_reply(self._streams[0])
+                    reader, writer = self._streams
+                    writer.write(b"".join(self._encode(*c) for c in commands))
+                    await writer.drain()
+                    return [await self._read_reply(reader) for _ in commands]
+                except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                    self._streams = None
+                    if attempt:
+                        raise
+                except BaseException:
+                    # A reply half-read (e.g. on cancellation) would desynchronize the pipeline
+                    if self._streams is not None:
+                        self._streams[1].close()
+                    self._streams = None
+                    raise
+
+    async def get_many(self, keys: list) -> dict:
+        if not keys:
+            return {}
+        values = (await self._execute([("MGET", *keys)]))[0]
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, items: dict, ttl: float):
+        if items:
+            await self._execute([("SET", key, value, "PX", max(int(ttl * 1000), 1)) for key, value in items.items()])
+
+class SharedKV:
+    """Best-effort front for the configured backend: errors and timeouts count as misses, never as failures."""
+
+    def __init__(self, url: str):
+        self.url = url
+        if url == "none":
+            self.backend = None
+        elif url == "sqlite":
+            self.backend = SqliteKV("shared_kv.sqlite3")
+        elif url.startswith(("redis://", "resp://")):
+            self.backend = RespKV(url)
+        else:
+            raise ValueError(f"Unsupported SHARED_KV_URL {url!r}")
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    async def get_many(self, keys: list) -> dict:
+        """{key: JSON-decoded value} for the keys present."""
+        if self.backend is None or not keys:
+            return {}
+        try:
+            found = await asyncio.wait_for(self.backend.get_many(keys), SHARED_KV_TIMEOUT)
+        except Exception:
+            self.errors += 1
+            found = {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return {key: json.loads(value) for key, value in found.items()}
+
+    async def set_many(self, items: dict, ttl: float):
+        if self.backend is None or not items or ttl <= 0:
+            return
+        try:
+            await asyncio.wait_for(
+                self.backend.set_many({k: json.dumps(v, separators=(",", ":")) for k, v in items.items()}, ttl),
+                SHARED_KV_TIMEOUT
+            )
+            self.writes += len(items)
+        except Exception:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+        }
+
+shared_kv = SharedKV(SHARED_KV_URL)
+
+class MintMetadataCache:
+    """
+    Two-tier mint -> metadata cache. Lookups hit an in-process LRU first, then SQLite,
+    so entries survive restarts. A record without name or symbol is a negative entry
+    and expires after the shorter negative TTL. SQLite queries run in a thread, so a
+    worker waiting on another's write never stalls the event loop.
+    """
+
+    def __init__(self, db_name: str, max_entries: int, ttl: float, negative_ttl: float):
+        self.db_name = db_name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._db = None
+        # One connection, used from the default executor's threads one query at a time
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_cache_db(self.db_name)
+            self._db.execute(f"PRAGMA busy_timeout={MINT_CACHE_SQLITE_BUSY_MS}")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS mint_metadata (mint TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        return self._db
+
+    @staticmethod
+    def is_negative(record: dict) -> bool:
+        return not (record.get("name") or record.get("symbol"))
+
+    def _remember(self, mint: str, record: dict, expires_at: float):
+        self._entries[mint] = (expires_at, record)
+        self._entries.move_to_end(mint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read(self, mints: list, now: float) -> list:
+        rows = []
+        with self._lock:
+            for i in range(0, len(mints), 500):
+                chunk = mints[i:i + 500]
+                rows += self.db.execute(
+                    f"SELECT mint, value, expires_at FROM mint_metadata WHERE mint IN ({','.join('?' * len(chunk))}) AND expires_at > ?",
+                    (*chunk, now)
+                ).fetchall()
+        return rows
+
+    def _write(self, rows: list):
+        with self._lock:
+            self.db.executemany("INSERT OR REPLACE INTO mint_metadata VALUES (?, ?, ?)", rows)
+
+    async def get_many(self, mints) -> dict:
+        """Return {mint: record} for every mint with a live entry in memory or on disk."""
+        now = time.time()
+        found = {}
+        cold = []
+        for mint in dict.fromkeys(mints):
+            entry = self._entries.get(mint)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(mint)
+                found[mint] = entry[1]
+                self.hits += 1
+            else:
+                cold.append(mint)
+        try:
+            rows = await asyncio.to_thread(self._read, cold, now) if cold else []
+        except sqlite3.Error:
+            rows = []
+        for mint, value, expires_at in rows:
+            record = json.loads(value)
+            self._remember(mint, record, expires_at)
+            found[mint] = record
+            self.disk_hits += 1
+        for mint in cold:
+            if mint not in found:
+                self.misses += 1
+        for record in found.values():
+            if self.is_negative(record):
+                self.negative_hits += 1
+        return found
+
+    async def get(self, mint: str):
+        return (await self.get_many([mint])).get(mint)
+
+    async def put_many(self, records: dict):
+        """Store {mint: record}; negative records get the shorter TTL."""
+        now = time.time()
+        rows = []
+        for mint, record in records.items():
+            expires_at = now + (self.negative_ttl if self.is_negative(record) else self.ttl)
+            self._remember(mint, record, expires_at)
+            rows.append((mint, json.dumps(record), expires_at))
+        if rows:
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except sqlite3.Error:
+                pass
+
+    async def put(self, mint: str, record: dict):
+        await self.put_many({mint: record})
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None
+        }
+
+mint_metadata_cache = MintMetadataCache("metadata.sqlite3", MINT_CACHE_MAX_ENTRIES, MINT_CACHE_TTL, MINT_CACHE_NEGATIVE_TTL)
+# Mint -> owning token program, kept apart from the metadata (where a record with no name reads as an
+# unknown token). Every record here is "negative", so both TTLs are the long one.
+mint_owner_cache = MintMetadataCache("mint_owner.sqlite3", MINT_CACHE_MAX_ENTRIES, MINT_CACHE_TTL, MINT_CACHE_TTL)
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit, miss and eviction counters for the in-process caches."""
+    return {
+        "mint_metadata": mint_metadata_cache.stats(),
+        "prices": price_service.stats(),
+        "quotes": quote_service.stats(),
+        "pumpfun": pumpfun_feed.stats(),
+        "transactions": transaction_cache.stats(),
+        "shared_kv": shared_kv.stats(),
+        "hot_wallets": wallet_watcher.stats(),
+        **{f"responses_{route}": cache.stats() for route, cache in response_caches.items()},
+        "token_index": token_index.stats() if token_index is not None else None
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: upstream and RPC latency histograms, error counts, in-flight gauges and cache counters."""
+    sampled = {}
+    for cache, stats in (await get_cache_stats()).items():
+        for key, value in (stats or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                sampled[(f"cache_{key}", (("cache", cache),))] = value
+    for endpoint in rpc_router.endpoints:
+        labels = (("endpoint", endpoint.label),)
+        sampled[("rpc_endpoint_breaker_open", labels)] = int(endpoint.state != "closed")
+        if endpoint.latency_ewma is not None:
+            sampled[("rpc_endpoint_latency_ewma_seconds", labels)] = endpoint.latency_ewma
+    for name, limiter in upstream_limiters.items():
+        labels = (("upstream", name),)
+        sampled[("upstream_queue_depth", labels)] = limiter.queued()
+        sampled[("upstream_expected_wait_seconds", labels)] = limiter.expected_wait(PRIORITY_INTERACTIVE)
+    return PlainTextResponse(metrics.render(sampled), media_type="text/plain; version=0.0.4")
+
+async def fetch_helius_token_info(mint: str):
+    """Name and symbol from Helius metadata, for mints Jupiter does not know; raises if the lookup failed."""
+    helius_meta = await helius_token_metadata(mint)
+    if not helius_meta:
+        return None
+    return {"name": helius_meta.get("name"), "symbol": helius_meta.get("symbol"), "decimals": None, "daily_volume": None}
+
+async def fetch_token_metadata(mints: list) -> dict:
+    """
+    Metadata from Jupiter, with Helius as fallback, at most TOKEN_METADATA_CONCURRENCY lookups at a time.
+    Complete answers are cached, and so is "unknown" once both providers have said so; a mint whose
+    lookup failed at either provider is returned with what was found but not cached, so an outage
+    does not hide its name for MINT_CACHE_NEGATIVE_TTL.
+    """
+    semaphore = asyncio.Semaphore(TOKEN_METADATA_CONCURRENCY)
+
+    async def lookup(fetch_info, mint):
+        try:
+            return await fetch_info(mint), False
+        except Exception:
+            return None, True
+
+    async def fetch(mint):
+        async with semaphore:
+            meta, failed = await lookup(fetch_jupiter_token_info, mint)
+            if not meta or not (meta.get("name") and meta.get("symbol")):
+                helius_meta, helius_failed = await lookup(fetch_helius_token_info, mint)
+                meta = merge_token_metadata(meta, helius_meta)
+                failed = failed or helius_failed
+            return mint, meta, failed
+
+    learned = {}
+    cacheable = {}
+    for mint, meta, failed in await asyncio.gather(*(fetch(m) for m in mints)):
+        learned[mint] = meta or {"name": None, "symbol": None, "decimals": None, "daily_volume": None}
+        if not failed or (meta and meta.get("name") and meta.get("symbol")):
+            cacheable[mint] = learned[mint]
+    await mint_metadata_cache.put_many(cacheable)
+    return learned
+
+async def resolve_token_metadata(mints) -> dict:
+    """
+    Resolve name/symbol/daily_volume for many mints at once.
+    Lookups go to the mint metadata cache, then the local Jupiter token list index,
+    and only then to Jupiter and Helius. Whatever is learned, including "unknown", is
+    written back to the cache, but not the outcome of a failed lookup. Mints no provider
+    knows (or could be asked about) are left out of the result, as are
+    mints whose upstream lookup is still running when the request's budget runs out.
+    """
+    mints = list(dict.fromkeys(mints))
+    resolved = await mint_metadata_cache.get_many(mints)
+    learned = {}
+    missing = []
+    uncached = [mint for mint in mints if mint not in resolved]
+    index = await within_budget(get_token_index(), None, "metadata") if uncached else None
+    for mint in uncached:
+        record = index.find_mint(mint) if index is not None else None
+        if record:
+            learned[mint] = {key: record[key] for key in ("name", "symbol", "decimals", "daily_volume")}
+        else:
+            missing.append(mint)
+    await mint_metadata_cache.put_many(learned)
+    resolved.update(learned)
+    if missing:
+        resolved.update(await within_budget(fetch_token_metadata(missing), {}, "metadata"))
+    return {mint: meta for mint, meta in resolved.items() if not MintMetadataCache.is_negative(meta)}
+
+def merge_token_metadata(primary, fallback):
+    """Fill the gaps in one provider's metadata with another's."""
+    if not primary:
+        return fallback
+    if not fallback:
+        return primary
+    return {key: primary.get(key) or fallback.get(key) for key in ("name", "symbol", "decimals", "daily_volume")}
+
+# Jupiter price service: short-TTL cache, single-flight and micro-batching across concurrent callers
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "10"))
+PRICE_BATCH_WINDOW = float(os.getenv("PRICE_BATCH_WINDOW", "0.01"))
+PRICE_BATCH_MAX_IDS = int(os.getenv("PRICE_BATCH_MAX_IDS", "100"))
+PRICE_CACHE_MAX_ENTRIES = 50000
+
+def parse_price(value):
+    """Float price from a Jupiter price string (plain or scientific notation), or None."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        try:
+            return float(Decimal(value))
+        except Exception:
+            return None
+
+class PriceService:
+    """
+    USD prices from Jupiter for many callers at once. Mints that are not cached are queued for
+    PRICE_BATCH_WINDOW so concurrent requests share one upstream call, split into batches of at
+    most PRICE_BATCH_MAX_IDS ids. A mint that is already being fetched is awaited, not re-requested.
+    Prices fetched by other workers are taken from the shared cache tier before asking Jupiter.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._inflight = {}
+        self._queued = []
+        self._flush_task = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.shared_hits = 0
+
+    async def get_prices(self, mints) -> dict:
+        """Return {mint: price} for the mints Jupiter has a price for."""
+        now = time.monotonic()
+        prices = {}
+        waiting = {}
+        for mint in dict.fromkeys(mints):
+            entry = self._cache.get(mint)
+            if entry is not None and entry[0] > now:
+                prices[mint] = entry[1]
+                self.hits += 1
+                continue
+            self.misses += 1
+            future = self._inflight.get(mint)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self._inflight[mint] = future
+                self._queued.append(mint)
+            else:
+                self.coalesced += 1
+            waiting[mint] = future
+        if self._queued and self._flush_task is None:
+            # Shared by every queued caller, so no single request's deadline applies
+            self._flush_task = detached_task(self._flush())
+        if waiting:
+            # asyncio.wait never cancels the shared futures, even if this caller is cancelled
+            await asyncio.wait(waiting.values())
+            for mint, future in waiting.items():
+                prices[mint] = future.result()
+        return {mint: price for mint, price in prices.items() if price is not None}
+
+    async def get_price(self, mint: str):
+        return (await self.get_prices([mint])).get(mint)
+
+    async def _flush(self):
+        await asyncio.sleep(PRICE_BATCH_WINDOW)
+        queued, self._queued = self._queued, []
+        self._flush_task = None
+        shared = await shared_kv.get_many([f"price:{mint}" for mint in queued])
+        if shared:
+            now = time.time()
+            for mint in queued:
+                entry = shared.get(f"price:{mint}")
+                if entry is not None:
+                    # Keep the worker that fetched it's expiry rather than restarting the TTL
+                    price, fetched_at = entry
+                    self._cache[mint] = (time.monotonic() + fetched_at + PRICE_CACHE_TTL - now, price)
+                    self._settle(mint, price)
+                    self.shared_hits += 1
+            queued = [mint for mint in queued if f"price:{mint}" not in shared]
+        batches = [queued[i:i + PRICE_BATCH_MAX_IDS] for i in range(0, len(queued), PRICE_BATCH_MAX_IDS)]
+        await asyncio.gather(*(self._fetch_batch(batch) for batch in batches))
+
+    async def _fetch_batch(self, mints):
+        self.batches += 1
+        try:
+            resp = await http_get(f"{JUPITER_PRICE_URL}{','.join(mints)}", timeout=5)
+            data = resp.json().get("data") or {}
+        except Exception:
+            data = None
+        expires_at = time.monotonic() + PRICE_CACHE_TTL
+        if data is not None and len(self._cache) > PRICE_CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            self._cache = {m: e for m, e in self._cache.items() if e[0] > now}
+        for mint in mints:
+            price = parse_price((data.get(mint) or {}).get("price")) if data is not None else None
+            if data is not None:
+                # Failed requests are not cached; the next caller retries
+                self._cache[mint] = (expires_at, price)
+            self._settle(mint, price)
+        if data is not None:
+            fetched_at = time.time()
+            await shared_kv.set_many({f"price:{mint}": [self._cache[mint][1], fetched_at] for mint in mints}, PRICE_CACHE_TTL)
+
+    def _settle(self, mint: str, price):
+        future = self._inflight.pop(mint, None)
+        if future is not None and not future.done():
+            future.set_result(price)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "shared_hits": self.shared_hits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+        }
+
+price_service = PriceService()
+
+async def get_token_mint_from_symbol(symbol: str) -> str:
+    """Resolve a token symbol to its Solana mint address using Jupiter's token list."""
+    index = await get_token_index()
+    mint = index.best_mint(symbol) if index is not None else None
+    if not mint:
+        detail = f"Mint not found for symbol '{symbol}'"
+        suggestions = [t["symbol"] for t in index.fuzzy(symbol, limit=3)] if index is not None else []
+        if suggestions:
+            detail += f" (did you mean {', '.join(suggestions)}?)"
+        raise HTTPException(status_code=404, detail=detail)
+    return mint
+
+async def resolve_to_mint(token_input: str) -> str:
+    """
+    Resolve a user-provided token identifier to a mint address.
+    If the input looks like a mint address (length >= 32 characters), return it directly.
+    Otherwise, treat it as a token symbol and resolve via Jupiter.
+    """
+    if len(token_input) >= 32:
+        return token_input
+    return await get_token_mint_from_symbol(token_input)
+
+# Jupiter swap quotes: cached briefly, identical in-flight requests shared, concurrency capped on the quote host
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", "5"))
+QUOTE_CONCURRENCY = int(os.getenv("QUOTE_CONCURRENCY", "4"))
+QUOTE_CACHE_MAX_ENTRIES = 10000
+QUOTE_SLIPPAGE_BPS = 50
+QUOTE_LADDER_MAX_STEPS = int(os.getenv("QUOTE_LADDER_MAX_STEPS", "25"))
+QUOTE_LADDER_SPACINGS = ("linear", "log")
+
+WELL_KNOWN_SYMBOLS = {
+    "So11111111111111111111111111111111111111112": "SOL",
+    "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v": "USDC",
+    "Es9vMFrzaCjLwSX5ae4Ew9WVeEKXZotPwX3hPJJrEvDw": "USDT"
+}
+
+def mint_to_symbol(mint_addr: str) -> str:
+    """Readable name for a mint: a well-known or verified symbol, otherwise a shortened address."""
+    if not mint_addr:
+        return "UNK"
+    if mint_addr in WELL_KNOWN_SYMBOLS:
+        return WELL_KNOWN_SYMBOLS[mint_addr]
+    record = token_index.find_mint(mint_addr) if token_index is not None else None
+    if record and record["verified"] and record["symbol"]:
+        return record["symbol"]
+    return f"{mint_addr[:4]}…{mint_addr[-4:]}"
+
+def to_raw_amount(mint: str, amount: float) -> int:
+    """
+    Raw amount for Jupiter: lamports for SOL, the amount as given (smallest units) for other tokens.
+    A fraction of a smallest unit is rejected rather than truncated (which could quote nothing).
+    """
+    try:
+        raw = round(amount * 1e9) if mint == WSOL_MINT else int(amount)
+    except Exception:
+        raise HTTPException(status_code=422, detail="Invalid amount")
+    if mint != WSOL_MINT and raw != amount:
+        raise HTTPException(status_code=422, detail=f"Amounts of {mint} are in its smallest units and must be whole numbers")
+    if raw < 1:
+        raise HTTPException(status_code=422, detail="Amount is less than one smallest unit of the input token")
+    return raw
+
+def route_symbols(quote: dict, out_mint: str) -> list:
+    """Symbols along a quote's route, from the input token to the output token."""
+    steps = [mint_to_symbol(step.get("swapInfo", {}).get("inputMint")) for step in quote.get("routePlan", [])]
+    return steps + [mint_to_symbol(out_mint)]
+
+class QuoteService:
+    """
+    Jupiter quotes keyed by (input mint, output mint, raw amount). Quotes are cached for
+    QUOTE_CACHE_TTL seconds, a quote that is already being fetched is awaited rather than
+    re-requested, and at most QUOTE_CONCURRENCY requests are sent to Jupiter at once. Quotes
+    fetched by other workers are taken from the shared cache tier.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._inflight = {}
+        self._semaphore = asyncio.Semaphore(QUOTE_CONCURRENCY)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.requests = 0
+        self.shared_hits = 0
+
+    async def get_quote(self, input_mint: str, output_mint: str, raw_amount: int) -> dict:
+        key = (input_mint, output_mint, raw_amount)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            limiter = upstream_limiter(JUPITER_QUOTE_URL)
+            if limiter is not None:
+                # The fetch itself is detached and never shed, so shed this caller before starting it
+                limiter.check()
+            task = detached_task(self._fetch(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one caller going away does not cancel the quote for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: tuple) -> dict:
+        input_mint, output_mint, raw_amount = key
+        shared_key = f"quote:{input_mint}:{output_mint}:{raw_amount}"
+        entry = (await shared_kv.get_many([shared_key])).get(shared_key)
+        if entry is not None:
+            quote, fetched_at = entry
+            self.shared_hits += 1
+            self._cache[key] = (time.monotonic() + fetched_at + QUOTE_CACHE_TTL - time.time(), quote)
+            return quote
+        quote_url = (
+            f"{JUPITER_QUOTE_URL}"
+            f"?inputMint={input_mint}&outputMint={output_mint}"
+            f"&amount={raw_amount}&slippageBps={QUOTE_SLIPPAGE_BPS}&restrictIntermediateTokens=true"
+        )
+        async with self._semaphore:
+            self.requests += 1
+            try:
+                qresp = await http_get(quote_url, timeout=5)
+            except httpx.HTTPError:
+                raise HTTPException(status_code=502, detail="Jupiter quote request failed")
+        if qresp.status_code != 200:
+            raise HTTPException(status_code=502, detail="Jupiter API returned an error")
+        quote = qresp.json()
+        if not quote or "outAmount" not in quote:
+            raise HTTPException(status_code=502, detail="Invalid quote response")
+        now = time.monotonic()
+        if len(self._cache) > QUOTE_CACHE_MAX_ENTRIES:
+            self._cache = {k: e for k, e in self._cache.items() if e[0] > now}
+        self._cache[key] = (now + QUOTE_CACHE_TTL, quote)
+        await shared_kv.set_many({shared_key: [quote, time.time()]}, QUOTE_CACHE_TTL)
+        return quote
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "requests": self.requests,
+            "shared_hits": self.shared_hits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+        }
+
+quote_service = QuoteService()
+
+@app.get("/swap")
+async def simulate_swap(input_mint: str, output_mint: str, amount: float):
+    """Simulate a token swap using Jupiter aggregator and return quote details."""
+    # Prepare raw amount for Jupiter API (lamports for SOL, smallest units for others)
+    raw_amount = to_raw_amount(input_mint, amount)
+    quote = await quote_service.get_quote(input_mint, output_mint, raw_amount)
+    # Parse quote to extract output amount and route
+    out_amount = int(quote["outAmount"])
+    route_steps = route_symbols(quote, output_mint)
+    return {
+        "input_amount": f"{amount} {route_steps[0]}",
+        "output_estimate": f"{out_amount:,} {route_steps[-1]}",
+        "slippage": "0.5%",  # 50 bps slippage
+        "route": " -> ".join(route_steps),
+        "platform": "Jupiter Aggregator"
+    }
+
+def ladder_amounts(amounts: Optional[str], min_amount: Optional[float], max_amount: Optional[float],
+                   steps: int, spacing: str, whole: bool = False) -> list:
+    """
+    Input sizes for a quote ladder: an explicit comma-separated list, or `steps` sizes from min to max
+    (rounded to whole numbers with `whole`, for amounts in smallest units).
+    """
+    if amounts:
+        try:
+            sizes = [float(a) for a in amounts.split(",") if a.strip()]
+        except ValueError:
+            raise HTTPException(status_code=422, detail="amounts must be a comma-separated list of numbers")
+    elif min_amount is not None and max_amount is not None:
+        if not 0 < min_amount <= max_amount:
+            raise HTTPException(status_code=422, detail="Need 0 < min_amount <= max_amount")
+        if spacing not in QUOTE_LADDER_SPACINGS:
+            raise HTTPException(status_code=422, detail=f"spacing must be one of {', '.join(QUOTE_LADDER_SPACINGS)}")
+        steps = max(2, steps)
+        if spacing == "log":
+            ratio = (max_amount / min_amount) ** (1 / (steps - 1))
+            sizes = [min_amount * ratio ** i for i in range(steps)]
+        else:
+            sizes = [min_amount + (max_amount - min_amount) * i / (steps - 1) for i in range(steps)]
+        if whole:
+            sizes = [round(a) for a in sizes]
+    else:
+        raise HTTPException(status_code=422, detail="Give either amounts or min_amount and max_amount")
+    sizes = sorted(set(a for a in sizes if a > 0))
+    if not sizes:
+        raise HTTPException(status_code=422, detail="No positive amounts given")
+    if len(sizes) > QUOTE_LADDER_MAX_STEPS:
+        raise HTTPException(status_code=422, detail=f"At most {QUOTE_LADDER_MAX_STEPS} amounts per ladder")
+    return sizes
+
+@app.get("/swap/ladder")
+async def get_quote_ladder(input_mint: str, output_mint: str, amounts: Optional[str] = None,
+                           min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                           steps: int = 10, spacing: str = "linear", max_impact_pct: float = 1.0):
+    """
+    Quote a swap at several sizes at once to show how the rate degrades with size.
+    Amounts use the same units as /swap. Price impact is measured against the best rate on the
+    ladder; `best_size` is the largest amount whose impact stays within `max_impact_pct`.
+    """
+    sizes = ladder_amounts(amounts, min_amount, max_amount, steps, spacing, whole=input_mint != WSOL_MINT)
+    raw_amounts = [to_raw_amount(input_mint, size) for size in sizes]
+    # Sizes not quoted within the request's budget come back as errors; the rest of the ladder still counts
+    quotes = await asyncio.gather(
+        *(within_budget(quote_service.get_quote(input_mint, output_mint, raw),
+                        DeadlineExceeded("Request deadline exceeded"), "quotes") for raw in raw_amounts),
+        return_exceptions=True
+    )
+    rates = [int(q["outAmount"]) / raw for q, raw in zip(quotes, raw_amounts) if isinstance(q, dict) and raw > 0]
+    best_rate = max(rates, default=None)
+    points = []
+    best_size = None
+    for size, raw, quote in zip(sizes, raw_amounts, quotes):
+        if isinstance(quote, HTTPException):
+            points.append({"amount": size, "error": quote.detail})
+            continue
+        if isinstance(quote, BaseException):
+            points.append({"amount": size, "error": str(quote)})
+            continue
+        out_amount = int(quote["outAmount"])
+        rate = out_amount / raw if raw > 0 else None
+        impact = (1 - rate / best_rate) * 100 if rate is not None and best_rate else None
+        point = {
+            "amount": size,
+            "out_amount": out_amount,
+            # Output per input, both in smallest units
+            "rate": rate,
+            "price_impact_pct": round(impact, 4) if impact is not None else None,
+            "jupiter_price_impact_pct": parse_price(quote.get("priceImpactPct")),
+            "route": " -> ".join(route_symbols(quote, output_mint))
+        }
+        points.append(point)
+        if impact is not None and impact <= max_impact_pct:
+            best_size = point
+    return with_incomplete_marker({
+        "input": mint_to_symbol(input_mint),
+        "output": mint_to_symbol(output_mint),
+        "slippage": "0.5%",
+        "max_impact_pct": max_impact_pct,
+        "points": points,
+        "best_size": best_size,
+        "platform": "Jupiter Aggregator"
+    })
+
+@app.get("/resolve")
+@cached_response(ttl=600, stale=3600)
+async def resolve_symbol(symbol: str):
+    """Resolve a token symbol to its Solana mint address using Jupiter's token list."""
+    mint = await resolve_to_mint(symbol)
+    result = {"symbol": symbol.upper(), "mint": mint}
+    index = await get_token_index()
+    if index is not None and len(symbol) < 32:
+        # Other tokens sharing the symbol, best-ranked first, so lookalikes are visible
+        result["alternatives"] = [t["address"] for t in index.lookup_symbol(symbol, limit=6) if t["address"] != mint][:5]
+    return result
+
+@app.get("/tokens/search")
+async def search_tokens(q: str, limit: int = 10, fuzzy: bool = True):
+    """Search the token list by symbol prefix, falling back to fuzzy matching for misspellings."""
+    index = await get_token_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Token list not loaded yet")
+    limit = max(1, min(limit, 50))
+    matches = index.prefix(q.strip(), limit)
+    if fuzzy and len(matches) < limit:
+        seen = {t["address"] for t in matches}
+        matches += [t for t in index.fuzzy(q.strip(), limit) if t["address"] not in seen][:limit - len(matches)]
+    return {"query": q, "results": matches}
+
+BALANCES_BATCH_MAX_ADDRESSES = int(os.getenv("BALANCES_BATCH_MAX_ADDRESSES", "500"))
+GET_MULTIPLE_ACCOUNTS_MAX = 100
+# "base64" decodes the SPL Token account layout locally; "jsonParsed" lets the RPC node parse it
+TOKEN_ACCOUNT_ENCODING = os.getenv("TOKEN_ACCOUNT_ENCODING", "base64")
+TOKEN_2022_ENABLED = os.getenv("TOKEN_2022_ENABLED", "false").lower() in ("1", "true", "yes")
+TOKEN_ACCOUNT_ENCODINGS = ("base64", "jsonParsed")
+
+# SPL Token (and Token-2022) account layout starts with mint (32 bytes), owner (32 bytes), amount (u64 LE).
+# Only that 72-byte head is requested, which base64-encodes to exactly 96 characters with no padding.
+TOKEN_ACCOUNT_HEAD = np.dtype([("mint", "V32"), ("owner", "V32"), ("amount", "<u8")])
+TOKEN_ACCOUNT_HEAD_B64_LEN = 96
+# Mint layout: mint_authority (COption<Pubkey>, 36 bytes), supply (u64), then decimals (u8)
+MINT_DECIMALS_OFFSET = 44
+
+def token_accounts_payload(address: str, program_id: str = TOKEN_PROGRAM_ID, encoding: str = "jsonParsed",
+                           commitment: str = None) -> dict:
+    if encoding == "base64":
+        config = {"encoding": "base64", "dataSlice": {"offset": 0, "length": TOKEN_ACCOUNT_HEAD.itemsize}}
+    else:
+        config = {"encoding": "jsonParsed"}
+    if commitment:
+        config["commitment"] = commitment
+    return {
         "jsonrpc": "2.0", "id": 1,
         "method": "getTokenAccountsByOwner",
         "params": [
             address,
-            {"programId": TOKEN_PROGRAM_ID},
-            {"encoding": "jsonParsed"}
+            {"programId": program_id},
+            config
         ]
     }
-    try:
-        token_data = get_rpc_response(token_payload)
-    except Exception as e:
-        # If token accounts lookup fails, return SOL amount and an error message
-        result["sol"] = {"amount": sol_amount, "price": None, "usd_value": None}
-        result["tokens"] = []
-        result["error"] = "Token account lookup failed"
-        return result
-    accounts = token_data.get("result", {}).get("value", [])
-    token_list = []
+
+def token_program_ids(include_token2022: bool) -> list:
+    return [TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID] if include_token2022 else [TOKEN_PROGRAM_ID]
+
+def decode_token_accounts(accounts) -> list:
+    """Decode the base64 token account heads of getTokenAccountsByOwner results into [(mint, raw_amount)]."""
+    datas = [(acct.get("account") or {}).get("data") or ["", "base64"] for acct in accounts]
+    return decode_token_account_heads([d[0] if isinstance(d, list) else "" for d in datas])
+
+def decode_token_account_heads(encoded: list) -> list:
+    """
+    Decode base64 token account heads into [(mint, raw_amount)] for every non-zero balance.
+    The slices are concatenated, decoded in one call and viewed as a structured array, so
+    zero balances are dropped without touching them in Python.
+    """
+    if all(len(e) == TOKEN_ACCOUNT_HEAD_B64_LEN for e in encoded):
+        raw = b64decode("".join(encoded))
+    else:
+        # Some node ignored dataSlice: decode account by account and keep the head of each
+        decoded = (b64decode(e) for e in encoded)
+        raw = b"".join(d[:TOKEN_ACCOUNT_HEAD.itemsize] for d in decoded if len(d) >= TOKEN_ACCOUNT_HEAD.itemsize)
+    heads = np.frombuffer(raw, dtype=TOKEN_ACCOUNT_HEAD)
+    heads = heads[heads["amount"] != 0]
+    mint_names = {}
+    mints = []
+    for mint_bytes in heads["mint"].tolist():
+        mint = mint_names.get(mint_bytes)
+        if mint is None:
+            mint = mint_names[mint_bytes] = str(Pubkey.from_bytes(mint_bytes))
+        mints.append(mint)
+    return list(zip(mints, heads["amount"].tolist()))
+
+async def fetch_mint_decimals(mints: list) -> dict:
+    """Decimals per mint, read from the mint accounts with batched getMultipleAccounts."""
+    chunks = [mints[i:i + GET_MULTIPLE_ACCOUNTS_MAX] for i in range(0, len(mints), GET_MULTIPLE_ACCOUNTS_MAX)]
+    responses = await get_rpc_batch([
+        {
+            "method": "getMultipleAccounts",
+            "params": [chunk, {"encoding": "base64", "dataSlice": {"offset": MINT_DECIMALS_OFFSET, "length": 1}}]
+        }
+        for chunk in chunks
+    ])
+    decimals = {}
+    for chunk, response in zip(chunks, responses):
+        values = (response.get("result") or {}).get("value") or []
+        for mint, account in zip(chunk, values):
+            if account and isinstance(account.get("data"), list):
+                raw = b64decode(account["data"][0])
+                if raw:
+                    decimals[mint] = raw[0]
+    return decimals
+
+async def resolve_mint_decimals(mints, metadata: dict) -> dict:
+    """
+    Decimals for each mint: from resolved metadata, then the metadata cache (which also holds
+    decimals for mints without a name), then the chain. Chain results are cached.
+    """
+    decimals = {}
+    missing = []
+    for mint in dict.fromkeys(mints):
+        value = (metadata.get(mint) or {}).get("decimals")
+        if value is not None:
+            decimals[mint] = value
+        else:
+            missing.append(mint)
+    if missing:
+        cached = await mint_metadata_cache.get_many(missing)
+        unknown = []
+        for mint in missing:
+            value = (cached.get(mint) or {}).get("decimals")
+            if value is not None:
+                decimals[mint] = value
+            else:
+                unknown.append(mint)
+        if unknown:
+            # Holdings whose decimals are still unknown when the budget runs out are left out
+            learned = await within_budget(fetch_mint_decimals(unknown), {}, "decimals", reserve=0)
+            decimals.update(learned)
+            await mint_metadata_cache.put_many({
+                mint: {**(cached.get(mint) or {"name": None, "symbol": None, "daily_volume": None}), "decimals": value}
+                for mint, value in learned.items()
+            })
+    return decimals
+
+def parse_token_accounts(accounts) -> tuple:
+    """Turn jsonParsed token accounts into ([(mint, raw_amount)] for non-zero balances, {mint: decimals})."""
+    holdings = []
+    decimals = {}
     for acct in accounts:
         info = acct.get("account", {}).get("data", {}).get("parsed", {}).get("info", {})
         token_amount_info = info.get("tokenAmount", {})
-        # Determine token amount with proper decimals
-        amount = None
-        if token_amount_info.get("uiAmountString") is not None:
-            # Use high-precision string if available
+        try:
+            raw = int(token_amount_info.get("amount", "0"))
+            mint_decimals = int(token_amount_info.get("decimals", 0))
+        except (TypeError, ValueError):
+            continue
+        mint = info.get("mint")
+        if not raw or not mint:
+            continue  # Skip empty or zero balances
+        holdings.append((mint, raw))
+        decimals[mint] = mint_decimals
+    return holdings, decimals
+
+def scale_raw_amounts(raw: np.ndarray, decimals: np.ndarray) -> np.ndarray:
+    """
+    UI amounts from raw u64 amounts. The split into whole and fractional units is exact
+    integer arithmetic, so large balances keep full precision up to the single float conversion.
+    """
+    exact = decimals <= 19  # 10**19 is the largest power of ten a u64 holds
+    scale = np.power(np.uint64(10), np.where(exact, decimals, 0).astype(np.uint64))
+    whole = raw // scale
+    frac = raw % scale
+    amounts = whole.astype(np.float64) + frac.astype(np.float64) / scale.astype(np.float64)
+    if not exact.all():
+        amounts = np.where(exact, amounts, raw.astype(np.float64) / np.power(10.0, decimals))
+    return amounts
+
+def value_holdings(holdings: dict, decimals: dict, prices: dict) -> dict:
+    """
+    Value every wallet's holdings in one vectorized pass.
+
+    `holdings` maps wallet -> [(mint, raw_amount)]. Mints are joined against the price and
+    decimals tables by integer code; amounts, USD values and per-wallet totals are computed
+    on arrays, and rows are sorted by USD value (highest first, unpriced last) within each wallet.
+    Returns {wallet: ([(mint, amount, price, usd_value)], tokens_total_usd)}.
+    """
+    wallets = list(holdings)
+    counts = []
+    rows = []
+    for wallet in wallets:
+        wallet_rows = [(mint, raw) for mint, raw in holdings[wallet] if mint in decimals]
+        counts.append(len(wallet_rows))
+        rows.extend(wallet_rows)
+    wallet_index = np.repeat(np.arange(len(wallets)), counts)
+    codes = {}
+    mint_codes = np.fromiter((codes.setdefault(mint, len(codes)) for mint, _ in rows), dtype=np.int64, count=len(rows))
+    raw = np.fromiter((amount for _, amount in rows), dtype=np.uint64, count=len(rows))
+    price_table = np.array([prices.get(mint, np.nan) for mint in codes] or [np.nan], dtype=np.float64)
+    decimal_table = np.array([decimals[mint] for mint in codes] or [0], dtype=np.int64)
+    price = price_table[mint_codes]
+    amount = scale_raw_amounts(raw, decimal_table[mint_codes])
+    usd = amount * price
+    priced = ~np.isnan(usd)
+    totals = np.bincount(wallet_index, weights=np.where(priced, usd, 0.0), minlength=len(wallets))
+    order = np.lexsort((np.where(priced, -usd, np.inf), wallet_index))
+    mints = [rows[i][0] for i in order.tolist()]
+    amount_list = amount[order].tolist()
+    price_list = [None if p != p else p for p in price[order].tolist()]
+    usd_list = [None if u != u else u for u in usd[order].tolist()]
+    valued = {}
+    start = 0
+    for wallet, count, total in zip(wallets, counts, totals.astype(np.float64).tolist()):
+        end = start + count
+        valued[wallet] = (
+            list(zip(mints[start:end], amount_list[start:end], price_list[start:end], usd_list[start:end])),
+            total
+        )
+        start = end
+    return valued
+
+def build_portfolios(balances: dict, holdings: dict, decimals: dict, prices: dict, metadata: dict) -> dict:
+    """Assemble the /balances response for each wallet in `balances` ({wallet: lamports})."""
+    valued = value_holdings(holdings, decimals, prices)
+    # SOL price (from WSOL entry) if available for total SOL value
+    sol_price = prices.get(WSOL_MINT)
+    portfolios = {}
+    for wallet, lamports in balances.items():
+        rows, tokens_usd = valued.get(wallet, ([], 0.0))
+        tokens_output = []
+        for mint, amount, price, usd_value in rows:
+            # Default name and symbol as unknown unless metadata was found
+            meta = metadata.get(mint) or {}
+            tokens_output.append({
+                "mint": mint,
+                "name": meta.get("name") or "Unknown Token",
+                "symbol": meta.get("symbol") or mint[:4] + "..." + mint[-4:],
+                "amount": amount,
+                "price": price,
+                "usd_value": usd_value,
+                "daily_volume": meta.get("daily_volume")
+            })
+        sol_amount = lamports / 1e9  # Convert lamports to SOL
+        sol_usd_value = sol_price * sol_amount if sol_price is not None else None
+        portfolios[wallet] = {
+            "sol": {
+                "amount": sol_amount,
+                "price": sol_price,
+                "usd_value": sol_usd_value
+            },
+            "tokens": tokens_output,
+            "total_usd": tokens_usd + (sol_usd_value or 0.0)
+        }
+    return portfolios
+
+async def price_and_describe(mints) -> tuple:
+    """
+    One price fetch (plus SOL) and one metadata pass for a set of mints. Both are optional:
+    prices still being fetched when the request's budget runs out come back empty, as does
+    metadata that needed an upstream lookup.
+    """
+    mints = list(dict.fromkeys(mints))
+    return await asyncio.gather(
+        within_budget(price_service.get_prices([*mints, WSOL_MINT]), {}, "prices"),
+        resolve_token_metadata(mints)
+    )
+
+async def describe_token_accounts(wallet_accounts: dict, encoding: str) -> tuple:
+    """
+    Turn {wallet: token accounts} into ({wallet: [(mint, raw_amount)]}, decimals, prices, metadata),
+    with one price fetch and one metadata pass shared by every wallet.
+    """
+    holdings = {}
+    decimals = {}
+    if encoding == "base64":
+        holdings = {wallet: decode_token_accounts(accounts) for wallet, accounts in wallet_accounts.items()}
+    else:
+        for wallet, accounts in wallet_accounts.items():
+            holdings[wallet], wallet_decimals = parse_token_accounts(accounts)
+            decimals.update(wallet_decimals)
+    mints = [mint for rows in holdings.values() for mint, _ in rows]
+    prices, metadata = await price_and_describe(mints)
+    if encoding == "base64":
+        decimals = await resolve_mint_decimals(mints, metadata)
+    return holdings, decimals, prices, metadata
+
+def check_token_account_encoding(encoding: Optional[str]) -> str:
+    encoding = encoding or TOKEN_ACCOUNT_ENCODING
+    if encoding not in TOKEN_ACCOUNT_ENCODINGS:
+        raise HTTPException(status_code=422, detail=f"encoding must be one of {', '.join(TOKEN_ACCOUNT_ENCODINGS)}")
+    return encoding
+
+# Hot wallets: the most requested wallets are kept fresh in memory by RPC WebSocket subscriptions
+HOT_WALLETS_ENABLED = os.getenv("HOT_WALLETS_ENABLED", "true").lower() in ("1", "true", "yes")
+RPC_WS_URL = os.getenv("RPC_WS_URL") or (
+    RPC_ENDPOINTS[0].replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+    if os.getenv("RPC_ENDPOINTS") else "wss://api.mainnet-beta.solana.com"
+)
+HOT_WALLETS_MAX = int(os.getenv("HOT_WALLETS_MAX", "50"))
+# Request counts decay with this time constant; a wallet scoring HOT_WALLET_MIN_REQUESTS is watched
+HOT_WALLET_WINDOW_SECONDS = float(os.getenv("HOT_WALLET_WINDOW_SECONDS", "600"))
+HOT_WALLET_MIN_REQUESTS = float(os.getenv("HOT_WALLET_MIN_REQUESTS", "3"))
+# Watched regardless of traffic, e.g. the treasury
+HOT_WALLETS_PINNED = [a.strip() for a in os.getenv("HOT_WALLETS_PINNED", "").split(",") if a.strip()]
+HOT_WALLET_COMMITMENT = "confirmed"
+HOT_WALLET_REQUEST_TIMEOUT = 10
+HOT_WALLET_RECONNECT_MAX_SECONDS = 60
+# Token accounts per wallet watched one by one (closing an account only shows up on its own subscription)
+HOT_WALLET_ACCOUNT_SUBSCRIPTIONS = int(os.getenv("HOT_WALLET_ACCOUNT_SUBSCRIPTIONS", "200"))
+# Watched wallets are re-read over HTTP this often, catching anything a subscription could not
+HOT_WALLET_RESEED_SECONDS = float(os.getenv("HOT_WALLET_RESEED_SECONDS", "120"))
+# Set for work that is not client traffic (the startup warm-up), whose lookups must not make a wallet hot
+_counts_toward_hot_wallets = contextvars.ContextVar("counts_toward_hot_wallets", default=True)
+
+class WatchedWallet:
+    """In-memory portfolio of one subscribed wallet; every value keeps the slot it was observed at."""
+
+    def __init__(self):
+        self.lamports = None  # (slot, lamports)
+        self.accounts = {}  # token account -> (slot, program id, mint, raw amount, decimals)
+        self.subscriptions = []  # (unsubscribe method, subscription id)
+        self.watched_accounts = set()  # token accounts with their own accountSubscribe
+        self.ready = False
+        self.seeded_at = None
+
+    @property
+    def slot(self) -> int:
+        return max([self.lamports[0] if self.lamports else 0, *(entry[0] for entry in self.accounts.values())])
+
+    def set_lamports(self, slot: int, lamports: int):
+        if self.lamports is None or slot >= self.lamports[0]:
+            self.lamports = (slot, lamports)
+
+    def set_account(self, pubkey: str, slot: int, program_id: str, account):
+        """Apply a jsonParsed token account seen at `slot`; a closed account is kept as a zero balance so older data cannot revive it."""
+        current = self.accounts.get(pubkey)
+        if not pubkey or (current is not None and slot < current[0]):
+            return
+        data = (account or {}).get("data")
+        info = data.get("parsed", {}).get("info", {}) if isinstance(data, dict) else {}
+        token_amount_info = info.get("tokenAmount", {})
+        try:
+            raw = int(token_amount_info.get("amount", "0"))
+            decimals = int(token_amount_info.get("decimals", 0))
+        except (TypeError, ValueError):
+            raw, decimals = 0, 0
+        self.accounts[pubkey] = (slot, program_id, info.get("mint"), raw, decimals)
+
+    def seed_program(self, slot: int, program_id: str, accounts: list):
+        """Apply a full listing of the wallet's `program_id` accounts at `slot`; older accounts missing from it were closed."""
+        listed = set()
+        for acct in accounts:
+            self.set_account(acct.get("pubkey"), slot, program_id, acct.get("account"))
+            listed.add(acct.get("pubkey"))
+        for pubkey, entry in list(self.accounts.items()):
+            if entry[1] == program_id and pubkey not in listed and entry[0] < slot:
+                self.accounts[pubkey] = (slot, program_id, None, 0, 0)
+
+    def holdings(self, include_token2022: bool) -> tuple:
+        """([(mint, raw_amount)] for non-zero balances, {mint: decimals}), as parse_token_accounts returns them."""
+        program_ids = token_program_ids(include_token2022)
+        holdings = []
+        decimals = {}
+        for _, program_id, mint, raw, mint_decimals in self.accounts.values():
+            if raw and mint and program_id in program_ids:
+                holdings.append((mint, raw))
+                decimals[mint] = mint_decimals
+        return holdings, decimals
+
+class WalletWatcher:
+    """
+    Keeps the most requested wallets' balances in memory over one RPC WebSocket connection.
+
+    Requests are scored with an exponentially decaying count; the HOT_WALLETS_MAX top wallets
+    scoring at least HOT_WALLET_MIN_REQUESTS, plus HOT_WALLETS_PINNED, get an accountSubscribe
+    for their lamports and a programSubscribe per token program for their token accounts. Each
+    wallet is seeded over HTTP once its subscriptions are live, and notifications keep it current
+    from then on. A token account that is closed leaves its program, so no program notification
+    reports it: each token account (up to HOT_WALLET_ACCOUNT_SUBSCRIPTIONS per wallet) also gets
+    its own accountSubscribe, and every wallet is reseeded over HTTP each HOT_WALLET_RESEED_SECONDS.
+    Wallets that cool off are unsubscribed. A dropped connection discards every snapshot
+    (requests fall back to RPC) and is re-established with backoff.
+    """
+
+    def __init__(self, url: str, max_wallets: int, pinned: list):
+        self.url = url
+        self.max_wallets = max_wallets
+        self.pinned = set(pinned)
+        self.scores = {}  # wallet -> (score, updated at)
+        self.wallets = {}  # wallet -> WatchedWallet
+        self._subscriptions = {}  # subscription id -> (wallet, program id or None for lamports, token account or None)
+        self._pending = {}  # request id -> future
+        self._next_id = 0
+        self._changed = asyncio.Event()
+        self._ws = None
+        self.served = 0
+        self.notifications = 0
+        self.connects = 0
+        self.last_error = None
+
+    def record_request(self, wallet: str):
+        if not _counts_toward_hot_wallets.get():
+            return
+        now = time.monotonic()
+        score = self._score(wallet, now) + 1
+        self.scores[wallet] = (score, now)
+        if wallet not in self.wallets and self._hot(score):
+            self._changed.set()
+        if len(self.scores) > self.max_wallets * 100:
+            self.scores = {w: entry for w, entry in self.scores.items() if self._score(w, now) >= 0.5}
+
+    def _score(self, wallet: str, now: float) -> float:
+        score, updated_at = self.scores.get(wallet, (0.0, now))
+        return score * math.exp((updated_at - now) / HOT_WALLET_WINDOW_SECONDS)
+
+    @staticmethod
+    def _hot(score: float) -> bool:
+        # Scores decay continuously, so N requests in quick succession score just under N
+        return score + 0.5 >= HOT_WALLET_MIN_REQUESTS
+
+    def desired(self) -> set:
+        """The wallets that should be watched right now."""
+        now = time.monotonic()
+        ranked = sorted(((self._score(w, now), w) for w in self.scores if w not in self.pinned), reverse=True)
+        return self.pinned | {w for score, w in ranked[:self.max_wallets] if self._hot(score)}
+
+    def snapshot(self, wallet: str):
+        """The wallet's live WatchedWallet, or None if it is not (yet) watched."""
+        watched = self.wallets.get(wallet)
+        if watched is None or not watched.ready:
+            return None
+        self.served += 1
+        return watched
+
+    async def run_forever(self):
+        delay = 1
+        while True:
+            if not self.desired():
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            failed = False
             try:
-                amount = Decimal(token_amount_info["uiAmountString"])
-            except Exception:
-                amount = None
-        elif token_amount_info.get("uiAmount") is not None:
-            amount = Decimal(str(token_amount_info["uiAmount"]))
+                async with websockets.connect(self.url, ping_interval=20, max_size=None, open_timeout=10) as ws:
+                    self._ws = ws
+                    self.connects += 1
+                    reader = asyncio.ensure_future(self._read(ws))
+                    reconciler = asyncio.ensure_future(self._reconcile_forever())
+                    try:
+                        done, _ = await asyncio.wait({reader, reconciler}, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            task.result()
+                        # The reader finishing means the server closed the connection
+                        failed = reader in done
+                    finally:
+                        reader.cancel()
+                        reconciler.cancel()
+                delay = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failed = True
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self._disconnected()
+            if failed:
+                await asyncio.sleep(delay * (1 + random()))
+                delay = min(delay * 2, HOT_WALLET_RECONNECT_MAX_SECONDS)
+
+    def _disconnected(self):
+        self._ws = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("WebSocket closed"))
+        self._pending.clear()
+        self._subscriptions.clear()
+        self.wallets.clear()
+
+    async def _read(self, ws):
+        async for message in ws:
+            data = json.loads(message)
+            if "id" in data:
+                future = self._pending.get(data["id"])
+                if future is not None and not future.done():
+                    if "error" in data:
+                        future.set_exception(Exception((data["error"] or {}).get("message", "RPC error")))
+                    else:
+                        future.set_result(data.get("result"))
+            else:
+                self._notify(data.get("params") or {})
+
+    def _notify(self, params: dict):
+        target = self._subscriptions.get(params.get("subscription"))
+        if target is None:
+            return
+        wallet, program_id, token_account = target
+        watched = self.wallets.get(wallet)
+        if watched is None:
+            return
+        self.notifications += 1
+        result = params.get("result") or {}
+        slot = (result.get("context") or {}).get("slot", 0)
+        value = result.get("value") or {}
+        if program_id is None:
+            watched.set_lamports(slot, value.get("lamports", 0))
+        elif token_account is not None:
+            # A closed account arrives here as an empty system account, which reads as a zero balance
+            watched.set_account(token_account, slot, program_id, value)
         else:
+            watched.set_account(value.get("pubkey"), slot, program_id, value.get("account"))
+            if value.get("pubkey") not in watched.watched_accounts:
+                # A new token account: watch it too, so its closing is seen
+                task = asyncio.ensure_future(self._watch_account(wallet, value.get("pubkey"), program_id))
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _request(self, method: str, params: list):
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._ws.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+            return await asyncio.wait_for(future, HOT_WALLET_REQUEST_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _reconcile_forever(self):
+        """Subscribe wallets that became hot and unsubscribe ones that cooled off; returns once nothing is wanted."""
+        while True:
+            self._changed.clear()
+            desired = self.desired()
+            if not desired and not self.wallets:
+                return
+            for wallet in [w for w in self.wallets if w not in desired]:
+                await self._unwatch(wallet)
+            await asyncio.gather(*(self._watch(w) for w in desired if w not in self.wallets))
+            due = time.monotonic() - HOT_WALLET_RESEED_SECONDS
+            await asyncio.gather(*(self._reseed(w, watched) for w, watched in list(self.wallets.items())
+                                   if watched.ready and watched.seeded_at <= due))
             try:
-                raw = Decimal(token_amount_info.get("amount", "0"))
-                decimals = int(token_amount_info.get("decimals", 0))
-                amount = raw / (Decimal(10) ** decimals)
-            except Exception:
-                amount = None
-        if not amount or amount == 0:
-            continue  # Skip empty or zero balances
-        token_list.append({
-            "mint": info.get("mint"),
-            "amount": amount
-        })
-    # Prepare list of mints (including SOL as WSOL) to fetch prices for
-    mint_addresses = [t["mint"] for t in token_list]
-    WSOL_MINT = "So11111111111111111111111111111111111111112"
-    mint_addresses.append(WSOL_MINT)
-    prices = {}
-    if mint_addresses:
-        ids_param = ",".join(mint_addresses)
+                # Re-checked now and then, so wallets cool off without new traffic and reseeds come due
+                await asyncio.wait_for(self._changed.wait(), min(60, HOT_WALLET_RESEED_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _subscribe(self, wallet: str, method: str, params: list, program_id, token_account=None):
+        subscription = await self._request(method, params)
+        unsubscribe = method.replace("Subscribe", "Unsubscribe")
+        watched = self.wallets.get(wallet)
+        if watched is None:
+            # The wallet was dropped while this was in flight
+            await self._request(unsubscribe, [subscription])
+            return
+        self._subscriptions[subscription] = (wallet, program_id, token_account)
+        watched.subscriptions.append((unsubscribe, subscription))
+
+    async def _watch_account(self, wallet: str, token_account: str, program_id: str):
+        watched = self.wallets.get(wallet)
+        if (watched is None or not token_account or token_account in watched.watched_accounts
+                or len(watched.watched_accounts) >= HOT_WALLET_ACCOUNT_SUBSCRIPTIONS):
+            return
+        watched.watched_accounts.add(token_account)
         try:
-            price_resp = requests.get(f"{JUPITER_PRICE_URL}{ids_param}", timeout=5)
-            price_data = price_resp.json()
-            prices = price_data.get("data", {})
+            await self._subscribe(wallet, "accountSubscribe", [token_account, {
+                "encoding": "jsonParsed", "commitment": HOT_WALLET_COMMITMENT
+            }], program_id, token_account)
+        except (ConnectionError, asyncio.TimeoutError):
+            watched.watched_accounts.discard(token_account)
+            raise
         except Exception:
-            prices = {}
-    # Assemble token balance results with pricing
-    tokens_output = []
-    for token in token_list:
-        mint = token["mint"]
-        amt = token["amount"]
-        # Default name and symbol as unknown (will try to fetch metadata below)
-        name = "Unknown Token"
-        symbol = mint[:4] + "..." + mint[-4:]
-        daily_volume = None
-        # Try to get token metadata (name, symbol, volume) from Jupiter's token info
+            # Reseeds still catch this account closing
+            watched.watched_accounts.discard(token_account)
+
+    async def _seed(self, wallet: str, watched: WatchedWallet):
+        """Read the wallet's lamports and token accounts over HTTP into its snapshot."""
+        seeded_at = time.monotonic()
+        balance_data, *token_data = await asyncio.gather(
+            get_rpc_response({"jsonrpc": "2.0", "id": 1, "method": "getBalance", "params": [wallet, {"commitment": HOT_WALLET_COMMITMENT}]}),
+            *(get_rpc_response(token_accounts_payload(wallet, program_id, "jsonParsed", HOT_WALLET_COMMITMENT))
+              for program_id in token_program_ids(True))
+        )
+        watched.set_lamports(balance_data["result"]["context"]["slot"], balance_data["result"]["value"])
+        for program_id, data in zip(token_program_ids(True), token_data):
+            watched.seed_program(data["result"]["context"]["slot"], program_id, data["result"]["value"])
+        watched.seeded_at = seeded_at
+
+    async def _reseed(self, wallet: str, watched: WatchedWallet):
         try:
-            meta_resp = requests.get(f"{JUPITER_TOKEN_INFO_URL}{mint}", timeout=5)
-            if meta_resp.status_code == 200:
-                meta = meta_resp.json()
-                name = meta.get("name") or name
-                symbol = meta.get("symbol") or symbol
-                daily_volume = meta.get("daily_volume")
-        except Exception:
-            pass
-        # Get price and USD value if available
-        price = None
-        usd_value = None
-        if mint in prices:
-            price_str = prices[mint].get("price")
-            if price_str is not None:
-                try:
-                    price = float(price_str)
-                except Exception:
-                    # Handle cases where price might be in scientific notation or string
-                    try:
-                        price = float(Decimal(price_str))
-                    except Exception:
-                        price = None
-        if price is not None:
-            usd_value = float(Decimal(str(price)) * amt)
-        tokens_output.append({
-            "mint": mint,
-            "name": name,
-            "symbol": symbol,
-            "amount": float(amt),
-            "price": price,
-            "usd_value": usd_value,
-            "daily_volume": daily_volume
-        })
-    # Fetch SOL price (from WSOL entry) if available for total SOL value
-    sol_price = None
-    sol_usd_value = None
-    if WSOL_MINT in prices:
-        price_str = prices[WSOL_MINT].get("price")
-        if price_str is not None:
+            await self._seed(wallet, watched)
+        except Exception as e:
+            # The snapshot stays as notifications left it; retried when next due
+            self.last_error = f"{type(e).__name__}: {e}"
+            watched.seeded_at = time.monotonic()
+
+    async def _watch(self, wallet: str):
+        watched = self.wallets[wallet] = WatchedWallet()
+        try:
+            subscribed = await asyncio.gather(
+                self._subscribe(wallet, "accountSubscribe", [wallet, {"encoding": "base64", "commitment": HOT_WALLET_COMMITMENT}], None),
+                *(self._subscribe(wallet, "programSubscribe", [program_id, {
+                    "encoding": "jsonParsed",
+                    "commitment": HOT_WALLET_COMMITMENT,
+                    # Token accounts keep their owner at offset 32; classic ones are always 165 bytes
+                    "filters": ([{"dataSize": 165}] if program_id == TOKEN_PROGRAM_ID else []) + [{"memcmp": {"offset": 32, "bytes": wallet}}]
+                }], program_id) for program_id in token_program_ids(True)),
+                return_exceptions=True
+            )
+            for result in subscribed:
+                if isinstance(result, BaseException):
+                    raise result
+            # Seeded only once subscribed, so no change can fall between the two
+            await self._seed(wallet, watched)
+            await asyncio.gather(*(self._watch_account(wallet, pubkey, entry[1]) for pubkey, entry in list(watched.accounts.items())
+                                   if entry[2] is not None))
+        except (ConnectionError, asyncio.TimeoutError, asyncio.CancelledError):
+            # The connection is in trouble, not the wallet; run_forever reconnects
+            raise
+        except Exception as e:
+            # Most likely an address the node rejects: forget it until it gets hot again
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.scores.pop(wallet, None)
+            await self._unwatch(wallet)
+            return
+        watched.ready = True
+
+    async def _unwatch(self, wallet: str):
+        watched = self.wallets.pop(wallet, None)
+        for method, subscription in (watched.subscriptions if watched else []):
+            self._subscriptions.pop(subscription, None)
             try:
-                sol_price = float(price_str)
+                await self._request(method, [subscription])
             except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "watched": len(self.wallets),
+            "ready": sum(w.ready for w in self.wallets.values()),
+            "account_subscriptions": sum(len(w.watched_accounts) for w in self.wallets.values()),
+            "candidates": len(self.scores),
+            "served": self.served,
+            "notifications": self.notifications,
+            "connects": self.connects,
+            "connected": self._ws is not None,
+            "last_error": self.last_error
+        }
+
+wallet_watcher = WalletWatcher(RPC_WS_URL, HOT_WALLETS_MAX, HOT_WALLETS_PINNED)
+
+@app.on_event("startup")
+async def start_wallet_watcher():
+    if HOT_WALLETS_ENABLED and websockets is not None:
+        start_background_task(wallet_watcher.run_forever())
+
+@app.get("/balances/{address}")
+async def get_balances(response: Response, address: str, encoding: Optional[str] = None, token2022: Optional[bool] = None,
+                       limit: Optional[int] = None, cursor: Optional[str] = None, min_usd: Optional[float] = None,
+                       top: Optional[int] = None, exclude_dust: bool = False):
+    """
+    Get the SOL balance and all SPL token balances for a given wallet address.
+    `encoding` picks base64 (decoded locally) or jsonParsed token accounts; `token2022` also includes Token-2022 accounts.
+    `min_usd`, `exclude_dust` and `top` (N most valuable) filter the token rows; `limit` pages them, with the
+    X-Next-Cursor response header holding the `cursor` for the next page.
+    Hot wallets are served from their subscription snapshot instead of RPC.
+    """
+    encoding = check_token_account_encoding(encoding)
+    include_token2022 = TOKEN_2022_ENABLED if token2022 is None else token2022
+    check_balance_shaping(limit, top)
+    shape = lambda portfolio: shape_balance_tokens(portfolio, response, limit, cursor, min_usd, top, exclude_dust)
+    wallet_watcher.record_request(address)
+    watched = wallet_watcher.snapshot(address)
+    if watched is not None:
+        holdings, decimals = watched.holdings(include_token2022)
+        prices, metadata = await price_and_describe([mint for mint, _ in holdings])
+        portfolio = build_portfolios({address: watched.lamports[1]}, {address: holdings}, decimals, prices, metadata)[address]
+        return with_incomplete_marker({**shape(portfolio), "slot": watched.slot})
+    # Fetch SOL balance (in lamports) and all token accounts concurrently
+    balance_payload = {
+        "jsonrpc": "2.0", "id": 1,
+        "method": "getBalance",
+        "params": [address]
+    }
+    balance_data, *token_data = await asyncio.gather(
+        get_rpc_response(balance_payload),
+        *(get_rpc_response(token_accounts_payload(address, program_id, encoding))
+          for program_id in token_program_ids(include_token2022)),
+        return_exceptions=True
+    )
+    if isinstance(balance_data, Exception):
+        if isinstance(balance_data, DeadlineExceeded):
+            mark_incomplete("sol")
+        return with_incomplete_marker({"error": "Unable to fetch SOL balance", "details": str(balance_data)})
+    lamports = balance_data.get("result", {}).get("value", 0)
+    if any(isinstance(data, Exception) for data in token_data):
+        if any(isinstance(data, DeadlineExceeded) for data in token_data):
+            mark_incomplete("tokens")
+        # If token accounts lookup fails, return SOL amount and an error message
+        return with_incomplete_marker({
+            "sol": {"amount": lamports / 1e9, "price": None, "usd_value": None},
+            "tokens": [],
+            "error": "Token account lookup failed"
+        })
+    accounts = [acct for data in token_data for acct in data.get("result", {}).get("value", [])]
+    holdings, decimals, prices, metadata = await describe_token_accounts({address: accounts}, encoding)
+    portfolio = build_portfolios({address: lamports}, holdings, decimals, prices, metadata)[address]
+    return with_incomplete_marker({**shape(portfolio), "slot": balance_data.get("result", {}).get("context", {}).get("slot")})
+
+# Large wallets: token rows streamed as NDJSON while the RPC response is still arriving, and
+# paginated or filtered /balances responses
+BALANCES_STREAM_CHUNK = int(os.getenv("BALANCES_STREAM_CHUNK", "250"))
+# Chunks read and being valued while an earlier one is still being sent
+BALANCES_STREAM_AHEAD = int(os.getenv("BALANCES_STREAM_AHEAD", "2"))
+BALANCES_PAGE_MAX = 1000
+# Holdings worth less than this (or with no known price) count as dust
+BALANCES_DUST_USD = float(os.getenv("BALANCES_DUST_USD", "1"))
+TOKEN_ACCOUNT_DATA_PATTERN = re.compile(rb'"data"\s*:\s*\[\s*"([A-Za-z0-9+/=]*)"\s*,\s*"base64"\s*\]')
+RESPONSE_SLOT_PATTERN = re.compile(rb'"slot"\s*:\s*(\d+)')
+# Bytes kept while no account has been found in them, enough for any account's data string
+TOKEN_ACCOUNT_SCAN_TAIL = 4096
+
+async def stream_token_holdings(address: str, program_id: str, chunk_size: int = BALANCES_STREAM_CHUNK):
+    """
+    Yield (slot, [(mint, raw_amount)]) chunks of a wallet's non-zero token balances while the
+    base64 getTokenAccountsByOwner response is still arriving. The body is scanned for account data
+    strings as it streams in, so only one chunk of accounts is held at a time, however many the wallet has.
+    """
+    buffer = b""
+    head = b""
+    slot = None
+    encoded = []
+    async for data in rpc_router.stream(token_accounts_payload(address, program_id, "base64")):
+        if len(head) < 512:
+            head += data[:512 - len(head)]
+        buffer += data
+        if slot is None:
+            match = RESPONSE_SLOT_PATTERN.search(buffer)
+            slot = int(match.group(1)) if match else None
+        end = 0
+        for match in TOKEN_ACCOUNT_DATA_PATTERN.finditer(buffer):
+            encoded.append(match.group(1).decode())
+            end = match.end()
+        buffer = buffer[end:] if end else buffer[-TOKEN_ACCOUNT_SCAN_TAIL:]
+        while len(encoded) >= chunk_size:
+            yield slot, decode_token_account_heads(encoded[:chunk_size])
+            encoded = encoded[chunk_size:]
+    if b'"result"' not in head:
+        raise Exception("RPC error while listing token accounts")
+    if encoded:
+        yield slot, decode_token_account_heads(encoded)
+
+async def token_holding_chunks(address: str, include_token2022: bool, watched):
+    """(holdings, decimals or None) chunks from a hot wallet's snapshot, else streamed from RPC."""
+    if watched is not None:
+        holdings, decimals = watched.holdings(include_token2022)
+        for i in range(0, len(holdings), BALANCES_STREAM_CHUNK):
+            yield holdings[i:i + BALANCES_STREAM_CHUNK], decimals
+        return
+    for program_id in token_program_ids(include_token2022):
+        async for _, holdings in stream_token_holdings(address, program_id):
+            yield holdings, None
+
+def balance_row_filter(min_usd: Optional[float], exclude_dust: bool):
+    def keep(row: dict) -> bool:
+        usd_value = row["usd_value"]
+        if exclude_dust and (usd_value is None or usd_value < BALANCES_DUST_USD):
+            return False
+        return min_usd is None or (usd_value is not None and usd_value >= min_usd)
+    return keep
+
+def balance_row_key(row: dict) -> tuple:
+    """Sort key for token rows: highest USD value first, unpriced last, then by mint so ties have a fixed order."""
+    return (-(row["usd_value"] if row["usd_value"] is not None else -1.0), row["mint"])
+
+def check_balance_shaping(limit: Optional[int], top: Optional[int]):
+    for name, value in (("limit", limit), ("top", top)):
+        if value is not None and not 1 <= value <= BALANCES_PAGE_MAX:
+            raise HTTPException(status_code=422, detail=f"{name} must be between 1 and {BALANCES_PAGE_MAX}")
+
+def shape_balance_tokens(portfolio: dict, response: Response, limit: Optional[int], cursor: Optional[str],
+                         min_usd: Optional[float], top: Optional[int], exclude_dust: bool) -> dict:
+    """
+    Filter a portfolio's token rows (`min_usd`, `exclude_dust`, `top` N by value) and cut one page of
+    `limit` rows after `cursor`, setting X-Next-Cursor when more follow. `total_usd` stays the wallet's total.
+    """
+    if limit is None and cursor is None and min_usd is None and top is None and not exclude_dust:
+        return portfolio
+    keep = balance_row_filter(min_usd, exclude_dust)
+    tokens = sorted((row for row in portfolio["tokens"] if keep(row)), key=balance_row_key)
+    if top is not None:
+        tokens = tokens[:top]
+    position = decode_cursor(cursor)
+    if position is not None:
+        after = (-position[0], position[1])
+        tokens = [row for row in tokens if balance_row_key(row) > after]
+    if limit is not None and len(tokens) > limit:
+        tokens = tokens[:limit]
+        last = tokens[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([-balance_row_key(last)[0], last["mint"]])
+    return {**portfolio, "tokens": tokens}
+
+async def stream_balance_lines(address: str, include_token2022: bool, min_usd: Optional[float],
+                               top: Optional[int], exclude_dust: bool):
+    """
+    NDJSON for a wallet: a `wallet` line with the SOL balance, then `token` lines valued a chunk at a
+    time as the token accounts arrive (with `top`, the N most valuable at the end), then a `summary`
+    line with counts and the total over every holding, filtered or not. Up to BALANCES_STREAM_AHEAD
+    chunks are read and valued concurrently while an earlier one is sent; lines keep the chunk order.
+    """
+    encode = lambda item: shaped_record(item).decode() + "\n"
+    # A stream delivers as it goes, so the per-request deadline does not cut it off
+    _request_deadline.set(None)
+    watched = wallet_watcher.snapshot(address)
+    try:
+        if watched is not None:
+            lamports, slot = watched.lamports[1], watched.slot
+        else:
+            balance_data = await get_rpc_response({"jsonrpc": "2.0", "id": 1, "method": "getBalance", "params": [address]})
+            lamports = balance_data.get("result", {}).get("value", 0)
+            slot = balance_data.get("result", {}).get("context", {}).get("slot")
+    except Exception as e:
+        yield encode({"type": "error", "error": "Unable to fetch SOL balance", "details": str(e)})
+        return
+    sol_price = await price_service.get_price(WSOL_MINT)
+    sol_amount = lamports / 1e9
+    sol_usd_value = sol_price * sol_amount if sol_price is not None else None
+    yield encode({"type": "wallet", "address": address, "slot": slot,
+                  "sol": {"amount": sol_amount, "price": sol_price, "usd_value": sol_usd_value}})
+    keep = balance_row_filter(min_usd, exclude_dust)
+    best = []  # min-heap of the `top` most valuable rows so far: (usd value, -position, row)
+    scanned = emitted = 0
+    tokens_usd = 0.0
+
+    async def value(holdings, decimals):
+        mints = [mint for mint, _ in holdings]
+        prices, metadata = await price_and_describe(mints)
+        if decimals is None:
+            decimals = await resolve_mint_decimals(mints, metadata)
+        return build_portfolios({address: 0}, {address: holdings}, decimals, prices, metadata)[address]["tokens"]
+
+    # Valuation tasks in chunk order, then None; a failed read ends it with the exception instead
+    valued = asyncio.Queue(maxsize=max(BALANCES_STREAM_AHEAD, 1))
+
+    async def read_chunks():
+        try:
+            async for holdings, decimals in token_holding_chunks(address, include_token2022, watched):
+                await valued.put(asyncio.ensure_future(value(holdings, decimals)))
+        except Exception as e:
+            await valued.put(e)
+            return
+        await valued.put(None)
+
+    reader = asyncio.ensure_future(read_chunks())
+    item = None
+    try:
+        while (item := await valued.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            lines = []
+            for row in await item:
+                scanned += 1
+                tokens_usd += row["usd_value"] or 0.0
+                if not keep(row):
+                    continue
+                if top is None:
+                    lines.append(encode({"type": "token", **row}))
+                    continue
+                entry = (-balance_row_key(row)[0], -scanned, row)
+                if len(best) < top:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+            if lines:
+                # One write per chunk rather than per line: each write is a separate send to the client
+                emitted += len(lines)
+                yield "".join(lines)
+    except Exception as e:
+        yield encode({"type": "error", "error": "Token account lookup failed", "details": str(e)})
+        return
+    finally:
+        # The client went away or a chunk failed: stop reading and drop the valuations still queued
+        reader.cancel()
+        pending = [item]
+        while not valued.empty():
+            pending.append(valued.get_nowait())
+        for task in pending:
+            if isinstance(task, asyncio.Future):
+                task.cancel()
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    ranked = [encode({"type": "token", **row}) for _, _, row in sorted(best, key=lambda entry: balance_row_key(entry[2]))]
+    emitted += len(ranked)
+    yield "".join(ranked) + encode({"type": "summary", "token_accounts": scanned, "tokens": emitted,
+                                    "total_usd": tokens_usd + (sol_usd_value or 0.0)})
+
+@app.get("/balances/{address}/stream")
+async def stream_balances(address: str, token2022: Optional[bool] = None, min_usd: Optional[float] = None,
+                          top: Optional[int] = None, exclude_dust: bool = False):
+    """
+    Stream a wallet's SOL and token balances as NDJSON, with token rows sent while the token accounts
+    are still being fetched, so memory and time to first byte stay flat for wallets of any size.
+    `min_usd`, `exclude_dust` and `top` filter rows as in /balances.
+    """
+    include_token2022 = TOKEN_2022_ENABLED if token2022 is None else token2022
+    check_balance_shaping(None, top)
+    wallet_watcher.record_request(address)
+    return StreamingResponse(
+        stream_balance_lines(address, include_token2022, min_usd, top, exclude_dust),
+        media_type="application/x-ndjson"
+    )
+
+def is_valid_address(address: str) -> bool:
+    try:
+        Pubkey.from_string(address)
+        return True
+    except ValueError:
+        return False
+
+async def fetch_sol_balances(addresses: list) -> dict:
+    """
+    Lamports per address via batched getMultipleAccounts (None where the lookup failed).
+    Invalid addresses are never sent, since one would fail the whole call for its chunk.
+    """
+    balances = {address: None for address in addresses if not is_valid_address(address)}
+    addresses = [address for address in addresses if address not in balances]
+    chunks = [addresses[i:i + GET_MULTIPLE_ACCOUNTS_MAX] for i in range(0, len(addresses), GET_MULTIPLE_ACCOUNTS_MAX)]
+    responses = await get_rpc_batch([
+        {
+            "method": "getMultipleAccounts",
+            # Only lamports are needed, so ask for no account data at all
+            "params": [chunk, {"encoding": "base64", "dataSlice": {"offset": 0, "length": 0}}]
+        }
+        for chunk in chunks
+    ])
+    for chunk, response in zip(chunks, responses):
+        values = (response.get("result") or {}).get("value")
+        for i, address in enumerate(chunk):
+            if values is None or i >= len(values):
+                balances[address] = None
+            else:
+                # A wallet that was never funded has no account: zero lamports
+                balances[address] = (values[i] or {}).get("lamports", 0)
+    return balances
+
+async def fetch_token_accounts(addresses: list, encoding: str = "jsonParsed", include_token2022: bool = False) -> dict:
+    """Token accounts per address via batched getTokenAccountsByOwner (None where the lookup failed)."""
+    program_ids = token_program_ids(include_token2022)
+    responses = await get_rpc_batch([
+        token_accounts_payload(address, program_id, encoding) for address in addresses for program_id in program_ids
+    ])
+    accounts = {}
+    for i, address in enumerate(addresses):
+        accounts[address] = []
+        for response in responses[i * len(program_ids):(i + 1) * len(program_ids)]:
+            result = response.get("result")
+            if not isinstance(result, dict):
+                accounts[address] = None
+                break
+            accounts[address].extend(result.get("value", []))
+    return accounts
+
+class BalancesBatchRequest(BaseModel):
+    addresses: List[str]
+    encoding: Optional[str] = None
+    token2022: Optional[bool] = None
+
+@app.post("/balances/batch")
+async def get_balances_batch(request: BalancesBatchRequest):
+    """
+    Get portfolios for many wallets in one call. SOL balances and token accounts are fetched
+    with JSON-RPC batches, and prices and metadata are resolved once for the whole set.
+    """
+    encoding = check_token_account_encoding(request.encoding)
+    include_token2022 = TOKEN_2022_ENABLED if request.token2022 is None else request.token2022
+    addresses = list(dict.fromkeys(a.strip() for a in request.addresses if a.strip()))
+    if not addresses:
+        raise HTTPException(status_code=422, detail="No addresses given")
+    if len(addresses) > BALANCES_BATCH_MAX_ADDRESSES:
+        raise HTTPException(status_code=422, detail=f"At most {BALANCES_BATCH_MAX_ADDRESSES} addresses per batch")
+    valid = [address for address in addresses if is_valid_address(address)]
+    sol_balances, token_accounts = await asyncio.gather(
+        fetch_sol_balances(valid),
+        fetch_token_accounts(valid, encoding, include_token2022)
+    )
+    holdings, decimals, prices, metadata = await describe_token_accounts(
+        {address: accounts for address, accounts in token_accounts.items() if accounts is not None}, encoding
+    )
+    valued = build_portfolios(
+        {address: sol_balances[address] for address in holdings if sol_balances.get(address) is not None},
+        holdings, decimals, prices, metadata
+    )
+    out_of_time = (remaining_budget() or 0) < 0
+    portfolios = []
+    for address in addresses:
+        lamports = sol_balances.get(address)
+        if address not in sol_balances:
+            portfolios.append({"address": address, "error": "Invalid address"})
+        elif lamports is None:
+            if out_of_time:
+                mark_incomplete("sol")
+            portfolios.append({"address": address, "error": "Unable to fetch SOL balance"})
+        elif address not in valued:
+            if out_of_time:
+                mark_incomplete("tokens")
+            portfolios.append({
+                "address": address,
+                "sol": {"amount": lamports / 1e9, "price": None, "usd_value": None},
+                "tokens": [],
+                "error": "Token account lookup failed"
+            })
+        else:
+            portfolios.append({"address": address, **valued[address]})
+    return with_incomplete_marker({"portfolios": portfolios})
+
+# Finalized transaction cache: immutable entries keyed by signature, in memory and on disk
+TX_CACHE_MAX_BYTES = int(os.getenv("TX_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TX_CACHE_DISK_MAX_BYTES = int(os.getenv("TX_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+TX_PREFETCH_MAX_SIGNATURES = int(os.getenv("TX_PREFETCH_MAX_SIGNATURES", "1000"))
+# Bump whenever summarize_transaction changes, so cached summaries are re-rendered from the stored raw transaction
+TX_SUMMARY_VERSION = 2
+
+class TransactionCache:
+    """
+    Finalized transactions keyed by signature. A finalized transaction never changes, so entries
+    never expire; they are only evicted (least recently used first) to stay within the memory
+    and disk byte budgets. Each entry holds the zlib-compressed raw transaction and its summary.
+    Compression and SQLite queries run in a thread, and the disk size is tracked as entries are
+    written and evicted rather than summed from the table, so a full store never stalls the event loop.
+    """
+
+    def __init__(self, db_name: str, max_bytes: int, disk_max_bytes: int):
+        self.db_name = db_name
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._db = None
+        # One connection, used from the default executor's threads one query at a time
+        self._lock = threading.Lock()
+        self._evicting = None
+        self.bytes = 0
+        self.disk_bytes = 0
+        self.disk_entries = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_cache_db(self.db_name)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS transactions (signature TEXT PRIMARY KEY, raw BLOB NOT NULL, "
+                "summary TEXT NOT NULL, version INTEGER NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS transactions_accessed_at ON transactions (accessed_at)")
+            # The one full scan, on first use; from here on the totals are kept up to date as rows change
+            self.disk_entries, self.disk_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transactions"
+            ).fetchone()
+        return self._db
+
+    def _remember(self, signature: str, entry: tuple):
+        previous = self._entries.pop(signature, None)
+        if previous is not None:
+            self.bytes -= len(previous[0]) + len(previous[1])
+        self._entries[signature] = entry
+        self.bytes += len(entry[0]) + len(entry[1])
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            _, (raw, summary, _) = self._entries.popitem(last=False)
+            self.bytes -= len(raw) + len(summary)
+            self.evictions += 1
+
+    def _cached(self, signatures: list) -> set:
+        found = set()
+        with self._lock:
+            for i in range(0, len(signatures), 500):
+                chunk = signatures[i:i + 500]
+                found.update(row[0] for row in self.db.execute(
+                    f"SELECT signature FROM transactions WHERE signature IN ({','.join('?' * len(chunk))})", chunk
+                ))
+        return found
+
+    async def cached(self, signatures) -> set:
+        """The subset of `signatures` held in memory or on disk."""
+        found = {signature for signature in signatures if signature in self._entries}
+        cold = [signature for signature in signatures if signature not in found]
+        if cold:
+            try:
+                found |= await asyncio.to_thread(self._cached, cold)
+            except sqlite3.Error:
+                pass
+        return found
+
+    def _read(self, signature: str):
+        with self._lock:
+            row = self.db.execute(
+                "SELECT raw, summary, version FROM transactions WHERE signature = ?", (signature,)
+            ).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE transactions SET accessed_at = ? WHERE signature = ?", (time.time(), signature))
+        return row
+
+    async def get(self, signature: str):
+        """(compressed raw transaction, summary, summary version) or None."""
+        entry = self._entries.get(signature)
+        if entry is not None:
+            self._entries.move_to_end(signature)
+            self.hits += 1
+            return entry
+        try:
+            row = await asyncio.to_thread(self._read, signature)
+        except sqlite3.Error:
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        entry = (bytes(row[0]), row[1], row[2])
+        self._remember(signature, entry)
+        self.disk_hits += 1
+        return entry
+
+    def _write(self, signature: str, tx: dict, summary: str) -> bytes:
+        raw = zlib.compress(json.dumps(tx, separators=(",", ":")).encode())
+        size = len(raw) + len(summary)
+        try:
+            with self._lock:
+                previous = self.db.execute("SELECT size FROM transactions WHERE signature = ?", (signature,)).fetchone()
+                self.db.execute(
+                    "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+                    (signature, raw, summary, TX_SUMMARY_VERSION, size, time.time())
+                )
+                if previous is None:
+                    self.disk_entries += 1
+                self.disk_bytes += size - (previous[0] if previous else 0)
+        except sqlite3.Error:
+            pass
+        return raw
+
+    async def put(self, signature: str, tx: dict, summary: str):
+        raw = await asyncio.to_thread(self._write, signature, tx, summary)
+        self._remember(signature, (raw, summary, TX_SUMMARY_VERSION))
+        if self.disk_bytes > self.disk_max_bytes and self._evicting is None:
+            # Nobody waits on the eviction; later writes skip starting another while it runs
+            self._evicting = asyncio.ensure_future(asyncio.to_thread(self._evict_disk))
+            self._evicting.add_done_callback(self._evicted)
+
+    def _evicted(self, task: asyncio.Task):
+        self._evicting = None
+        task.cancelled() or task.exception()
+
+    def _evict_disk(self):
+        """Drop the least recently used tenth of the store once it outgrows its budget."""
+        evict = max(self.disk_entries // 10, 1)
+        oldest = "SELECT signature, size FROM transactions ORDER BY accessed_at LIMIT ?"
+        try:
+            with self._lock:
+                self.db.execute("BEGIN IMMEDIATE")
                 try:
-                    sol_price = float(Decimal(price_str))
-                except Exception:
-                    sol_price = None
-    if sol_price is not None:
-        sol_usd_value = sol_price * sol_amount
-    # Prepare final result
-    result["sol"] = {
-        "amount": sol_amount,
-        "price": sol_price,
-        "usd_value": sol_usd_value
-    }
-    result["tokens"] = tokens_output
-    return result
+                    count, size = self.db.execute(
+                        f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ({oldest})", (evict,)
+                    ).fetchone()
+                    self.db.execute(f"DELETE FROM transactions WHERE signature IN (SELECT signature FROM ({oldest}))", (evict,))
+                    self.db.execute("COMMIT")
+                except sqlite3.Error:
+                    self.db.execute("ROLLBACK")
+                    raise
+                self.disk_entries = max(self.disk_entries - count, 0)
+                self.disk_bytes = max(self.disk_bytes - size, 0)
+        except sqlite3.Error:
+            return
+        self.disk_evictions += count
 
-@app.get("/transaction/{signature}")
-def get_transaction(signature: str):
-    """Get a human-readable summary of a Solana transaction by its signature."""
-    tx_payload = {
+    @staticmethod
+    def raw_transaction(entry: tuple) -> dict:
+        return json.loads(zlib.decompress(entry[0]))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "disk_bytes": self.disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None
+        }
+
+transaction_cache = TransactionCache("transactions.sqlite3", TX_CACHE_MAX_BYTES, TX_CACHE_DISK_MAX_BYTES)
+
+def transaction_payload(signature: str, commitment: str = "finalized") -> dict:
+    return {
         "jsonrpc": "2.0", "id": 1,
         "method": "getTransaction",
-        "params": [signature, {"encoding": "jsonParsed"}]
+        # Raw instructions are decoded locally (see INSTRUCTION_DECODERS), which keeps payloads small
+        "params": [signature, {"encoding": "json", "commitment": commitment, "maxSupportedTransactionVersion": 0}]
     }
+
+_finalized_slot = 0
+
+async def is_finalized(slot) -> bool:
+    """Whether `slot` is finalized, asking for the finalized slot only when the last one seen is older."""
+    global _finalized_slot
+    if not isinstance(slot, int):
+        return False
+    if slot > _finalized_slot:
+        try:
+            data = await get_rpc_response({"jsonrpc": "2.0", "id": 1, "method": "getSlot", "params": [{"commitment": "finalized"}]})
+        except Exception:
+            # Unknown is treated as not finalized: the transaction is just not cached this time
+            return False
+        if isinstance(data.get("result"), int):
+            _finalized_slot = max(_finalized_slot, data["result"])
+    return slot <= _finalized_slot
+
+async def fetch_transaction(signature: str) -> tuple:
+    """
+    (transaction, finalized) for a signature, or (None, False) if no node has it.
+    One lookup at confirmed commitment finds finalized transactions too; one whose slot
+    is not yet finalized is returned but flagged so it is never cached.
+    """
+    data = await get_rpc_response(transaction_payload(signature, "confirmed"), allow_empty=True)
+    tx = data.get("result")
+    if not tx:
+        return None, False
+    return tx, await is_finalized(tx.get("slot"))
+
+async def cached_summary(signature: str):
+    """Summary of a cached finalized transaction (re-rendered if it predates the summary format), or None."""
+    entry = await transaction_cache.get(signature)
+    if entry is None:
+        return None
+    if entry[2] != TX_SUMMARY_VERSION:
+        tx = TransactionCache.raw_transaction(entry)
+        summary = summarize_transaction(tx)
+        await transaction_cache.put(signature, tx, summary)
+        return summary
+    return entry[1]
+
+@app.get("/transaction/{signature}")
+async def get_transaction(signature: str):
+    """Get a human-readable summary of a Solana transaction by its signature."""
+    summary = await cached_summary(signature)
+    if summary is not None:
+        return {"signature": signature, "summary": summary}
     try:
-        tx_data = get_rpc_response(tx_payload)
+        tx, finalized = await fetch_transaction(signature)
+    except DeadlineExceeded as e:
+        mark_incomplete("transaction")
+        return with_incomplete_marker({"error": "Unable to fetch transaction", "details": str(e)})
     except Exception as e:
         return {"error": "Unable to fetch transaction", "details": str(e)}
-    if not tx_data.get("result"):
+    if not tx:
         return {"error": "Transaction not found"}
-    tx = tx_data["result"]
+    summary = summarize_transaction(tx)
+    if finalized:
+        await transaction_cache.put(signature, tx, summary)
+    return {"signature": signature, "summary": summary}
+
+class TransactionPrefetchRequest(BaseModel):
+    signatures: List[str]
+
+@app.post("/transaction/prefetch")
+async def prefetch_transactions(request: TransactionPrefetchRequest):
+    """Fetch and cache many finalized transactions in JSON-RPC batches so later lookups need no RPC call."""
+    signatures = list(dict.fromkeys(s.strip() for s in request.signatures if s.strip()))
+    if len(signatures) > TX_PREFETCH_MAX_SIGNATURES:
+        raise HTTPException(status_code=422, detail=f"At most {TX_PREFETCH_MAX_SIGNATURES} signatures per prefetch")
+    cached_already = await transaction_cache.cached(signatures)
+    missing = [signature for signature in signatures if signature not in cached_already]
+    responses = await get_rpc_batch([transaction_payload(signature) for signature in missing])
+    cached = 0
+    unavailable = []
+    for signature, response in zip(missing, responses):
+        tx = response.get("result")
+        if tx:
+            await transaction_cache.put(signature, tx, summarize_transaction(tx))
+            cached += 1
+        else:
+            unavailable.append(signature)
+    return {
+        "requested": len(signatures),
+        "already_cached": len(signatures) - len(missing),
+        "cached": cached,
+        # Not found, not yet finalized, or the lookup failed
+        "unavailable": unavailable
+    }
+
+# Transaction summaries: instruction decoders keyed by program id
+SYSTEM_PROGRAM_ID = "11111111111111111111111111111111"
+COMPUTE_BUDGET_PROGRAM_ID = "ComputeBudget111111111111111111111111111111"
+ASSOCIATED_TOKEN_PROGRAM_ID = "ATokenGPvbdGVxr1b2hvZbsiqW5xWH25efTNsLJA8knL"
+MEMO_PROGRAM_ID = "MemoSq4gqABAXKb96qnH8TysNcWxMyWCqXgDLGmfcHr"
+JUPITER_V6_PROGRAM_ID = "JUP6LkbZbjS1jKKwapdHNy74zcZ3tLUZoi5QNyVTaV4"
+RAYDIUM_AMM_V4_PROGRAM_ID = "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8"
+ORCA_WHIRLPOOL_PROGRAM_ID = "whirLbMiicVfio4qs6eGmHwEULZ7Q2cNuhZ8eN3ME4"
+PUMPFUN_PROGRAM_ID = "6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P"
+
+# program id -> decoder(data: bytes, accounts: [address], context: dict) -> Optional[str]
+INSTRUCTION_DECODERS = {}
+PROGRAM_LABELS = {}
+
+def instruction_decoder(program_id: str, label: str):
+    """
+    Register a decoder for a program's raw instructions; a later registration for the same program replaces it.
+    The decoder returns a one-line description, or None to fall back to "<label> instruction.".
+    """
+    def register(decoder):
+        INSTRUCTION_DECODERS[program_id] = decoder
+        PROGRAM_LABELS[program_id] = label
+        return decoder
+    return register
+
+def short_address(address: str) -> str:
+    return f"{address[:4]}...{address[-4:]}"
+
+def anchor_discriminator(name: str) -> bytes:
+    """First 8 bytes of sha256("global:<name>"), which Anchor programs prefix to each instruction."""
+    return hashlib.sha256(f"global:{name}".encode()).digest()[:8]
+
+def token_amount(raw: int, mint: Optional[str], context: dict) -> str:
+    """Render a raw token amount in whole tokens when the mint's decimals are known from the transaction."""
+    decimals = context["decimals"].get(mint)
+    if decimals is None:
+        return f"{raw} tokens" + (f" (mint {mint})" if mint else "")
+    return f"{format(Decimal(raw).scaleb(-decimals).normalize(), 'f')} tokens (mint {mint})"
+
+SYSTEM_INSTRUCTIONS = [
+    "createAccount", "assign", "transfer", "createAccountWithSeed", "advanceNonceAccount",
+    "withdrawNonceAccount", "initializeNonceAccount", "authorizeNonceAccount", "allocate",
+    "allocateWithSeed", "assignWithSeed", "transferWithSeed", "upgradeNonceAccount"
+]
+
+@instruction_decoder(SYSTEM_PROGRAM_ID, "System program")
+def decode_system_instruction(data: bytes, accounts: list, context: dict):
+    kind, = struct.unpack_from("<I", data)
+    if kind == 2:
+        lamports, = struct.unpack_from("<Q", data, 4)
+        return (f"SOL transfer of {lamports / 1e9:.9f} SOL "
+                f"from {short_address(accounts[0])} to {short_address(accounts[1])}.")
+    if kind == 0:
+        lamports, space = struct.unpack_from("<QQ", data, 4)
+        return (f"Created account {short_address(accounts[1])} ({space} bytes, "
+                f"funded with {lamports / 1e9:.9f} SOL).")
+    if kind < len(SYSTEM_INSTRUCTIONS):
+        return f"System program instruction **{SYSTEM_INSTRUCTIONS[kind]}**."
+    return None
+
+SPL_TOKEN_INSTRUCTIONS = [
+    "initializeMint", "initializeAccount", "initializeMultisig", "transfer", "approve", "revoke",
+    "setAuthority", "mintTo", "burn", "closeAccount", "freezeAccount", "thawAccount", "transferChecked",
+    "approveChecked", "mintToChecked", "burnChecked", "initializeAccount2", "syncNative",
+    "initializeAccount3", "initializeMultisig2", "initializeMint2", "getAccountDataSize",
+    "initializeImmutableOwner", "amountToUiAmount", "uiAmountToAmount", "initializeMintCloseAuthority"
+]
+
+@instruction_decoder(TOKEN_2022_PROGRAM_ID, "Token-2022 program")
+@instruction_decoder(TOKEN_PROGRAM_ID, "SPL Token program")
+def decode_token_instruction(data: bytes, accounts: list, context: dict):
+    kind = data[0]
+    if kind in (3, 12):
+        amount, = struct.unpack_from("<Q", data, 1)
+        # transfer: source, destination; transferChecked: source, mint, destination
+        src, dst = (accounts[0], accounts[1]) if kind == 3 else (accounts[0], accounts[2])
+        mint = accounts[1] if kind == 12 else context["token_accounts"].get(src)
+        return (f"Transfer of {token_amount(amount, mint, context)} "
+                f"from {short_address(src)} to {short_address(dst)}.")
+    if kind in (7, 14):
+        amount, = struct.unpack_from("<Q", data, 1)
+        return f"Minted {token_amount(amount, accounts[0], context)} to {short_address(accounts[1])}."
+    if kind in (8, 15):
+        amount, = struct.unpack_from("<Q", data, 1)
+        return f"Burned {token_amount(amount, accounts[1], context)} from {short_address(accounts[0])}."
+    if kind == 9:
+        return f"Closed token account {short_address(accounts[0])}."
+    if kind < len(SPL_TOKEN_INSTRUCTIONS):
+        return f"SPL Token instruction **{SPL_TOKEN_INSTRUCTIONS[kind]}**."
+    return None
+
+@instruction_decoder(COMPUTE_BUDGET_PROGRAM_ID, "Compute Budget program")
+def decode_compute_budget_instruction(data: bytes, accounts: list, context: dict):
+    if data[0] == 2:
+        units, = struct.unpack_from("<I", data, 1)
+        return f"Set compute unit limit to {units}."
+    if data[0] == 3:
+        micro_lamports, = struct.unpack_from("<Q", data, 1)
+        return f"Set compute unit price to {micro_lamports} micro-lamports."
+    return None
+
+@instruction_decoder(ASSOCIATED_TOKEN_PROGRAM_ID, "Associated Token program")
+def decode_associated_token_instruction(data: bytes, accounts: list, context: dict):
+    # Instruction 0 (also sent as empty data) creates the account; 1 creates it only if missing
+    if not data or data[0] in (0, 1):
+        return f"Created associated token account {short_address(accounts[1])} for mint {accounts[3]}."
+    return None
+
+@instruction_decoder(MEMO_PROGRAM_ID, "Memo program")
+def decode_memo_instruction(data: bytes, accounts: list, context: dict):
+    return f"Memo: \"{data.decode('utf-8', 'replace')}\"."
+
+def anchor_decoder(program_id: str, label: str, methods: dict):
+    """Register a decoder that names an Anchor program's instructions; `methods` maps instruction name -> description."""
+    by_discriminator = {anchor_discriminator(name): text for name, text in methods.items()}
+
+    @instruction_decoder(program_id, label)
+    def decode(data: bytes, accounts: list, context: dict):
+        return by_discriminator.get(data[:8])
+    return decode
+
+anchor_decoder(JUPITER_V6_PROGRAM_ID, "Jupiter", {
+    name: "Swap routed through Jupiter."
+    for name in ("route", "route_with_token_ledger", "shared_accounts_route",
+                 "shared_accounts_route_with_token_ledger", "exact_out_route", "shared_accounts_exact_out_route")
+})
+anchor_decoder(ORCA_WHIRLPOOL_PROGRAM_ID, "Orca Whirlpool", {
+    "swap": "Orca Whirlpool swap.", "swap_v2": "Orca Whirlpool swap.", "two_hop_swap": "Orca Whirlpool two-hop swap."
+})
+
+@instruction_decoder(RAYDIUM_AMM_V4_PROGRAM_ID, "Raydium AMM")
+def decode_raydium_amm_instruction(data: bytes, accounts: list, context: dict):
+    if data[0] in (9, 11):
+        return "Raydium AMM swap."
+    return None
+
+PUMPFUN_BUY = anchor_discriminator("buy")
+PUMPFUN_SELL = anchor_discriminator("sell")
+
+@instruction_decoder(PUMPFUN_PROGRAM_ID, "Pump.fun")
+def decode_pumpfun_instruction(data: bytes, accounts: list, context: dict):
+    if data[:8] in (PUMPFUN_BUY, PUMPFUN_SELL):
+        # buy: token amount, max SOL cost; sell: token amount, min SOL output
+        amount, sol_limit = struct.unpack_from("<QQ", data, 8)
+        mint = accounts[2]
+        if data[:8] == PUMPFUN_BUY:
+            return f"Pump.fun buy of {token_amount(amount, mint, context)} for at most {sol_limit / 1e9:.9f} SOL."
+        return f"Pump.fun sell of {token_amount(amount, mint, context)} for at least {sol_limit / 1e9:.9f} SOL."
+    if data[:8] == anchor_discriminator("create"):
+        return f"Pump.fun token launch of mint {accounts[0]}."
+    return None
+
+def describe_parsed_instruction(instr: dict) -> str:
+    """Describe an instruction the RPC node already parsed (jsonParsed encoding)."""
+    program = instr.get("program") or instr.get("programId")
+    parsed = instr["parsed"]
+    if not isinstance(parsed, dict):
+        return f"{PROGRAM_LABELS.get(instr.get('programId'), program)}: {parsed}."
+    instr_type = parsed.get("type")
+    info = parsed.get("info", {})
+    if program in ("spl-token", "spl-token-2022"):
+        if instr_type in ("transfer", "transferChecked"):
+            amt = info.get("amount") or info.get("tokenAmount", {}).get("amount")
+            src = info.get("source", "")
+            dst = info.get("destination", "")
+            mint = info.get("mint", "")
+            return f"Transfer of {amt} tokens (mint {mint}) from {short_address(src)} to {short_address(dst)}."
+        if instr_type in ("mintTo", "mintToChecked"):
+            amt = info.get("amount") or info.get("tokenAmount", {}).get("amount")
+            return f"Minted {amt} new tokens of {info.get('mint', '')} to {short_address(info.get('account', ''))}."
+        return f"SPL Token instruction **{instr_type}**."
+    if program == "system":
+        if instr_type == "transfer":
+            sol_amount = int(info.get("lamports", 0)) / 1e9
+            src = info.get("source", "")
+            dst = info.get("destination", "")
+            return f"SOL transfer of {sol_amount:.9f} SOL from {short_address(src)} to {short_address(dst)}."
+        return f"System program instruction **{instr_type}**."
+    return f"{PROGRAM_LABELS.get(instr.get('programId'), program)} instruction **{instr_type}**."
+
+def describe_instruction(instr: dict, account_keys: list, context: dict) -> str:
+    """Describe one instruction in either raw (json) or jsonParsed form, dispatching on its program id."""
+    if "parsed" in instr:
+        return describe_parsed_instruction(instr)
+    if "programIdIndex" in instr:
+        # Raw encoding: program and accounts are indexes into the transaction's account keys
+        key = lambda i: account_keys[i] if i < len(account_keys) else f"#{i}"
+        program_id = key(instr["programIdIndex"])
+        accounts = [key(i) for i in instr.get("accounts", [])]
+    else:
+        program_id = instr.get("programId")
+        accounts = instr.get("accounts", [])
+    decoder = INSTRUCTION_DECODERS.get(program_id)
+    if decoder is None:
+        return f"Instruction by program {program_id} (details not parsed)."
+    try:
+        text = decoder(base58.b58decode(instr.get("data", "")), accounts, context)
+    except (ValueError, IndexError, struct.error):
+        text = None
+    return text or f"{PROGRAM_LABELS[program_id]} instruction."
+
+def transaction_account_keys(tx: dict) -> list:
+    """All account addresses in a transaction, including those loaded from lookup tables (v0 transactions)."""
+    keys = tx["transaction"]["message"].get("accountKeys", [])
+    if keys and isinstance(keys[0], dict):
+        # jsonParsed already lists loaded addresses among the account keys
+        return [k["pubkey"] for k in keys]
+    loaded = (tx.get("meta") or {}).get("loadedAddresses") or {}
+    return keys + loaded.get("writable", []) + loaded.get("readonly", [])
+
+def token_balance_deltas(meta: dict, account_keys: list) -> list:
+    """(owner, mint, decimals, raw change) per owner and mint, from preTokenBalances/postTokenBalances."""
+    deltas = {}
+    for sign, balances in ((-1, meta.get("preTokenBalances") or []), (1, meta.get("postTokenBalances") or [])):
+        for balance in balances:
+            index = balance.get("accountIndex")
+            owner = balance.get("owner") or (account_keys[index] if index is not None and index < len(account_keys) else "")
+            amount = balance.get("uiTokenAmount", {})
+            key = (owner, balance.get("mint"), amount.get("decimals"))
+            deltas[key] = deltas.get(key, 0) + sign * int(amount.get("amount") or 0)
+    return [(owner, mint, decimals, change) for (owner, mint, decimals), change in deltas.items() if change]
+
+def summarize_transaction(tx: dict) -> str:
+    """Render the markdown summary of a getTransaction result (json or jsonParsed encoding)."""
     summary_lines = []
+    meta = tx.get("meta") or {}
     # Check transaction status and fee
     if "meta" in tx:
-        if tx["meta"].get("err"):
+        if meta.get("err"):
             summary_lines.append("**Transaction Status**: Failed")
         else:
             summary_lines.append("**Transaction Status**: Success")
-        fee = tx["meta"].get("fee")
+        fee = meta.get("fee")
         if fee is not None:
             summary_lines.append(f"**Fee Paid**: {fee} lamports")
-    # Parse each instruction in the transaction
     if "transaction" in tx and "message" in tx["transaction"]:
+        account_keys = transaction_account_keys(tx)
+        # Mints and decimals of the token accounts the transaction touched, for raw token instructions
+        context = {"token_accounts": {}, "decimals": {}}
+        for balance in (meta.get("preTokenBalances") or []) + (meta.get("postTokenBalances") or []):
+            index = balance.get("accountIndex")
+            if index is not None and index < len(account_keys):
+                context["token_accounts"][account_keys[index]] = balance.get("mint")
+            context["decimals"][balance.get("mint")] = balance.get("uiTokenAmount", {}).get("decimals")
+        inner = {group.get("index"): group.get("instructions", []) for group in meta.get("innerInstructions") or []}
         instructions = tx["transaction"]["message"].get("instructions", [])
         for idx, instr in enumerate(instructions, start=1):
-            program = instr.get("program") or instr.get("programId")
-            if program == "spl-token" and "parsed" in instr:
-                parsed = instr["parsed"]
-                instr_type = parsed.get("type")
-                info = parsed.get("info", {})
-                if instr_type == "transfer":
-                    amt = info.get("amount")
-                    src = info.get("source", "")
-                    dst = info.get("destination", "")
-                    mint = info.get("mint", "")
-                    summary_lines.append(
-                        f"Instruction {idx}: Transfer of {amt} tokens (mint {mint}) "
-                        f"from {src[:4]}...{src[-4:]} to {dst[:4]}...{dst[-4:]}.")
-                elif instr_type == "mintTo":
-                    amt = info.get("amount")
-                    mint = info.get("mint", "")
-                    acct = info.get("account", "")
-                    summary_lines.append(
-                        f"Instruction {idx}: Minted {amt} new tokens of {mint} to {acct[:4]}...{acct[-4:]}.")
-                else:
-                    summary_lines.append(f"Instruction {idx}: SPL Token instruction **{instr_type}**.")
-            elif program == "system" and "parsed" in instr:
-                parsed = instr["parsed"]
-                if parsed.get("type") == "transfer":
-                    info = parsed.get("info", {})
-                    lamports = info.get("lamports", 0)
-                    src = info.get("source", "")
-                    dst = info.get("destination", "")
-                    sol_amount = int(lamports) / 1e9
-                    summary_lines.append(
-                        f"Instruction {idx}: SOL transfer of {sol_amount:.9f} SOL "
-                        f"from {src[:4]}...{src[-4:]} to {dst[:4]}...{dst[-4:]}.")
-                else:
-                    summary_lines.append(f"Instruction {idx}: System program instruction **{parsed.get('type')}**.")
-            else:
-                # Unparsed or other program instructions
-                prog_id = instr.get("programId") or instr.get("programIdIndex")
-                summary_lines.append(f"Instruction {idx}: Instruction by program {prog_id} (details not parsed).")
+            summary_lines.append(f"Instruction {idx}: {describe_instruction(instr, account_keys, context)}")
+            # Instructions invoked by this one (CPI), e.g. the token transfers inside a swap
+            for sub, inner_instr in enumerate(inner.get(idx - 1, []), start=1):
+                summary_lines.append(
+                    f"  - Inner instruction {idx}.{sub}: {describe_instruction(inner_instr, account_keys, context)}")
+        deltas = token_balance_deltas(meta, account_keys)
+        if deltas:
+            summary_lines.append("**Token Balance Changes**:")
+            for owner, mint, decimals, change in deltas:
+                amount = change if decimals is None else format(Decimal(change).scaleb(-decimals).normalize(), "f")
+                sign = "+" if change > 0 else ""
+                summary_lines.append(f"  - {short_address(owner)}: {sign}{amount} (mint {mint})")
     # Join all instruction summaries
-    summary = "\n".join(summary_lines) if summary_lines else "No parsed instruction details available."
-    return {"signature": signature, "summary": summary}
+    return "\n".join(summary_lines) if summary_lines else "No parsed instruction details available."
+
+# Wallet history: signatures paged from getSignaturesForAddress, transactions fetched in concurrent batches
+HISTORY_DEFAULT_LIMIT = int(os.getenv("HISTORY_DEFAULT_LIMIT", "100"))
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "1000"))
+HISTORY_SIGNATURE_PAGE_SIZE = 1000  # getSignaturesForAddress maximum
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "20"))
+HISTORY_CONCURRENCY = int(os.getenv("HISTORY_CONCURRENCY", "4"))
+HISTORY_FORMATS = ("ndjson", "sse")
+
+async def iter_signatures(address: str, limit: int, before: Optional[str] = None):
+    """Yield up to `limit` signature records for an address, newest first, one RPC page at a time."""
+    remaining = limit
+    while remaining > 0:
+        options = {"limit": min(remaining, HISTORY_SIGNATURE_PAGE_SIZE)}
+        if before:
+            options["before"] = before
+        data = await get_rpc_response({
+            "jsonrpc": "2.0", "id": 1,
+            "method": "getSignaturesForAddress",
+            "params": [address, options]
+        }, allow_empty=True)
+        page = data.get("result") or []
+        for entry in page:
+            yield entry
+        remaining -= len(page)
+        if len(page) < options["limit"]:
+            return
+        before = page[-1]["signature"]
+
+async def summarize_history_batch(entries: list) -> list:
+    """History items for a batch of signature records: cached summaries first, the rest in one JSON-RPC batch."""
+    signatures = [entry["signature"] for entry in entries]
+    summaries = dict(zip(signatures, await asyncio.gather(*(cached_summary(signature) for signature in signatures))))
+    missing = [signature for signature, summary in summaries.items() if summary is None]
+    if missing:
+        responses = await get_rpc_batch([transaction_payload(signature) for signature in missing])
+        for signature, response in zip(missing, responses):
+            tx = response.get("result")
+            if tx:
+                summaries[signature] = summarize_transaction(tx)
+                await transaction_cache.put(signature, tx, summaries[signature])
+    items = []
+    for entry in entries:
+        item = {
+            "signature": entry["signature"],
+            "slot": entry.get("slot"),
+            "block_time": entry.get("blockTime"),
+            "success": entry.get("err") is None
+        }
+        summary = summaries.get(entry["signature"])
+        if summary is None:
+            item["error"] = "Unable to fetch transaction"
+        else:
+            item["summary"] = summary
+        items.append(item)
+    return items
+
+async def iter_history(address: str, limit: int, before: Optional[str] = None):
+    """
+    Yield history items newest first. Up to HISTORY_CONCURRENCY batches are in flight at once
+    and each is yielded as soon as it and the batches before it are done, so memory stays
+    bounded by the window rather than the length of the history.
+    """
+    window = deque()
+    batch = []
+    try:
+        async for entry in iter_signatures(address, limit, before):
+            batch.append(entry)
+            if len(batch) < HISTORY_BATCH_SIZE:
+                continue
+            window.append(asyncio.ensure_future(summarize_history_batch(batch)))
+            batch = []
+            if len(window) >= HISTORY_CONCURRENCY:
+                for item in await window.popleft():
+                    yield item
+        if batch:
+            window.append(asyncio.ensure_future(summarize_history_batch(batch)))
+        while window:
+            for item in await window.popleft():
+                yield item
+    finally:
+        # The client may disconnect mid-stream; don't leave batches running
+        for task in window:
+            task.cancel()
+
+async def stream_history(address: str, limit: int, before: Optional[str], fmt: str):
+    """Encode history items as NDJSON lines or SSE events, ending with an error record if the history breaks off."""
+    def encode(item, event=None):
+        body = shaped_record(item).decode()
+        if fmt == "sse":
+            return (f"event: {event}\n" if event else "") + f"data: {body}\n\n"
+        return body + "\n"
+
+    # A stream delivers as it goes, so the per-request deadline does not cut it off
+    _request_deadline.set(None)
+    count = 0
+    try:
+        async for item in iter_history(address, limit, before):
+            count += 1
+            yield encode(item)
+    except Exception as e:
+        yield encode({"error": "Unable to fetch history", "details": str(e)}, "error")
+        return
+    if fmt == "sse":
+        yield encode({"count": count}, "end")
+
+@app.get("/history/{address}")
+async def get_history(request: Request, address: str, limit: int = HISTORY_DEFAULT_LIMIT,
+                      before: Optional[str] = None, format: Optional[str] = None):
+    """
+    Stream summaries of a wallet's recent transactions, newest first, as they are fetched.
+    `format` is ndjson (default) or sse; an `Accept: text/event-stream` header also selects SSE.
+    `before` continues from an earlier signature.
+    """
+    try:
+        Pubkey.from_string(address)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid address")
+    if format is None:
+        format = "sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson"
+    if format not in HISTORY_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(HISTORY_FORMATS)}")
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_history(address, limit, before, format),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Local CoinGecko coin index (ids, symbols, names and Solana contract addresses)
+COINGECKO_INDEX_REFRESH_SECONDS = float(os.getenv("COINGECKO_INDEX_REFRESH_SECONDS", str(6 * 3600)))
+COINGECKO_RANK_PAGES = int(os.getenv("COINGECKO_RANK_PAGES", "4"))
+COINGECKO_INDEX_SNAPSHOT = "coingecko_index.json"
+
+class CoinGeckoIndex:
+    """
+    CoinGecko's full coin list with Solana platform addresses, searchable offline.
+    Coins that share a symbol are ranked by market cap rank (from the top markets pages),
+    then by whether they match the preferred Solana mint, then by having a Solana address.
+    """
+
+    def __init__(self, coins, ranks):
+        self.coins = {}
+        self.ranks = ranks
+        self.by_symbol = defaultdict(list)
+        self.by_name = defaultdict(list)
+        self.by_mint = defaultdict(list)
+        for coin_id, symbol, name, mint in coins:
+            self.coins[coin_id] = (symbol, name, mint)
+            self.by_symbol[symbol.lower()].append(coin_id)
+            self.by_name[name.lower()].append(coin_id)
+            if mint:
+                self.by_mint[mint].append(coin_id)
+        self.search_keys = sorted(
+            {(key, coin_id) for coin_id, (symbol, name, _) in self.coins.items() for key in (symbol.lower(), name.lower())}
+        )
+        self.built_at = time.time()
+
+    @classmethod
+    def from_api(cls, coin_list, ranks) -> "CoinGeckoIndex":
+        coins = []
+        for c in coin_list:
+            if c.get("id") and c.get("symbol") is not None:
+                mint = (c.get("platforms") or {}).get("solana") or None
+                coins.append((c["id"], c["symbol"], c.get("name") or c["id"], mint))
+        return cls(coins, ranks)
+
+    def __len__(self):
+        return len(self.coins)
+
+    def coin(self, coin_id: str) -> dict:
+        symbol, name, mint = self.coins[coin_id]
+        return {"id": coin_id, "symbol": symbol, "name": name, "mint": mint, "market_cap_rank": self.ranks.get(coin_id)}
+
+    def _prefix(self, query: str, limit: int = 25) -> list:
+        start = bisect_left(self.search_keys, (query, ""))
+        ids = []
+        for key, coin_id in self.search_keys[start:start + limit]:
+            if not key.startswith(query):
+                break
+            ids.append(coin_id)
+        return ids
+
+    def lookup(self, query: str, solana_only: bool = False, preferred_mint: str = None):
+        """Best coin for an id, symbol, name, Solana mint or name/symbol prefix; None if nothing matches."""
+        raw = query.strip()
+        q = raw.lower()
+        if not q:
+            return None
+
+        def rank(coin_id):
+            mint = self.coins[coin_id][2]
+            return (self.ranks.get(coin_id, math.inf), mint != preferred_mint or mint is None, mint is None, len(coin_id))
+
+        for candidates in (
+            [q] if q in self.coins else [],
+            self.by_mint.get(raw, []),
+            self.by_symbol.get(q, []),
+            self.by_name.get(q, []),
+            self._prefix(q)
+        ):
+            if solana_only:
+                candidates = [c for c in candidates if self.coins[c][2]]
+            if candidates:
+                return self.coin(min(candidates, key=rank))
+        return None
+
+    def search(self, query: str, limit: int = 10) -> list:
+        q = query.strip().lower()
+        ids = list(dict.fromkeys(self.by_symbol.get(q, []) + self.by_name.get(q, []) + self._prefix(q, limit * 5)))
+        ids.sort(key=lambda c: (self.ranks.get(c, math.inf), len(c)))
+        return [self.coin(c) for c in ids[:limit]]
+
+    def to_snapshot(self) -> dict:
+        return {
+            "coins": [[coin_id, *fields] for coin_id, fields in self.coins.items()],
+            "ranks": self.ranks,
+            "built_at": self.built_at
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "CoinGeckoIndex":
+        index = cls([tuple(c) for c in data["coins"]], data.get("ranks") or {})
+        index.built_at = data.get("built_at", 0)
+        return index
+
+coingecko_index = None
+_coingecko_index_lock = asyncio.Lock()
+
+async def fetch_coingecko_ranks() -> dict:
+    """Market cap rank for the top coins, used to break ties between coins sharing a symbol."""
+    ranks = {}
+    for page in range(1, COINGECKO_RANK_PAGES + 1):
+        try:
+            resp = await http_get(
+                f"{COINGECKO_API_BASE}/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=250&page={page}",
+                timeout=10
+            )
+            if resp.status_code != 200:
+                break
+            for entry in resp.json():
+                if entry.get("id") and entry.get("market_cap_rank"):
+                    ranks[entry["id"]] = entry["market_cap_rank"]
+        except Exception:
+            break
+    return ranks
+
+def _write_cache_snapshot(name: str, data):
+    """Atomically write a JSON snapshot under CACHE_DIR."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+def _read_cache_snapshot(name: str):
+    try:
+        with open(os.path.join(CACHE_DIR, name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+async def load_coingecko_index() -> bool:
+    """
+    Bulk-load the coin list (with platforms) and swap in a new index; the old one stays on failure.
+    Runs under a host lock, and adopts the snapshot instead if another worker on the host has
+    refreshed it in the meantime.
+    """
+    async with HostLock("coingecko_index"):
+        if cache_file_age(COINGECKO_INDEX_SNAPSHOT) < COINGECKO_INDEX_REFRESH_SECONDS:
+            snapshot = await asyncio.to_thread(_read_cache_snapshot, COINGECKO_INDEX_SNAPSHOT)
+            if snapshot and (coingecko_index is None or snapshot.get("built_at", 0) > coingecko_index.built_at):
+                _adopt_coingecko_snapshot(snapshot)
+                return True
+        return await _download_coingecko_index()
+
+def _adopt_coingecko_snapshot(snapshot: dict):
+    global coingecko_index
+    coingecko_index = CoinGeckoIndex.from_snapshot(snapshot)
+
+async def _download_coingecko_index() -> bool:
+    global coingecko_index
+    try:
+        resp = await http_get(f"{COINGECKO_API_BASE}/coins/list?include_platform=true", timeout=30)
+        if resp.status_code != 200:
+            return False
+        coin_list = resp.json()
+    except Exception:
+        return False
+    ranks = await fetch_coingecko_ranks()
+    if not ranks and coingecko_index is not None:
+        ranks = coingecko_index.ranks
+    new_index = await asyncio.to_thread(CoinGeckoIndex.from_api, coin_list, ranks)
+    if not len(new_index):
+        return False
+    coingecko_index = new_index
+    try:
+        await asyncio.to_thread(_write_cache_snapshot, COINGECKO_INDEX_SNAPSHOT, new_index.to_snapshot())
+    except OSError:
+        pass
+    return True
+
+async def get_coingecko_index():
+    """The current CoinGecko index: from memory, else the on-disk snapshot, else a fresh download."""
+    global coingecko_index
+    if coingecko_index is None:
+        async with _coingecko_index_lock:
+            if coingecko_index is None:
+                snapshot = await asyncio.to_thread(_read_cache_snapshot, COINGECKO_INDEX_SNAPSHOT)
+                if snapshot:
+                    _adopt_coingecko_snapshot(snapshot)
+                else:
+                    await detached_task(load_coingecko_index(), background=True)
+    return coingecko_index
+
+async def refresh_coingecko_index_forever():
+    """Refresh the CoinGecko index every COINGECKO_INDEX_REFRESH_SECONDS, retrying sooner after failures."""
+    await get_coingecko_index()
+    while True:
+        if coingecko_index is None:
+            delay = TOKEN_INDEX_RETRY_SECONDS
+        else:
+            # A snapshot loaded from disk may already be due for a refresh
+            delay = max(coingecko_index.built_at + COINGECKO_INDEX_REFRESH_SECONDS - time.time(), 0)
+        await asyncio.sleep(delay)
+        async with _coingecko_index_lock:
+            ok = await load_coingecko_index()
+        if not ok and coingecko_index is not None:
+            await asyncio.sleep(TOKEN_INDEX_RETRY_SECONDS)
+
+@app.on_event("startup")
+async def start_coingecko_index_refresh():
+    start_background_task(refresh_coingecko_index_forever())
+
+async def coingecko_search(query: str) -> list:
+    """Live CoinGecko /search, used only while the local index is unavailable."""
+    try:
+        resp = await http_get(f"{COINGECKO_API_BASE}/search?query={query}", timeout=5)
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="CoinGecko search request failed")
+    if resp.status_code != 200:
+        raise HTTPException(status_code=502, detail="CoinGecko search error")
+    data = resp.json()
+    return data.get("coins") or [] if isinstance(data, dict) else []
+
+def pick_search_result(coins: list, query: str):
+    """Prefer an exact symbol match, else CoinGecko's top-ranked result."""
+    for coin in coins:
+        if coin.get("symbol", "").lower() == query.lower():
+            return coin
+    return coins[0] if coins else None
+
+async def find_coingecko_coin(query: str, solana_only: bool = False):
+    """Resolve a query to a CoinGecko coin dict (id, symbol, name, mint) from the local index."""
+    index = await get_coingecko_index()
+    if index is not None:
+        preferred_mint = None
+        token_idx = token_index
+        if token_idx is not None and len(query) < 32:
+            preferred_mint = token_idx.best_mint(query.strip())
+        return index.lookup(query, solana_only=solana_only, preferred_mint=preferred_mint)
+    # Index not loaded (cold start with CoinGecko unreachable): fall back to live search
+    coin = pick_search_result(await coingecko_search(query.strip().lower()), query.strip())
+    if not coin or not coin.get("id"):
+        return None
+    return {"id": coin["id"], "symbol": coin.get("symbol", ""), "name": coin.get("name"), "mint": None, "market_cap_rank": None}
 
 @app.get("/price/{symbol}")
-def get_price(symbol: str):
+@cached_response(ttl=15, stale=45)
+async def get_price(symbol: str):
     """
     Get current price, 24h change, volume (in SOL), and market cap for a given token symbol.
     Data is fetched from CoinGecko API.
     """
     query = symbol.strip().lower()
-    # Search for the token on CoinGecko
-    search_url = f"https://api.coingecko.com/api/v3/search?query={query}"
-    try:
-        sresp = requests.get(search_url, timeout=5)
-    except requests.RequestException:
-        raise HTTPException(status_code=502, detail="CoinGecko search request failed")
-    if sresp.status_code != 200:
-        raise HTTPException(status_code=502, detail="CoinGecko search error")
-    search_data = sresp.json()
-    coin_id = None
-    if search_data and "coins" in search_data:
-        for coin in search_data["coins"]:
-            if coin.get("symbol", "").lower() == query:
-                coin_id = coin.get("id")
-                break
-        if not coin_id and search_data["coins"]:
-            coin_id = search_data["coins"][0].get("id")
+    # Find the token in the local CoinGecko index
+    coin = await find_coingecko_coin(query)
+    coin_id = coin["id"] if coin else None
     if not coin_id:
         raise HTTPException(status_code=404, detail="Token not found on CoinGecko")
-    # Get market data for the found coin (and Solana for volume conversion)
-    ids_param = coin_id if coin_id == "solana" else f"{coin_id},solana"
+    # Get market data for the found coin; the SOL reference price (for volume conversion)
+    # comes from the shared Jupiter price service, concurrently
     market_url = (
-        "https://api.coingecko.com/api/v3/coins/markets"
-        f"?vs_currency=usd&ids={ids_param}&price_change_percentage=24h"
+        f"{COINGECKO_API_BASE}/coins/markets"
+        f"?vs_currency=usd&ids={coin_id}&price_change_percentage=24h"
     )
+    sol_price_task = asyncio.ensure_future(within_budget(price_service.get_price(WSOL_MINT), None, "sol_price"))
     try:
-        mresp = requests.get(market_url, timeout=5)
-    except requests.RequestException:
+        mresp = await http_get(market_url, timeout=5)
+    except httpx.HTTPError:
+        sol_price_task.cancel()
         raise HTTPException(status_code=502, detail="CoinGecko market data request failed")
     if mresp.status_code != 200:
+        sol_price_task.cancel()
         raise HTTPException(status_code=502, detail="CoinGecko market data error")
     market_data = mresp.json()
-    if not isinstance(market_data, list) or not market_data:
-        raise HTTPException(status_code=502, detail="Invalid market data response")
-    # Separate the target coin and Solana data
     coin_data = None
-    sol_data = None
-    for entry in market_data:
-        if entry.get("id") == coin_id:
-            coin_data = entry
-        if entry.get("id") == "solana":
-            sol_data = entry
+    if isinstance(market_data, list):
+        coin_data = next((entry for entry in market_data if entry.get("id") == coin_id), None)
     if not coin_data:
+        sol_price_task.cancel()
         raise HTTPException(status_code=502, detail="Coin data not found in response")
-    # Use Solana's price to convert volume to SOL units
-    sol_price = None
-    if sol_data and "current_price" in sol_data:
-        sol_price = sol_data["current_price"]
-    else:
-        # Fallback: fetch SOL price quickly if not included
-        try:
-            sol_simple = requests.get("https://api.coingecko.com/api/v3/simple/price?ids=solana&vs_currencies=usd", timeout=3)
-            if sol_simple.status_code == 200:
-                sol_price = sol_simple.json().get("solana", {}).get("usd")
-        except requests.RequestException:
-            sol_price = None
+    sol_price = await sol_price_task
     # Extract relevant fields for output
     symbol_out = coin_data.get("symbol", query).upper()
     price_usd = coin_data.get("current_price")
@@ -489,13 +4450,13 @@ def get_price(symbol: str):
         mc_str = f"{market_cap/1_000:.1f} k"
     else:
         mc_str = str(int(market_cap))
-    return {
+    return with_incomplete_marker({
         "symbol": symbol_out,
         "price": price_str,
         "change_24h": change_str,
         "volume": vol_str,
         "market_cap": mc_str
-    }
+    })
 
 def format_amount(n: float) -> str:
     """Helper to format large numbers with K/M/B suffixes."""
@@ -518,148 +4479,568 @@ def format_amount(n: float) -> str:
             return f"{value:.2f}"
 
 @app.get("/token")
-def find_token(query: str):
+@cached_response(ttl=3600, stale=6 * 3600)
+async def find_token(query: str):
     """Find a token by name or symbol and return its symbol, name, and Solana mint address."""
     q = query.strip()
     if not q:
         raise HTTPException(status_code=422, detail="Query parameter cannot be empty")
-    # Use CoinGecko to search for the token by name or symbol
-    search_url = f"https://api.coingecko.com/api/v3/search?query={q}"
-    try:
-        resp = requests.get(search_url, timeout=5)
-    except requests.RequestException:
-        raise HTTPException(status_code=502, detail="CoinGecko search request failed")
-    if resp.status_code != 200:
-        raise HTTPException(status_code=502, detail="CoinGecko search error")
-    data = resp.json()
-    if not data or "coins" not in data or not data["coins"]:
+    # Look the token up by name or symbol in the local CoinGecko index
+    coin = await find_coingecko_coin(q, solana_only=True)
+    if coin is None:
+        index = await get_coingecko_index()
+        if index is not None and index.lookup(q) is not None:
+            # Token exists but not on Solana
+            raise HTTPException(status_code=404, detail="Token not available on Solana")
         raise HTTPException(status_code=404, detail="Token not found")
-    # Take the first matching result (prefer exact symbol match if possible)
-    result = None
-    for coin in data["coins"]:
-        if coin.get("symbol", "").lower() == q.lower():
-            result = coin
-            break
-    if result is None:
-        result = data["coins"][0]
-    coin_id = result.get("id")
-    symbol = result.get("symbol", "").upper()
-    name = result.get("name")
-    if not coin_id:
-        raise HTTPException(status_code=404, detail="Token not found on CoinGecko")
-    # Get contract addresses from coin details (to find Solana address)
+    sol_mint = coin["mint"] or await fetch_coingecko_solana_address(coin["id"])
+    if not sol_mint:
+        # Token exists but not on Solana
+        raise HTTPException(status_code=404, detail="Token not available on Solana")
+    return {
+        "symbol": coin["symbol"].upper(),
+        "name": coin["name"],
+        "mint": sol_mint
+    }
+
+@app.get("/coins/search")
+async def search_coins(q: str, limit: int = 10):
+    """Search CoinGecko coins by symbol or name in the local index (no upstream call)."""
+    index = await get_coingecko_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="CoinGecko index not loaded yet")
+    return {"query": q, "results": index.search(q, max(1, min(limit, 50)))}
+
+async def fetch_coingecko_solana_address(coin_id: str):
+    """Solana contract address from the coin detail call; only needed when the local index is unavailable."""
     detail_url = (
-        f"https://api.coingecko.com/api/v3/coins/{coin_id}"
+        f"{COINGECKO_API_BASE}/coins/{coin_id}"
         "?localization=false&tickers=false&market_data=false"
         "&community_data=false&developer_data=false&sparkline=false"
     )
     try:
-        dresp = requests.get(detail_url, timeout=5)
-    except requests.RequestException:
+        dresp = await http_get(detail_url, timeout=5)
+    except httpx.HTTPError:
         raise HTTPException(status_code=502, detail="CoinGecko token detail request failed")
     if dresp.status_code != 200:
         raise HTTPException(status_code=502, detail="Error fetching token details")
-    detail_data = dresp.json()
-    platforms = detail_data.get("platforms", {})
-    sol_mint = platforms.get("solana")
-    if not sol_mint:
-        # Token exists but not on Solana
-        raise HTTPException(status_code=404, detail="Token not available on Solana")
-    return {
-        "symbol": symbol,
-        "name": name,
-        "mint": sol_mint
-    }
+    return (dresp.json().get("platforms") or {}).get("solana")
 
 @app.get("/mintinfo/{mint}")
-def get_token_info_from_mint(mint: str):
+@cached_response(ttl=3600, stale=24 * 3600)
+async def get_token_info_from_mint(mint: str):
     """Get token name and symbol from a given mint address using Jupiter and Helius."""
-    name = None
-    symbol = None
-    # Try Jupiter's token info API
-    try:
-        jup_resp = requests.get(f"{JUPITER_TOKEN_INFO_URL}{mint}", timeout=5)
-        if jup_resp.status_code == 200:
-            jup_data = jup_resp.json()
-            name = jup_data.get("name")
-            symbol = jup_data.get("symbol")
-    except Exception:
-        pass
-    # If Jupiter didn't have info, try Helius metadata
-    if not name or not symbol:
-        try:
-            helius_meta = helius_token_metadata(mint)
-            if helius_meta:
-                if not name:
-                    name = helius_meta.get("name")
-                if not symbol:
-                    symbol = helius_meta.get("symbol")
-        except Exception:
-            pass
+    # Cached metadata first, then Jupiter, then Helius metadata
+    meta = (await resolve_token_metadata([mint])).get(mint) or {}
+    name = meta.get("name")
+    symbol = meta.get("symbol")
     # Fallback names if still not found
     if not name:
         name = "Unlisted Token"
     if not symbol:
         symbol = mint[:4] + "..." + mint[-4:]
-    # Check the owner program of the mint (to verify if it's a proper SPL token)
-    owner = fetch_basic_token_info(mint)
-    return {
+    # Check the owner program of the mint (to verify if it's a proper SPL token);
+    # it is cached for as long as metadata is since it only changes if the mint is closed
+    owner = ((await mint_owner_cache.get(mint)) or {}).get("owner")
+    if owner is None:
+        owner = await within_budget(fetch_basic_token_info(mint), None, "owner", reserve=0)
+        if owner:
+            await mint_owner_cache.put(mint, {"owner": owner})
+    return with_incomplete_marker({
         "mint": mint,
         "owner": owner or "Unknown",
         "name": name,
         "symbol": symbol
+    })
+
+# Pump.fun launch feed: polled incrementally into a local store, served and pushed from there
+PUMPFUN_POLL_SECONDS = float(os.getenv("PUMPFUN_POLL_SECONDS", "2"))
+PUMPFUN_POLL_LIMIT = 50
+# Pages fetched per poll when more launches arrived since the last poll than one page holds
+PUMPFUN_CATCHUP_PAGES = int(os.getenv("PUMPFUN_CATCHUP_PAGES", "4"))
+# Keep polling this long after the last request; with no requests or subscribers polling stops
+PUMPFUN_ACTIVE_SECONDS = float(os.getenv("PUMPFUN_ACTIVE_SECONDS", "300"))
+PUMPFUN_STORE_MAX_ENTRIES = int(os.getenv("PUMPFUN_STORE_MAX_ENTRIES", "10000"))
+PUMPFUN_SUBSCRIBER_QUEUE = 256
+PUMPFUN_KEEPALIVE_SECONDS = 15
+PUMPFUN_PAGE_MAX = 100
+# A stored coin's price, market cap and volume older than this are refetched for /pumpfun/{mint}
+PUMPFUN_STATS_MAX_AGE = float(os.getenv("PUMPFUN_STATS_MAX_AGE", "60"))
+# How often the feed also re-reads the listings ordered by market cap and last trade, which is
+# where coins whose numbers move are; the launch polls only ever see new coins
+PUMPFUN_STATS_POLL_SECONDS = float(os.getenv("PUMPFUN_STATS_POLL_SECONDS", "30"))
+PUMPFUN_STATS_SORTS = ("market_cap", "last_trade_timestamp")
+PUMPFUN_STATS_PAGES = int(os.getenv("PUMPFUN_STATS_PAGES", "2"))
+
+def pumpfun_record(t: dict):
+    """The fields we serve for a Pump.fun coin, or None if it has no mint."""
+    mint = (t.get("metadata") or {}).get("mint") or t.get("mint")
+    if not mint:
+        return None
+    stats = t.get("stats") or {}
+    created = t.get("created_timestamp")
+    return {
+        "name": t.get("name"),
+        "symbol": t.get("symbol"),
+        "mint": mint,
+        "price": stats.get("price"),
+        "market_cap": stats.get("marketCap", t.get("usd_market_cap")),
+        "volume_24h": stats.get("volume24h"),
+        # Pump.fun timestamps are in milliseconds
+        "created_at": created / 1000 if isinstance(created, (int, float)) else None
     }
 
-@app.get("/pumpfun")
-def get_latest_pumpfun_tokens():
-    """List the latest Pump.fun coin launches (basic info for each)."""
+class PumpfunStore:
+    """
+    Coins by mint, plus one sorted (value, mint) list per sort field so listings and cursor
+    pages are bisect lookups. Holds at most `max_entries` coins, dropping the oldest launches
+    (coins with no known creation time first). Tracks when each coin's numbers were last read.
+    """
+    SORT_FIELDS = {"created": "created_at", "market_cap": "market_cap", "volume": "volume_24h"}
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.coins = {}
+        self.indexes = {sort: [] for sort in self.SORT_FIELDS}
+        self.refreshed_at = {}  # mint -> monotonic time its record was last read from Pump.fun
+
+    def __len__(self):
+        return len(self.coins)
+
+    @staticmethod
+    def sort_value(record: dict, field: str) -> float:
+        value = record.get(field)
+        # Unknown values sort below every real one
+        return float(value) if isinstance(value, (int, float)) else -1.0
+
+    def _unindex(self, record: dict):
+        for sort, field in self.SORT_FIELDS.items():
+            index = self.indexes[sort]
+            i = bisect_left(index, (self.sort_value(record, field), record["mint"]))
+            if i < len(index) and index[i][1] == record["mint"]:
+                del index[i]
+
+    def upsert(self, record: dict) -> bool:
+        """Add or refresh a coin; True if it is new. A refresh without a creation time keeps the stored one."""
+        self.refreshed_at[record["mint"]] = time.monotonic()
+        old = self.coins.get(record["mint"])
+        if old is not None:
+            if record["created_at"] is None:
+                record = {**record, "created_at": old["created_at"]}
+            if record == old:
+                return False
+            self._unindex(old)
+        self.coins[record["mint"]] = record
+        for sort, field in self.SORT_FIELDS.items():
+            insort(self.indexes[sort], (self.sort_value(record, field), record["mint"]))
+        while len(self.coins) > self.max_entries:
+            _, oldest = self.indexes["created"][0]
+            self._unindex(self.coins.pop(oldest))
+            self.refreshed_at.pop(oldest, None)
+        return old is None
+
+    def age(self, mint: str) -> float:
+        """Seconds since the coin's numbers were read, infinite if it is not stored."""
+        refreshed_at = self.refreshed_at.get(mint)
+        return math.inf if refreshed_at is None else time.monotonic() - refreshed_at
+
+    def get(self, mint: str):
+        return self.coins.get(mint)
+
+    def query(self, sort: str = "created", descending: bool = True, limit: int = 50, cursor=None,
+              q: Optional[str] = None, min_market_cap: Optional[float] = None, min_volume: Optional[float] = None) -> tuple:
+        """(records, next cursor or None). `cursor` is the (value, mint) position of the last record of the previous page."""
+        index = self.indexes[sort]
+        if descending:
+            start = bisect_left(index, tuple(cursor)) - 1 if cursor else len(index) - 1
+            positions = range(start, -1, -1)
+        else:
+            start = bisect_right(index, tuple(cursor)) if cursor else 0
+            positions = range(start, len(index))
+        needle = q.lower() if q else None
+        records = []
+        last = None
+        for i in positions:
+            record = self.coins[index[i][1]]
+            last = index[i]
+            if min_market_cap is not None and self.sort_value(record, "market_cap") < min_market_cap:
+                continue
+            if min_volume is not None and self.sort_value(record, "volume_24h") < min_volume:
+                continue
+            if needle and needle not in (record.get("name") or "").lower() and needle not in (record.get("symbol") or "").lower():
+                continue
+            records.append(record)
+            if len(records) == limit:
+                more = i > 0 if descending else i < len(index) - 1
+                return records, list(last) if more else None
+        return records, None
+
+def encode_cursor(position) -> Optional[str]:
+    return urlsafe_b64encode(json.dumps(position).encode()).decode() if position else None
+
+def decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        value, mint = json.loads(urlsafe_b64decode(cursor.encode()))
+        return float(value), str(mint)
+    except Exception:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+class PumpfunFeed:
+    """
+    One poller shared by every client: new launches are fetched incrementally (newest first,
+    stopping at the first coin already stored), kept in a PumpfunStore and pushed to subscribers.
+    Every PUMPFUN_STATS_POLL_SECONDS it also re-reads the top of the market cap and last-trade
+    listings, so the numbers of coins that are trading stay current for the stats-sorted listings.
+    Polling runs from startup and then only while someone is asking; an idle app soon makes no Pump.fun calls.
+    """
+
+    def __init__(self):
+        self.store = PumpfunStore(PUMPFUN_STORE_MAX_ENTRIES)
+        self.subscribers = set()
+        self.last_success = None
+        self.last_error = None
+        self.last_activity = 0.0
+        self.polls = 0
+        self.last_stats_poll = 0.0
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+
+    def touch(self):
+        """Note client interest, waking the poller if it was idle."""
+        self.last_activity = time.monotonic()
+        self._wake.set()
+
+    def active(self) -> bool:
+        return bool(self.subscribers) or time.monotonic() - self.last_activity < PUMPFUN_ACTIVE_SECONDS
+
+    async def _fetch_page(self, sort: str, page: int) -> tuple:
+        """(coins on the page, records for those with a mint) of a Pump.fun listing, newest/largest first."""
+        resp = await http_get(
+            f"{PUMPFUN_API_BASE}/coins?limit={PUMPFUN_POLL_LIMIT}&offset={page * PUMPFUN_POLL_LIMIT}&sort={sort}&order=DESC",
+            timeout=6
+        )
+        if resp.status_code != 200:
+            raise Exception(f"Pump.fun API returned status {resp.status_code}")
+        tokens = resp.json()
+        if not isinstance(tokens, list):
+            raise Exception("Unexpected response format from Pump.fun API")
+        return tokens, [r for r in map(pumpfun_record, tokens) if r is not None]
+
+    async def poll(self):
+        """Fetch launches newer than the store's, page by page, and publish them oldest first."""
+        self.polls += 1
+        first_load = not len(self.store)
+        fresh = []
+        for page in range(PUMPFUN_CATCHUP_PAGES):
+            tokens, records = await self._fetch_page("created_timestamp", page)
+            page_fresh = [r for r in records if self.store.upsert(r)]
+            fresh.extend(page_fresh)
+            # Stop at the first page that reaches coins we already had (or at the end of the listing)
+            if first_load or len(page_fresh) < len(records) or len(tokens) < PUMPFUN_POLL_LIMIT:
+                break
+        self.last_success = time.monotonic()
+        self.last_error = None
+        for record in reversed(fresh):
+            self.publish(record)
+        if time.monotonic() - self.last_stats_poll >= PUMPFUN_STATS_POLL_SECONDS:
+            self.last_stats_poll = time.monotonic()
+            await self.poll_stats()
+
+    async def poll_stats(self):
+        """Refresh stored coins from the stats-ordered listings; coins found there are not launches, so nothing is published."""
+        try:
+            pages = await asyncio.gather(*(self._fetch_page(sort, page)
+                                           for sort in PUMPFUN_STATS_SORTS for page in range(PUMPFUN_STATS_PAGES)))
+        except Exception as e:
+            # The launch poll succeeded; only the refresh of older coins' numbers is missed this round
+            self.last_error = f"stats poll: {e}"
+            return
+        for _, records in pages:
+            for record in records:
+                self.store.upsert(record)
+
+    async def refresh(self, max_age: float = PUMPFUN_POLL_SECONDS):
+        """Poll now unless the store is fresher than `max_age`; concurrent callers share one poll."""
+        self.touch()
+        async with self._lock:
+            if self.last_success is not None and time.monotonic() - self.last_success < max_age:
+                return
+            try:
+                await self.poll()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+
+    async def run_forever(self):
+        while True:
+            if not self.active():
+                self._wake.clear()
+                await self._wake.wait()
+            try:
+                await self.refresh()
+            except Exception:
+                pass
+            await asyncio.sleep(PUMPFUN_POLL_SECONDS)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(PUMPFUN_SUBSCRIBER_QUEUE)
+        self.subscribers.add(queue)
+        self.touch()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, record: dict):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(record)
+            except asyncio.QueueFull:
+                # A subscriber this far behind is dropped (its stream ends) rather than buffered without bound
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def stats(self) -> dict:
+        return {
+            "coins": len(self.store),
+            "subscribers": len(self.subscribers),
+            "polls": self.polls,
+            "active": self.active(),
+            "seconds_since_poll": round(time.monotonic() - self.last_success, 1) if self.last_success else None,
+            "last_error": self.last_error
+        }
+
+pumpfun_feed = PumpfunFeed()
+
+@app.on_event("startup")
+async def start_pumpfun_feed():
+    # Counts as interest, so the store is filled at startup rather than on the first request (which would
+    # find it empty); with no requests after that, polling stops after PUMPFUN_ACTIVE_SECONDS as usual
+    pumpfun_feed.touch()
+    start_background_task(pumpfun_feed.run_forever())
+
+async def fresh_pumpfun_store() -> PumpfunStore:
+    """The store, refreshed if stale; errors only if Pump.fun is unreachable and nothing is stored yet."""
     try:
-        resp = requests.get(f"{PUMPFUN_API_BASE}/coins?limit=50", timeout=6)
+        await within_budget(pumpfun_feed.refresh(), None, "pumpfun_refresh")
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Pump.fun API request failed: {e}")
-    if resp.status_code != 200:
-        raise HTTPException(status_code=502, detail=f"Pump.fun API returned status {resp.status_code}")
-    tokens = resp.json()
-    if not isinstance(tokens, list):
-        raise HTTPException(status_code=502, detail="Unexpected response format from Pump.fun API")
-    # Format each token's info
-    result_list = []
-    for t in tokens:
-        mint = t.get("metadata", {}).get("mint")
-        if not mint:
-            continue
-        result_list.append({
-            "name": t.get("name"),
-            "symbol": t.get("symbol"),
-            "mint": mint,
-            "price": t.get("stats", {}).get("price"),
-            "market_cap": t.get("stats", {}).get("marketCap"),
-            "volume_24h": t.get("stats", {}).get("volume24h")
-        })
-    return result_list
+        if not len(pumpfun_feed.store):
+            raise HTTPException(status_code=502, detail=f"Pump.fun API request failed: {e}")
+    return pumpfun_feed.store
+
+@app.get("/pumpfun")
+@cached_response(ttl=2, stale=5)
+async def get_latest_pumpfun_tokens(response: Response, sort: str = "created", order: str = "desc", limit: int = 50,
+                                    cursor: Optional[str] = None, q: Optional[str] = None,
+                                    min_market_cap: Optional[float] = None, min_volume: Optional[float] = None):
+    """
+    List recent Pump.fun coin launches (basic info for each), newest first by default.
+    `sort` is created, market_cap or volume; `order` is desc or asc; `q` filters by name or symbol.
+    When there are more results, the X-Next-Cursor response header holds the `cursor` for the next page.
+    """
+    if sort not in PumpfunStore.SORT_FIELDS:
+        raise HTTPException(status_code=422, detail=f"sort must be one of {', '.join(PumpfunStore.SORT_FIELDS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=422, detail="order must be asc or desc")
+    position = decode_cursor(cursor)
+    store = await fresh_pumpfun_store()
+    records, next_position = store.query(
+        sort, order == "desc", max(1, min(limit, PUMPFUN_PAGE_MAX)), position, q, min_market_cap, min_volume
+    )
+    if next_position:
+        response.headers["X-Next-Cursor"] = encode_cursor(next_position)
+    return records
+
+async def stream_pumpfun_launches():
+    """SSE events for each new launch, with keep-alive comments while it is quiet."""
+    _request_deadline.set(None)
+    queue = pumpfun_feed.subscribe()
+    try:
+        while True:
+            try:
+                record = await asyncio.wait_for(queue.get(), PUMPFUN_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                pumpfun_feed.touch()
+                yield ": keepalive\n\n"
+                continue
+            if record is None:
+                return
+            yield f"event: launch\ndata: {shaped_record(record).decode()}\n\n"
+    finally:
+        pumpfun_feed.unsubscribe(queue)
+
+@app.get("/pumpfun/stream")
+async def stream_pumpfun():
+    """Server-sent events: one `launch` event per new Pump.fun coin, from the shared poller."""
+    return StreamingResponse(
+        stream_pumpfun_launches(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/pumpfun/ws")
+async def pumpfun_websocket(websocket: WebSocket):
+    """WebSocket feed: one JSON message per new Pump.fun coin, from the shared poller."""
+    await websocket.accept()
+    queue = pumpfun_feed.subscribe()
+    try:
+        while True:
+            try:
+                record = await asyncio.wait_for(queue.get(), PUMPFUN_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                pumpfun_feed.touch()
+                await websocket.send_json({"type": "keepalive"})
+                continue
+            if record is None:
+                await websocket.close(code=1013)
+                return
+            await websocket.send_json({"type": "launch", "coin": record})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        pumpfun_feed.unsubscribe(queue)
 
 @app.get("/pumpfun/{mint}")
-def get_pumpfun_token_by_mint(mint: str):
+async def get_pumpfun_token_by_mint(mint: str):
     """Retrieve Pump.fun token info by its mint address, if it exists."""
+    pumpfun_feed.touch()
+    store = pumpfun_feed.store
+    record = store.get(mint)
+    if record is not None and store.age(mint) <= PUMPFUN_STATS_MAX_AGE:
+        return record
+    # Not stored, or its numbers are too old: ask Pump.fun directly
     try:
-        resp = requests.get(f"{PUMPFUN_API_BASE}/coins/{mint}", timeout=6)
+        resp = await http_get(f"{PUMPFUN_API_BASE}/coins/{mint}", timeout=6)
     except Exception as e:
+        if record is not None:
+            return record
         raise HTTPException(status_code=502, detail=f"Pump.fun API request failed: {e}")
     if resp.status_code == 404:
         # Coin not found on Pump.fun
         raise HTTPException(status_code=404, detail="Mint not found in Pump.fun listings")
     if resp.status_code != 200:
+        if record is not None:
+            # Older numbers beat none while Pump.fun is failing
+            return record
         raise HTTPException(status_code=502, detail=f"Pump.fun API returned status {resp.status_code}")
-    coin = resp.json()
-    return {
-        "name": coin.get("name"),
-        "symbol": coin.get("symbol"),
-        "mint": mint,
-        "price": coin.get("stats", {}).get("price"),
-        "market_cap": coin.get("stats", {}).get("marketCap"),
-        "volume_24h": coin.get("stats", {}).get("volume24h")
-    }
+    fetched = pumpfun_record({**resp.json(), "mint": mint})
+    if record is not None:
+        store.upsert(fetched)
+        return store.get(mint)
+    return fetched
+
+# Warm-up: each worker loads its indexes, opens its connection pools, probes the RPC endpoints and
+# preloads hot mints and wallets while already live; /ready holds the load balancer off until then
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Ready after this long even if some steps are still running; they carry on in the background
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "30"))
+WARMUP_MINTS = [m.strip() for m in os.getenv("WARMUP_MINTS", "").split(",") if m.strip()]
+WARMUP_WALLETS = [a.strip() for a in os.getenv("WARMUP_WALLETS", ",".join(HOT_WALLETS_PINNED)).split(",") if a.strip()]
+
+async def warm_token_index() -> dict:
+    """The host's token index file, however old, so lookups work while the refresher replaces it."""
+    global token_index
+    if token_index is None:
+        snapshot = await asyncio.to_thread(open_shared_token_index)
+        if token_index is None:
+            token_index = snapshot
+    index = await get_token_index()
+    if index is None:
+        raise Exception("Token list unavailable")
+    return {"tokens": len(index), "age_seconds": round(time.time() - index.built_at)}
+
+async def warm_coingecko_index() -> dict:
+    index = await get_coingecko_index()
+    if index is None:
+        raise Exception("CoinGecko coin list unavailable")
+    return {"coins": len(index.coins), "age_seconds": round(time.time() - index.built_at)}
+
+async def warm_connections() -> dict:
+    """A pooled connection to each upstream API host; the RPC hosts are covered by the probe."""
+    hosts = {urlsplit(url).netloc: url for urls in UPSTREAM_URL_PREFIXES.values() for url in urls}
+    results = await asyncio.gather(*(open_connection(url) for url in hosts.values()), return_exceptions=True)
+    return {"hosts": len(hosts), "failed": sum(isinstance(r, Exception) for r in results)}
+
+async def warm_mints() -> dict:
+    metadata, prices = await asyncio.gather(resolve_token_metadata(WARMUP_MINTS), price_service.get_prices(WARMUP_MINTS))
+    return {"mints": len(WARMUP_MINTS), "metadata": len(metadata), "prices": len(prices)}
+
+async def warm_wallets() -> dict:
+    """Balances for each wallet, which fills the token account, metadata and price caches they use."""
+    # Only client requests decide which wallets are hot
+    token = _counts_toward_hot_wallets.set(False)
+    try:
+        results = await asyncio.gather(*(get_balances(Response(), address) for address in WARMUP_WALLETS), return_exceptions=True)
+    finally:
+        _counts_toward_hot_wallets.reset(token)
+    return {"wallets": len(WARMUP_WALLETS), "failed": sum(isinstance(r, Exception) for r in results)}
+
+class WarmUp:
+    """The startup warm-up steps, run concurrently, and whether the worker is ready for traffic."""
+
+    def __init__(self):
+        self.steps = {}  # name -> {"status": "running" | "done" | "failed", "seconds", "result" or "error"}
+        self.ready = False
+        self.started_at = None
+        self.ready_at = None
+
+    async def _step(self, name: str, awaitable):
+        start = time.monotonic()
+        step = self.steps[name] = {"status": "running"}
+        try:
+            step["result"] = await awaitable
+            step["status"] = "done"
+        except Exception as e:
+            step["status"], step["error"] = "failed", str(e) or type(e).__name__
+        step["seconds"] = round(time.monotonic() - start, 3)
+
+    async def run(self):
+        self.started_at = time.monotonic()
+        steps = [
+            self._step("token_index", warm_token_index()),
+            self._step("coingecko_index", warm_coingecko_index()),
+            self._step("connections", warm_connections()),
+            self._step("rpc_probe", rpc_router.probe())
+        ]
+        if WARMUP_MINTS:
+            steps.append(self._step("mints", warm_mints()))
+        if WARMUP_WALLETS:
+            steps.append(self._step("wallets", warm_wallets()))
+        # Shielded so steps that overrun the timeout still finish and fill their caches
+        task = asyncio.ensure_future(asyncio.gather(*steps))
+        try:
+            await asyncio.wait_for(asyncio.shield(task), WARMUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self.ready = True
+        self.ready_at = time.monotonic()
+        await task
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmup_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at is not None else None,
+            "steps": {name: dict(step) for name, step in self.steps.items()}
+        }
+
+warmup = WarmUp()
+
+@app.on_event("startup")
+async def start_warmup():
+    if WARMUP_ENABLED:
+        start_background_task(warmup.run())
+    else:
+        warmup.ready = True
+
+@app.get("/ready")
+async def get_ready():
+    """Readiness probe: 200 once this worker's warm-up is done, 503 (with its progress) until then."""
+    return JSONResponse(warmup.stats(), status_code=200 if warmup.ready else 503)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "SolanaGPT online — try /balances/{address} or /transaction/{signature}"}